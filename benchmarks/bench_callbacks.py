@@ -0,0 +1,135 @@
+"""
+    Benchmarks of the page callbacks and layout builders, episodes being in the RAM cache.
+
+    The callbacks are called without the Dash dispatch but their outputs are JSON
+    encoded as Dash would do. Memoized callbacks are memoized at the Dash dispatch
+    (see utils/callback_cache.py), so their computation is measured here, not their cache.
+"""
+import json
+
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+
+from grid2viz.app import app
+from grid2viz.src.episodes import episodes_clbk
+from grid2viz.src.macro import macro_clbk, macro_lyt
+from grid2viz.src.micro import micro_clbk, micro_lyt
+from grid2viz.src.overview import overview_clbk, overview_lyt
+from grid2viz.src import manager
+from grid2viz.src.utils.callback_cache import raw
+
+from conftest import empty_figure
+
+
+def first_load(ctx):
+    return manager.make_episode(ctx.study_agent, ctx.scenario).load_names[0]
+
+
+def first_voltage_line(ctx):
+    return "or_" + manager.make_episode(ctx.study_agent, ctx.scenario).line_names[0]
+
+
+CALLBACKS = {
+    "episodes": [
+        (episodes_clbk.load_scenario_cards, lambda ctx: ("/episodes",)),
+    ],
+    "overview": [
+        (overview_clbk.update_ts_graph_avail_assets, lambda ctx: ("Load", ctx.scenario)),
+        (overview_clbk.load_environments_ts,
+         lambda ctx: ([first_load(ctx)], None, empty_figure(), "Load", ctx.scenario)),
+        (overview_clbk.update_select_loads, lambda ctx: (None, ctx.scenario)),
+        (overview_clbk.update_select_prods, lambda ctx: (None, ctx.scenario)),
+        (overview_clbk.update_table,
+         lambda ctx: (None, None, ctx.ref_agent, None, None, None, ctx.scenario)),
+        (overview_clbk.update_card_step, lambda ctx: (ctx.scenario,)),
+        (overview_clbk.update_card_maintenance, lambda ctx: (ctx.scenario,)),
+        (overview_clbk.update_card_hazard, lambda ctx: (ctx.scenario,)),
+        (overview_clbk.update_card_duration_maintenances, lambda ctx: (ctx.scenario,)),
+        (overview_clbk.update_selected_ref_agent, lambda ctx: (ctx.ref_agent, ctx.scenario)),
+        (overview_clbk.update_agent_ref_graph,
+         lambda ctx: (ctx.ref_agent, ctx.scenario, None, empty_figure(), empty_figure())),
+        (overview_clbk.update_profile_conso_graph, lambda ctx: (ctx.scenario, empty_figure())),
+        (overview_clbk.update_production_share_graph, lambda ctx: (ctx.scenario, empty_figure())),
+        (overview_clbk.update_date_range, lambda ctx: (ctx.ref_agent, ctx.scenario)),
+    ],
+    "macro": [
+        (macro_clbk.load_reward_data_scatter,
+         lambda ctx: (ctx.study_agent, None, empty_figure(), ctx.ref_agent, ctx.scenario)),
+        (macro_clbk.update_action_repartition_pie, lambda ctx: (ctx.study_agent, empty_figure(), ctx.scenario)),
+        (macro_clbk.maintenance_duration_hist, lambda ctx: (ctx.study_agent, empty_figure(), ctx.scenario)),
+        (macro_clbk.update_nbs, lambda ctx: (ctx.study_agent, ctx.scenario)),
+        (macro_clbk.update_agent_log_graph,
+         lambda ctx: (ctx.study_agent, None, empty_figure(), empty_figure(), ctx.scenario)),
+        (macro_clbk.update_actions_graph,
+         lambda ctx: (ctx.study_agent, None, empty_figure(), ctx.ref_agent, ctx.scenario)),
+        (macro_clbk.update_agent_log_action_table, lambda ctx: (ctx.study_agent, ctx.scenario)),
+        (macro_clbk.update_agent_log_action_graphs,
+         lambda ctx: (ctx.study_agent, empty_figure(), empty_figure(), ctx.scenario)),
+        (macro_clbk.update_divergence_timeline,
+         lambda ctx: (ctx.study_agent, empty_figure(), ctx.ref_agent, ctx.scenario)),
+    ],
+    "micro": [
+        (micro_clbk.compute_window,
+         lambda ctx: (0, 0, ctx.timestamp, None, ctx.study_agent, ctx.ref_agent, ctx.scenario, True)),
+        (micro_clbk.update_slider,
+         lambda ctx: (ctx.window, None, 0, ctx.study_agent, ctx.ref_agent, ctx.scenario, True)),
+        (micro_clbk.load_reward_ts,
+         lambda ctx: (None, ctx.window, ctx.timestamp, True, empty_figure(), ctx.study_agent, ctx.ref_agent,
+                      ctx.scenario)),
+        (micro_clbk.load_actions_ts,
+         lambda ctx: (None, ctx.window, True, empty_figure(), ctx.timestamp, ctx.study_agent, ctx.ref_agent,
+                      ctx.scenario)),
+        (micro_clbk.load_voltage_flow_line_choice,
+         lambda ctx: ("voltage", "active_flow", ctx.study_agent, ctx.scenario)),
+        (micro_clbk.load_flow_voltage_graph,
+         lambda ctx: ([first_voltage_line(ctx)], "voltage", None, ctx.window, empty_figure(), ctx.study_agent,
+                      ctx.scenario)),
+        (micro_clbk.update_ts_graph_avail_assets, lambda ctx: ("Load", True, ctx.study_agent, ctx.scenario)),
+        (micro_clbk.load_context_data,
+         lambda ctx: ([first_load(ctx)], None, ctx.window, True, empty_figure(), "Load", ctx.scenario,
+                      ctx.study_agent)),
+        (micro_clbk.update_agent_ref_graph,
+         lambda ctx: (None, ctx.window, True, empty_figure(), empty_figure(), ctx.study_agent, ctx.ref_agent,
+                      ctx.scenario)),
+        (micro_clbk.update_interactive_graph, lambda ctx: (0, ctx.study_agent, ctx.scenario, None)),
+        (micro_clbk.load_network_frames, lambda ctx: ({"step": 0}, ctx.study_agent, ctx.scenario)),
+    ],
+}
+
+PARAMS = [
+    pytest.param(callback, make_args, marks=pytest.mark.benchmark(group="callbacks_" + page),
+                 id="{}.{}".format(page, callback.__name__))
+    for page, callbacks in CALLBACKS.items()
+    for callback, make_args in callbacks
+]
+
+
+@pytest.mark.parametrize("callback, make_args", PARAMS)
+def bench_callback(benchmark, ctx, callback, make_args):
+    function = raw(callback)
+    manager.make_episode(ctx.ref_agent, ctx.scenario)
+    manager.make_episode(ctx.study_agent, ctx.scenario)
+
+    def run():
+        # request context of the callbacks reading dash.callback_context, with no input triggered
+        with app.server.test_request_context():
+            return json.dumps(function(*make_args(ctx)), cls=PlotlyJSONEncoder)
+
+    benchmark(run)
+
+
+LAYOUTS = [
+    pytest.param(lambda ctx: overview_lyt.layout(ctx.scenario, ctx.ref_agent), id="overview"),
+    pytest.param(lambda ctx: macro_lyt.layout([], ctx.scenario, ctx.study_agent), id="macro"),
+    pytest.param(lambda ctx: micro_lyt.layout(ctx.timestamp, ctx.study_agent, ctx.ref_agent, ctx.scenario),
+                 id="micro"),
+]
+
+
+@pytest.mark.benchmark(group="layouts")
+@pytest.mark.parametrize("make_layout", LAYOUTS)
+def bench_layout(benchmark, ctx, make_layout):
+    def run():
+        return json.dumps(make_layout(ctx), cls=PlotlyJSONEncoder)
+
+    benchmark(run)
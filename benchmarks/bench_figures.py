@@ -0,0 +1,66 @@
+"""
+    Benchmarks of the payload of the time series figures, drawn with SVG or WebGL traces.
+
+    Each figure is built on the whole episode, JSON encoded as Dash would send it and
+    decoded as the browser would. The size of the payload, its number of points and the
+    type of its traces are saved in the extra_info of the benchmark; the drawing itself
+    happens in the browser and is not measured here.
+"""
+import json
+
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+
+from grid2viz.src import manager
+from grid2viz.src.micro import micro_clbk
+from grid2viz.src.utils import common_graph
+
+from conftest import empty_figure
+
+# threshold of use_webgl for each mode: never switch or always switch
+MODES = {"svg": 0, "webgl": 1}
+
+
+def usage_rate_figure(ctx):
+    episode = manager.make_episode(ctx.study_agent, ctx.scenario)
+    return common_graph.agent_overflow_usage_rate_trace(episode, empty_figure(), empty_figure())[1]
+
+
+def loads_figure(ctx):
+    episode = manager.make_episode(ctx.study_agent, ctx.scenario)
+    return {"data": common_graph.environment_ts_data("Load", episode, list(episode.load_names)), "layout": {}}
+
+
+def flows_figure(ctx):
+    episode = manager.make_episode(ctx.study_agent, ctx.scenario)
+    lines = ["or_active_" + name for name in episode.line_names]
+    return {"data": common_graph.use_webgl(micro_clbk.load_flows_for_lines(lines, episode)), "layout": {}}
+
+
+FIGURES = {
+    "usage_rate": usage_rate_figure,
+    "loads": loads_figure,
+    "flows": flows_figure,
+    "rewards": lambda ctx: common_graph.make_rewards_ts(ctx.study_agent, ctx.ref_agent, ctx.scenario, {}),
+    "actions": lambda ctx: common_graph.make_action_ts(ctx.study_agent, ctx.ref_agent, ctx.scenario, {}),
+}
+
+
+@pytest.mark.parametrize("mode", sorted(MODES))
+@pytest.mark.parametrize("name", sorted(FIGURES))
+def bench_figure_payload(benchmark, ctx, monkeypatch, name, mode):
+    benchmark.group = "figure_payload_" + name
+    monkeypatch.setattr(common_graph, "webgl_threshold", MODES[mode])
+    manager.make_episode(ctx.ref_agent, ctx.scenario)
+    manager.make_episode(ctx.study_agent, ctx.scenario)
+    make_figure = FIGURES[name]
+
+    def run():
+        return json.loads(json.dumps(make_figure(ctx), cls=PlotlyJSONEncoder))
+
+    figure = benchmark(run)
+    benchmark.extra_info.update(
+        payload_bytes=len(json.dumps(make_figure(ctx), cls=PlotlyJSONEncoder)),
+        points=sum(len(trace.get("x") or ()) for trace in figure["data"]),
+        trace_types=sorted({trace.get("type", "scatter") for trace in figure["data"]}),
+    )
@@ -0,0 +1,43 @@
+"""
+    Benchmarks of the episode cache paths of the manager.
+"""
+import shutil
+
+import pytest
+
+from grid2viz.src import manager
+
+
+@pytest.mark.benchmark(group="make_episode")
+def bench_make_episode_cold(benchmark, ctx, empty_cache):
+    def setup():
+        manager.store.clear()
+        shutil.rmtree(empty_cache, ignore_errors=True)
+
+    benchmark.pedantic(manager.make_episode, args=(ctx.study_agent, ctx.scenario),
+                       setup=setup, rounds=3, iterations=1)
+
+
+@pytest.mark.benchmark(group="make_episode")
+def bench_make_episode_fs_warm(benchmark, ctx, empty_cache):
+    manager.make_episode(ctx.study_agent, ctx.scenario)
+
+    benchmark.pedantic(manager.make_episode, args=(ctx.study_agent, ctx.scenario),
+                       setup=manager.store.clear, rounds=5, iterations=1)
+
+
+@pytest.mark.benchmark(group="make_episode")
+def bench_make_episode_ram_warm(benchmark, ctx):
+    manager.make_episode(ctx.study_agent, ctx.scenario)
+
+    benchmark(manager.make_episode, ctx.study_agent, ctx.scenario)
+
+
+@pytest.mark.benchmark(group="make_episode")
+def bench_make_episode_window_cold(benchmark, ctx, empty_cache):
+    def setup():
+        manager.store.clear()
+        manager.window_store.clear()
+
+    benchmark.pedantic(manager.make_episode_window, args=(ctx.study_agent, ctx.scenario, ctx.window),
+                       setup=setup, rounds=5, iterations=1)
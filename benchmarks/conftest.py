@@ -0,0 +1,74 @@
+"""
+    Set up the Grid2Viz application for the benchmarks.
+
+    The application reads its config.ini from the working directory when imported,
+    so it is written in a temporary directory, which is the working directory while
+    importing grid2viz.index only: the paths of the command line, like the
+    --benchmark-storage of pytest.ini, stay relative to the directory pytest was run from.
+    The agents are taken from the GRID2VIZ_BENCH_DIR environment variable
+    (default: the agents provided in the package) and the scenario and agents
+    from GRID2VIZ_BENCH_SCENARIO, GRID2VIZ_BENCH_REF_AGENT and GRID2VIZ_BENCH_STUDY_AGENT.
+    The file system cache is written in a temporary directory.
+"""
+import os
+import tempfile
+from collections import namedtuple
+
+import pytest
+
+import grid2viz
+from grid2viz.main import config_file
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(grid2viz.__file__))
+DATA_DIR = os.environ.get("GRID2VIZ_BENCH_DIR", "")
+
+work_dir = tempfile.mkdtemp(prefix="grid2viz_bench_")
+with open(os.path.join(work_dir, "config.ini"), "w") as f:
+    f.write(config_file.format(base_dir=os.path.abspath(DATA_DIR) if DATA_DIR else ""))
+os.environ["GRID2VIZ_ROOT"] = PACKAGE_DIR
+run_dir = os.getcwd()
+os.chdir(work_dir)
+try:
+    from grid2viz import index  # noqa: E402 (needs the config.ini written above)
+    from grid2viz.src import manager  # noqa: E402
+finally:
+    os.chdir(run_dir)
+
+
+def use_cache_dir(cache_dir):
+    """Move the file system cache, with the archives extracted in it."""
+    manager.cache_dir = cache_dir
+    manager.archives_dir = os.path.join(cache_dir, "_archives")
+
+
+use_cache_dir(os.path.join(work_dir, "_cache"))
+
+BenchContext = namedtuple("BenchContext", ["scenario", "ref_agent", "study_agent", "timestamp", "window"])
+
+
+def empty_figure():
+    return {"data": [], "layout": {}}
+
+
+@pytest.fixture(scope="session")
+def ctx():
+    scenario = os.environ.get("GRID2VIZ_BENCH_SCENARIO", sorted(manager.scenarios)[0])
+    ref_agent = os.environ.get("GRID2VIZ_BENCH_REF_AGENT", manager.best_agents[scenario]["agent"])
+    study_agent = os.environ.get("GRID2VIZ_BENCH_STUDY_AGENT", manager.agents_on_scenario(scenario)[-1])
+    episode = manager.make_episode(study_agent, scenario)
+    center = min(len(episode.timestamps) // 2, 50)
+    timestamp = episode.timestamp_index.label(center).replace("T", " ")[:16]
+    from grid2viz.src.utils import common_graph
+    window = list(common_graph.compute_windows_range(episode, center, 0, 0))
+    return BenchContext(scenario, ref_agent, study_agent, timestamp, window)
+
+
+@pytest.fixture
+def empty_cache():
+    """Use a new empty file system cache and drop the RAM cache."""
+    cache_dir = manager.cache_dir
+    use_cache_dir(tempfile.mkdtemp(prefix="cache_", dir=work_dir))
+    manager.store.clear()
+    yield manager.cache_dir
+    use_cache_dir(cache_dir)
+    manager.store.clear()
@@ -0,0 +1,459 @@
+"""
+    Load test of the Grid2Viz server with concurrent virtual users.
+
+    Each virtual user replays analyst sessions: opening a scenario, selecting a reference
+    agent, switching between study agents, zooming, picking a timestamp and scrubbing
+    the micro page slider. The users talk to the server through the Dash HTTP API
+    (/_dash-layout, /_dash-dependencies and /_dash-update-component) like a browser does:
+    the callbacks triggered by each change, and the ones triggered by new page layouts,
+    are chained until the page is settled. The components with pattern matching ids, like
+    the scenario cards, are only clicked. Clientside callbacks are not played.
+
+    The server is either grid2viz.index.server in the current process (the default, set up
+    like the benchmarks, see conftest.py) or a running server given by --url.
+
+        python benchmarks/load_test.py --users 20 --sessions 3
+        python benchmarks/load_test.py --users 20 --url http://127.0.0.1:8050 --server-pid 1234
+
+    The report gives the p50/p95/p99 latency of each callback, the throughput and the peak RSS.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+PARSER = argparse.ArgumentParser(description='Load test of the Grid2Viz server with concurrent virtual users.')
+PARSER.add_argument('--users', type=int, default=10, help='Number of concurrent virtual users (default 10)')
+PARSER.add_argument('--sessions', type=int, default=2, help='Number of sessions per user (default 2)')
+PARSER.add_argument('--agent-switches', type=int, default=2,
+                    help='Number of study agents selected in a session (default 2)')
+PARSER.add_argument('--scrubs', type=int, default=10,
+                    help='Number of slider moves on the micro page in a session (default 10)')
+PARSER.add_argument('--url', default=None,
+                    help='URL of a running Grid2Viz server (default: serve grid2viz.index in this process)')
+PARSER.add_argument('--server-pid', type=int, default=None,
+                    help='Process id of the server given by --url, to report its peak RSS (Linux only)')
+PARSER.add_argument('--seed', type=int, default=0, help='Seed of the sessions random choices (default 0)')
+PARSER.add_argument('--output', default=None, help='Write the report as JSON in this file')
+
+# Seconds between two polls of a page loading in the background
+LOADING_POLL_INTERVAL = 0.5
+# intervals polling the episodes loading in the background
+LOADING_INTERVALS = ("loading_interval", "micro_loading_interval")
+
+
+class InProcessClient(object):
+    """HTTP client of the Flask server of the application, in the current process."""
+
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data()
+
+    def post(self, path, payload):
+        response = self.client.post(path, data=json.dumps(payload), content_type="application/json")
+        return response.status_code, response.get_data()
+
+
+class HttpClient(object):
+    """HTTP client of a running server."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.url + path))
+
+    def post(self, path, payload):
+        return self._send(urllib.request.Request(
+            self.url + path, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+        ))
+
+    @staticmethod
+    def _send(request):
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+def split_output(output):
+    """Split a Dash output string ("id.prop" or "..id1.prop1...id2.prop2..") in (id, prop) pairs."""
+    if output.startswith(".."):
+        outputs = output[2:-2].split("...")
+    else:
+        outputs = [output]
+    return [tuple(spec.rsplit(".", 1)) for spec in outputs]
+
+
+def stringify_id(component_id):
+    """Get the string of a pattern matching (dict) id, as the Dash renderer writes it."""
+    return json.dumps(component_id, sort_keys=True, separators=(",", ":"))
+
+
+def parse_id(component_id):
+    """Get the dict of a pattern matching id string, None for a plain id."""
+    return json.loads(component_id) if component_id.startswith("{") else None
+
+
+def id_matches(spec_id, component_id):
+    """Tell if a component id (plain or stringified dict) matches the id of a callback dependency."""
+    if spec_id == component_id:
+        return True
+    pattern, concrete = parse_id(spec_id), parse_id(component_id)
+    if pattern is None or concrete is None or pattern.keys() != concrete.keys():
+        return False
+    return all(value == ["ALL"] or value == concrete[key] for key, value in pattern.items())
+
+
+def iter_components(value):
+    """Iterate over the components of a layout tree."""
+    if isinstance(value, dict) and "props" in value and "type" in value:
+        yield value
+        for prop in value["props"].values():
+            yield from iter_components(prop)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_components(item)
+
+
+def dependency_spec(spec):
+    """Get the (id, property) of a callback dependency, pattern matching ids as strings."""
+    component_id = spec["id"]
+    return component_id if isinstance(component_id, str) else stringify_id(component_id), spec["property"]
+
+
+class Callback(object):
+
+    def __init__(self, dependency):
+        self.output = dependency["output"]
+        self.outputs = split_output(self.output)
+        self.inputs = [dependency_spec(spec) for spec in dependency["inputs"]]
+        self.state = [dependency_spec(spec) for spec in dependency["state"]]
+        self.label = " + ".join("{}.{}".format(*spec) for spec in self.outputs)
+
+
+class Recorder(object):
+    """Thread safe store of the request latencies, by callback."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, label, latency, status):
+        with self.lock:
+            self.latencies[label].append(latency)
+            if status >= 400:
+                self.errors[label] += 1
+
+
+class BrowserSession(object):
+    """
+    Minimal Dash renderer: holds the layout of a browser tab and fires the callbacks.
+
+    Attributes
+    ----------
+    components : dict
+        components of the layout, indexed by id. Their props hold the current values.
+
+    """
+
+    def __init__(self, client, callbacks, layout, recorder):
+        self.client = client
+        self.callbacks = callbacks
+        self.recorder = recorder
+        self.layout = layout
+        self.components = {}
+        self.patterned = {}
+        self.present = set()
+        new_ids = self._refresh()
+        self._run([callback for callback in self.callbacks if self._is_initial(callback, new_ids)])
+
+    def get(self, component_id, prop, default=None):
+        component = self.components.get(component_id)
+        if component is None:
+            return default
+        return component["props"].get(prop, default)
+
+    def set(self, component_id, prop, value):
+        """Change a property like a user interaction and fire the callbacks it triggers."""
+        self.set_many({(component_id, prop): value})
+
+    def set_many(self, values):
+        """Change several properties at once, like the outputs of a callback run in the browser."""
+        for (component_id, prop), value in values.items():
+            self.components[component_id]["props"][prop] = value
+        self._run(self._triggered(set(values)), set(values))
+        self._wait_loading()
+
+    def click(self, component_id, prop="n_clicks"):
+        """Click a component with a pattern matching (dict) id and fire the callbacks it triggers."""
+        component_id = stringify_id(component_id)
+        props = self.patterned[component_id]["props"]
+        props[prop] = (props.get(prop) or 0) + 1
+        self._run(self._triggered({(component_id, prop)}), {(component_id, prop)})
+        self._wait_loading()
+
+    def _wait_loading(self):
+        # a page whose episodes are loading in the background polls their progress
+        while True:
+            polling = [interval for interval in LOADING_INTERVALS
+                       if interval in self.present and not self.get(interval, "disabled")]
+            if not polling:
+                break
+            time.sleep(LOADING_POLL_INTERVAL)
+            interval = polling[0]
+            n_intervals = (self.get(interval, "n_intervals") or 0) + 1
+            self.components[interval]["props"]["n_intervals"] = n_intervals
+            self._run(self._triggered({(interval, "n_intervals")}), {(interval, "n_intervals")})
+
+    def _refresh(self):
+        # a component is new when it is not the one known under its id, like the
+        # components of a page rendered again. The components with pattern matching
+        # (dict) ids are only kept to be clicked, by their stringified id.
+        ids, new_ids = set(), set()
+        self.patterned = {}
+        for component in iter_components(self.layout):
+            component_id = component["props"].get("id")
+            if isinstance(component_id, dict):
+                self.patterned[stringify_id(component_id)] = component
+            elif isinstance(component_id, str):
+                ids.add(component_id)
+                if self.components.get(component_id) is not component:
+                    new_ids.add(component_id)
+                    self.components[component_id] = component
+        self.present = ids
+        return new_ids
+
+    def _ready(self, callback):
+        # a wildcard input may match no component
+        return all(spec[0] in self.present or parse_id(spec[0]) is not None
+                   for spec in callback.outputs + callback.inputs)
+
+    def _is_initial(self, callback, new_ids):
+        return self._ready(callback) and any(spec[0] in new_ids for spec in callback.inputs)
+
+    def _triggered(self, changed):
+        return [callback for callback in self.callbacks
+                if self._ready(callback) and self._changed_inputs(callback, changed)]
+
+    @staticmethod
+    def _changed_inputs(callback, changed):
+        return ["{}.{}".format(*change) for change in changed
+                if any(id_matches(spec[0], change[0]) and spec[1] == change[1] for spec in callback.inputs)]
+
+    def _run(self, pending, changed=()):
+        pending = list(pending)
+        changed = set(changed)
+        while pending:
+            # wait for the callbacks computing the inputs of another one
+            outputs = {spec for callback in pending for spec in callback.outputs}
+            callback = next((callback for callback in pending if not outputs.intersection(callback.inputs)),
+                            pending[0])
+            pending.remove(callback)
+            if not self._ready(callback):
+                continue
+            updates = self._call(callback, changed)
+            if not updates:
+                continue
+            for component_id, prop in updates:
+                if component_id in self.components:
+                    self.components[component_id]["props"][prop] = updates[(component_id, prop)]
+            new_ids = self._refresh()
+            pending.extend(callback for callback in self._triggered(set(updates))
+                           if callback not in pending)
+            pending.extend(callback for callback in self.callbacks
+                           if self._is_initial(callback, new_ids) and callback not in pending)
+            changed.update(updates)
+
+    def _call(self, callback, changed):
+        def value(component_id, prop):
+            if parse_id(component_id) is None:
+                return dict(id=component_id, property=prop, value=self.get(component_id, prop))
+            # wildcard: the values of all the matching components
+            return [dict(id=json.loads(concrete_id), property=prop, value=component["props"].get(prop))
+                    for concrete_id, component in self.patterned.items() if id_matches(component_id, concrete_id)]
+
+        def values(specs):
+            return [value(component_id, prop) for component_id, prop in specs]
+
+        outputs = [dict(id=component_id, property=prop) for component_id, prop in callback.outputs]
+        payload = dict(
+            output=callback.output,
+            outputs=outputs if len(outputs) > 1 else outputs[0],
+            inputs=values(callback.inputs),
+            state=values(callback.state),
+            changedPropIds=self._changed_inputs(callback, changed)
+        )
+        start = time.perf_counter()
+        status, body = self.client.post("/_dash-update-component", payload)
+        self.recorder.add(callback.label, time.perf_counter() - start, status)
+        if status != 200:
+            return {}
+
+        body = json.loads(body)
+        response = body["response"]
+        if body.get("multi"):
+            return {(component_id, prop): value
+                    for component_id, props in response.items() for prop, value in props.items()}
+        return {callback.outputs[0]: response["props"][callback.outputs[0][1]]}
+
+
+def figure_x(session, graph_id):
+    figure = session.get(graph_id, "figure") or {}
+    for trace in figure.get("data", []):
+        if trace.get("x"):
+            return trace["x"]
+    return []
+
+
+def options(session, dropdown_id):
+    return [option["value"] for option in session.get(dropdown_id, "options") or []]
+
+
+def zoom(session, graph_id, rng):
+    x = figure_x(session, graph_id)
+    if len(x) > 2:
+        start = rng.randrange(len(x) - 2)
+        end = rng.randrange(start + 1, len(x))
+        session.set(graph_id, "relayoutData", {"xaxis.range[0]": x[start], "xaxis.range[1]": x[end]})
+
+
+def play_session(client, callbacks, args, rng, recorder):
+    """Replay an analyst session, from the scenario selection to the micro page."""
+    _, layout = client.get("/_dash-layout")
+    session = BrowserSession(client, callbacks, json.loads(layout), recorder)
+    session.set("url", "pathname", "/episodes")
+
+    # opening a scenario by clicking its card
+    scenarios = [json.loads(component_id)["index"] for component_id in session.patterned
+                 if json.loads(component_id).get("type") == "scenario_card"]
+    if not scenarios:
+        return
+    session.click({"type": "scenario_card", "index": rng.choice(scenarios)})
+
+    agents = options(session, "input_agent_selector")
+    if not agents:
+        return
+    session.set("input_agent_selector", "value", rng.choice(agents))
+    zoom(session, "usage_rate_graph", rng)
+
+    # switching study agents on the agent overview page
+    session.set("url", "pathname", "/macro")
+    study_agents = options(session, "agent_log_selector")
+    for _ in range(args.agent_switches if study_agents else 0):
+        session.set("agent_log_selector", "value", rng.choice(study_agents))
+        zoom(session, "cumulated_rewards_timeserie", rng)
+
+    # picking a timestamp and studying it
+    timestamps = figure_x(session, "cumulated_rewards_timeserie")
+    if not timestamps:
+        return
+    session.set("cumulated_rewards_timeserie", "clickData", {"points": [{"x": rng.choice(timestamps)}]})
+    session.set("url", "pathname", "/micro")
+    if "slider" not in session.components:
+        return
+    for _ in range(args.scrubs):
+        session.set("slider", "value", rng.randint(session.get("slider", "min", 0), session.get("slider", "max", 0)))
+    zoom(session, "usage_rate_ts", rng)
+    session.set("enlarge_right", "n_clicks", (session.get("enlarge_right", "n_clicks") or 0) + 1)
+
+
+def peak_rss_mb(server_pid=None):
+    """Peak resident set size of this process, or of the server process, in MB."""
+    if server_pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open("/proc/{}/status".format(server_pid)) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def make_report(recorder, duration, args):
+    callbacks = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        callbacks[label] = dict(
+            count=len(latencies), errors=recorder.errors[label],
+            p50=percentile(latencies, 50), p95=percentile(latencies, 95), p99=percentile(latencies, 99)
+        )
+    n_requests = sum(len(latencies) for latencies in recorder.latencies.values())
+    return dict(
+        users=args.users, sessions=args.users * args.sessions, duration=duration, requests=n_requests,
+        throughput=n_requests / duration if duration else 0., peak_rss_mb=peak_rss_mb(args.server_pid),
+        callbacks=callbacks
+    )
+
+
+def print_report(report):
+    print("{:<70} {:>7} {:>6} {:>9} {:>9} {:>9}".format("callback", "count", "errors", "p50 (ms)", "p95 (ms)",
+                                                       "p99 (ms)"))
+    for label, stats in sorted(report["callbacks"].items(), key=lambda item: -item[1]["p95"]):
+        print("{:<70} {:>7} {:>6} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+            label[:70], stats["count"], stats["errors"],
+            1000 * stats["p50"], 1000 * stats["p95"], 1000 * stats["p99"]))
+    print("{} users, {} sessions, {} requests in {:.1f} s: {:.1f} requests/s".format(
+        report["users"], report["sessions"], report["requests"], report["duration"], report["throughput"]))
+    if report["peak_rss_mb"] is not None:
+        print("peak RSS: {:.0f} MB".format(report["peak_rss_mb"]))
+
+
+def main(args):
+    if args.url is None:
+        # conftest sets up the configuration and imports the application
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from conftest import index
+
+        def make_client():
+            return InProcessClient(index.server)
+    else:
+        def make_client():
+            return HttpClient(args.url)
+
+    _, dependencies = make_client().get("/_dash-dependencies")
+    callbacks = [Callback(dependency) for dependency in json.loads(dependencies)
+                 if not dependency.get("clientside_function")]
+
+    recorder = Recorder()
+
+    def user(user_id):
+        client = make_client()
+        rng = random.Random(args.seed * 1000 + user_id)
+        for _ in range(args.sessions):
+            play_session(client, callbacks, args, rng, recorder)
+
+    threads = [threading.Thread(target=user, args=(user_id,)) for user_id in range(args.users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = make_report(recorder, time.perf_counter() - start, args)
+
+    print_report(report)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main(PARSER.parse_args())
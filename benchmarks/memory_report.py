@@ -0,0 +1,58 @@
+"""
+    Report the memory used by the data frames of episodes, before and after their compaction,
+    with the memory used by their observations and actions, which are not compacted, and by
+    the indexes attached to the episodes of the cache (after the compaction only).
+
+    The episodes are computed from the agent logs, like on a cold cache, with the same
+    environment variables as the benchmarks (see conftest.py).
+
+        python benchmarks/memory_report.py --scenario 000 --agents do_nothing greedy
+"""
+import argparse
+import os
+import sys
+
+PARSER = argparse.ArgumentParser(description='Memory used by the episodes before and after the compaction of their data frames.')
+PARSER.add_argument('--scenario', default=None, help='Scenario of the episodes (default: the first one)')
+PARSER.add_argument('--agents', nargs='*', default=None,
+                    help='Agents of the episodes (default: all the agents of the scenario)')
+PARSER.add_argument('--details', action='store_true', help='Show the memory used by each frame and list of objects')
+
+
+def megabytes(n_bytes):
+    return n_bytes / 2 ** 20
+
+
+def main(args):
+    # conftest sets up the configuration and imports the application
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from conftest import manager
+    from grid2viz.src.utils.episode_index import index_episode
+    from grid2viz.src.utils.episode_memory import compact_episode, memory_usage
+
+    scenario = args.scenario if args.scenario is not None else sorted(manager.scenarios)[0]
+    agents = args.agents if args.agents else manager.agents_on_scenario(scenario)
+
+    print("{:<40} {:>12} {:>12} {:>8}".format("episode", "before (MB)", "after (MB)", "ratio"))
+    total_before, total_after = 0, 0
+    for agent in agents:
+        episode = manager.compute_episode(scenario, agent)
+        before = memory_usage(episode)
+        # the episodes of the cache are compacted then indexed
+        after = memory_usage(index_episode(compact_episode(episode)))
+        if args.details:
+            for name in after:
+                print("  {:<38} {:>12.2f} {:>12.2f} {:>8.2f}".format(
+                    name, megabytes(before.get(name, 0)), megabytes(after[name]),
+                    after[name] / max(before.get(name, 0), 1)))
+        print("{:<40} {:>12.2f} {:>12.2f} {:>8.2f}".format(
+            "{}/{}".format(agent, scenario), megabytes(sum(before.values())), megabytes(sum(after.values())),
+            sum(after.values()) / max(sum(before.values()), 1)))
+        total_before += sum(before.values())
+        total_after += sum(after.values())
+    print("{:<40} {:>12.2f} {:>12.2f} {:>8.2f}".format(
+        "total", megabytes(total_before), megabytes(total_after), total_after / max(total_before, 1)))
+
+
+if __name__ == "__main__":
+    main(PARSER.parse_args())
@@ -0,0 +1,246 @@
+"""
+    Generate synthetic agent logs in the grid2op format, to exercise Grid2Viz at scale.
+
+    The generated folder can be used as base_dir of Grid2Viz (--path option) or as
+    GRID2VIZ_BENCH_DIR of the benchmarks. Only numpy is needed, grid2op is not used:
+    the files follow the layout grid2op writes for a CompleteObservation, a
+    TopologyAction agent and an Action environment modification.
+
+    Example: 50 agents on 4 scenarios of a year of 5 minutes steps on a 118 substations grid
+
+        python benchmarks/synthetic_episodes.py out_dir --agents 50 --scenarios 4 --steps 105120 --subs 118
+"""
+import argparse
+import datetime as dt
+import json
+import os
+
+import numpy as np
+
+PARSER = argparse.ArgumentParser(description='Generate synthetic grid2op agent logs for Grid2Viz.')
+PARSER.add_argument('path', help='The folder where the agents are written (it is created if needed)')
+PARSER.add_argument('--agents', type=int, default=2, help='Number of agents (default 2)')
+PARSER.add_argument('--scenarios', type=int, default=2, help='Number of scenarios per agent (default 2)')
+PARSER.add_argument('--steps', type=int, default=288, help='Number of steps of the scenarios (default 288)')
+PARSER.add_argument('--subs', type=int, default=14, help='Number of substations of the grid (default 14)')
+PARSER.add_argument('--lines', type=int, default=None,
+                    help='Number of powerlines of the grid (default about 1.5 times the number of substations)')
+PARSER.add_argument('--action-density', type=float, default=0.05,
+                    help='Probability that the agent acts at a given step (default 0.05)')
+PARSER.add_argument('--min-survival', type=float, default=0.1,
+                    help='Minimum share of the scenario played by an agent (default 0.1)')
+PARSER.add_argument('--seed', type=int, default=0, help='Seed of the random generator (default 0)')
+
+STEP_DURATION = dt.timedelta(minutes=5)
+START_DATE = dt.datetime(2019, 1, 1)
+
+PARAMETERS = {
+    "ENV_DC": False,
+    "FORECAST_DC": False,
+    "HARD_OVERFLOW_THRESHOLD": 2,
+    "MAX_LINE_STATUS_CHANGED": 1,
+    "MAX_SUB_CHANGED": 1,
+    "NB_TIMESTEP_LINE_STATUS_REMODIF": 0,
+    "NB_TIMESTEP_POWERFLOW_ALLOWED": 2,
+    "NB_TIMESTEP_RECONNECTION": 10,
+    "NB_TIMESTEP_TOPOLOGY_REMODIF": 0,
+    "NO_OVERFLOW_DISCONNECTION": False
+}
+
+
+class SyntheticGrid(object):
+    """
+    Random grid description, with the attributes of a grid2op space.
+
+    Substations are connected in a ring plus random chords, each substation has
+    a load and every third one a generator.
+    """
+
+    def __init__(self, n_sub, n_line, rng):
+        self.n_sub = n_sub
+        ring = [(i, (i + 1) % n_sub) for i in range(n_sub)]
+        chords = [tuple(sorted(rng.choice(n_sub, 2, replace=False))) for _ in range(max(0, n_line - n_sub))]
+        lines = sorted(tuple(sorted(line)) for line in ring + chords)
+        self.line_or_to_subid = np.array([line[0] for line in lines])
+        self.line_ex_to_subid = np.array([line[1] for line in lines])
+        self.load_to_subid = np.arange(n_sub)
+        self.gen_to_subid = np.arange(0, n_sub, 3)
+        self.n_line = len(lines)
+        self.n_load = len(self.load_to_subid)
+        self.n_gen = len(self.gen_to_subid)
+
+        # the topology vector is ordered substation by substation
+        elements = [[] for _ in range(n_sub)]
+        for kind, subids in [("line_or", self.line_or_to_subid), ("line_ex", self.line_ex_to_subid),
+                             ("gen", self.gen_to_subid), ("load", self.load_to_subid)]:
+            for i, sub in enumerate(subids):
+                elements[sub].append((kind, i))
+        self.sub_info = np.array([len(sub_elements) for sub_elements in elements])
+        self.dim_topo = int(self.sub_info.sum())
+        self.to_sub_pos = {kind: np.zeros(n, dtype=int) for kind, n in
+                           [("line_or", self.n_line), ("line_ex", self.n_line),
+                            ("gen", self.n_gen), ("load", self.n_load)]}
+        self.pos_topo_vect = {kind: np.zeros_like(positions) for kind, positions in self.to_sub_pos.items()}
+        position = 0
+        for sub_elements in elements:
+            for sub_pos, (kind, i) in enumerate(sub_elements):
+                self.to_sub_pos[kind][i] = sub_pos
+                self.pos_topo_vect[kind][i] = position
+                position += 1
+
+        self.name_line = ["{}_{}_{}".format(o, e, i)
+                          for i, (o, e) in enumerate(zip(self.line_or_to_subid, self.line_ex_to_subid))]
+        self.name_load = ["load_{}_{}".format(sub, i) for i, sub in enumerate(self.load_to_subid)]
+        self.name_gen = ["gen_{}_{}".format(sub, i) for i, sub in enumerate(self.gen_to_subid)]
+        self.name_sub = ["sub_{}".format(i) for i in range(n_sub)]
+
+    def space_dict(self, subtype):
+        description = {key: None for key in [
+            "gen_cost_per_MW", "gen_max_ramp_down", "gen_max_ramp_up", "gen_min_downtime", "gen_min_uptime",
+            "gen_pmax", "gen_pmin", "gen_redispatchable", "gen_shutdown_cost", "gen_startup_cost", "gen_type"]}
+        for kind, prefix in [("gen", "gen"), ("load", "load"), ("line_or", "line_or"), ("line_ex", "line_ex")]:
+            description["{}_pos_topo_vect".format(prefix)] = self.pos_topo_vect[kind].tolist()
+            description["{}_to_sub_pos".format(prefix)] = self.to_sub_pos[kind].tolist()
+        description.update(
+            gen_to_subid=self.gen_to_subid.tolist(), load_to_subid=self.load_to_subid.tolist(),
+            line_or_to_subid=self.line_or_to_subid.tolist(), line_ex_to_subid=self.line_ex_to_subid.tolist(),
+            name_gen=self.name_gen, name_line=self.name_line, name_load=self.name_load, name_sub=self.name_sub,
+            sub_info=self.sub_info.tolist(), subtype=subtype
+        )
+        return description
+
+
+def make_environment(grid, n_steps, rng):
+    """
+        Draw the injections of a scenario, shared by all the agents.
+
+        :return: dict of (n_steps + 1, n) arrays
+    """
+    t = np.arange(n_steps + 1)[:, None]
+    daily = 1 + 0.2 * np.sin(2 * np.pi * t / 288)
+    load_p = daily * rng.uniform(5, 60, grid.n_load) + rng.normal(0, 1, (n_steps + 1, grid.n_load))
+    prod_p = np.repeat(load_p.sum(axis=1, keepdims=True) / grid.n_gen, grid.n_gen, axis=1)
+    thermal_limit = rng.uniform(100, 700, grid.n_line)
+    flows = daily * rng.uniform(-1, 1, grid.n_line) * thermal_limit * 0.8 + \
+        rng.normal(0, 5, (n_steps + 1, grid.n_line))
+    return dict(load_p=load_p, prod_p=prod_p, flows=flows, thermal_limit=thermal_limit)
+
+
+def make_episode(grid, environment, n_steps, n_played, action_density, rng):
+    """
+        Draw the logs of an agent on a scenario.
+
+        :return: observations, actions and rewards arrays, NaN after the last played step
+    """
+    obs_rows = n_played + 1
+    timestamps = [START_DATE + i * STEP_DURATION for i in range(obs_rows)]
+
+    # agent actions: set a line status or an element of a substation on bus 2
+    acting = rng.random(n_played) < action_density
+    actions = np.zeros((n_steps, 2 * grid.n_line + 2 * grid.dim_topo))
+    topo_vect = np.ones((obs_rows, grid.dim_topo))
+    line_status = np.ones((obs_rows, grid.n_line))
+    for step in np.flatnonzero(acting):
+        if rng.random() < 0.5:
+            line = rng.integers(grid.n_line)
+            status = rng.choice([-1, 1])
+            actions[step, line] = status
+            line_status[step + 1:, line] = 1 if status > 0 else 0
+        else:
+            element = rng.integers(grid.dim_topo)
+            actions[step, 2 * grid.n_line + element] = 2
+            topo_vect[step + 1:, element] = 2
+    actions[n_played:] = np.nan
+
+    noise = rng.normal(1, 0.05, (obs_rows, grid.n_line))
+    p_or = environment["flows"][:obs_rows] * noise * line_status
+    a_or = np.abs(p_or) * 1000 / (np.sqrt(3) * 138)
+    rho = np.abs(p_or) / environment["thermal_limit"]
+    v_or = np.full((obs_rows, grid.n_line), 138.) * line_status
+    prod_p = environment["prod_p"][:obs_rows]
+    load_p = environment["load_p"][:obs_rows]
+
+    attributes = [
+        np.array([[ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.weekday()] for ts in timestamps]),
+        prod_p, 0.3 * prod_p, np.full_like(prod_p, 140.),  # prod_p, prod_q, prod_v
+        load_p, 0.7 * load_p, np.full_like(load_p, 138.),  # load_p, load_q, load_v
+        p_or, 0.1 * p_or, v_or, a_or,  # p_or, q_or, v_or, a_or
+        -p_or, -0.1 * p_or, v_or, a_or,  # p_ex, q_ex, v_ex, a_ex
+        rho, line_status, (rho > 1).astype(float),  # rho, line_status, timestep_overflow
+        topo_vect,
+        np.zeros((obs_rows, grid.n_line)), np.zeros((obs_rows, grid.n_sub)),  # cooldowns
+        np.zeros((obs_rows, grid.n_line)),  # time_before_line_reconnectable
+        -np.ones((obs_rows, grid.n_line)), np.zeros((obs_rows, grid.n_line)),  # maintenance
+        np.zeros((obs_rows, grid.n_gen)), np.zeros((obs_rows, grid.n_gen)),  # target and actual dispatch
+    ]
+    observations = np.full((n_steps + 1, sum(attribute.shape[1] for attribute in attributes)), np.nan)
+    observations[:obs_rows] = np.hstack(attributes)
+
+    rewards = np.full(n_steps, np.nan)
+    rewards[:n_played] = np.clip(1 - rho[1:].max(axis=1), 0, None) * 20
+    return observations, actions, rewards
+
+
+def write_agent(path, grid, environments, scenario_names, n_steps, args, rng):
+    os.makedirs(path, exist_ok=True)
+    for file_name, subtype in [("dict_observation_space.json", "grid2op.Observation.CompleteObservation"),
+                               ("dict_action_space.json", "grid2op.Action.TopologyAction"),
+                               ("dict_env_modification_space.json", "grid2op.Action.Action")]:
+        with open(os.path.join(path, file_name), "w") as f:
+            json.dump(grid.space_dict(subtype), f, indent=4, sort_keys=True)
+
+    env_modification_size = 3 * grid.n_gen + 2 * grid.n_load + 4 * grid.n_line + 2 * grid.dim_topo
+    for scenario, environment in zip(scenario_names, environments):
+        scenario_path = os.path.join(path, scenario)
+        os.makedirs(scenario_path, exist_ok=True)
+        n_played = int(rng.integers(max(1, int(args.min_survival * n_steps)), n_steps + 1))
+        observations, actions, rewards = make_episode(
+            grid, environment, n_steps, n_played, args.action_density, rng)
+
+        np.save(os.path.join(scenario_path, "observations.npy"), observations)
+        np.save(os.path.join(scenario_path, "actions.npy"), actions)
+        np.save(os.path.join(scenario_path, "rewards.npy"), rewards)
+        env_modifications = np.zeros((n_steps, env_modification_size))
+        env_modifications[n_played:] = np.nan
+        np.save(os.path.join(scenario_path, "env_modifications.npy"), env_modifications)
+        np.save(os.path.join(scenario_path, "disc_lines_cascading_failure.npy"),
+                np.zeros((n_steps, grid.n_line), dtype=bool))
+        exec_times = np.full(n_steps, np.nan)
+        exec_times[:n_played] = rng.uniform(1e-4, 2e-4, n_played)
+        np.save(os.path.join(scenario_path, "agent_exec_times.npy"), exec_times)
+
+        meta = {
+            "backend_type": "PandaPowerBackend",
+            "chronics_max_timestep": str(n_steps),
+            "chronics_path": scenario,
+            "cumulative_reward": float(np.nansum(rewards)),
+            "env_type": "Environment",
+            "grid_path": "synthetic_{}_subs_{}_lines.json".format(grid.n_sub, grid.n_line),
+            "nb_timestep_played": n_played
+        }
+        with open(os.path.join(scenario_path, "episode_meta.json"), "w") as f:
+            json.dump(meta, f, indent=4, sort_keys=True)
+        episode_times = {"Agent": {"total": float(np.nansum(exec_times))},
+                         "Env": {"apply_act": 0., "observation_computation": 0.,
+                                 "powerflow_computation": 0., "total": 0.},
+                         "total": float(np.nansum(exec_times))}
+        with open(os.path.join(scenario_path, "episode_times.json"), "w") as f:
+            json.dump(episode_times, f, indent=4, sort_keys=True)
+        with open(os.path.join(scenario_path, "_parameters.json"), "w") as f:
+            json.dump(PARAMETERS, f, indent=4, sort_keys=True)
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    n_line = args.lines if args.lines is not None else int(1.5 * args.subs)
+    grid = SyntheticGrid(args.subs, max(n_line, args.subs), rng)
+    scenario_names = ["{:04d}".format(i) for i in range(args.scenarios)]
+    environments = [make_environment(grid, args.steps, rng) for _ in scenario_names]
+    for i in range(args.agents):
+        agent = "synthetic_agent_{:03d}".format(i)
+        print("INFO Writing agent {}".format(agent))
+        write_agent(os.path.join(args.path, agent), grid, environments, scenario_names, args.steps, args, rng)
+
+
+if __name__ == "__main__":
+    main(PARSER.parse_args())
@@ -0,0 +1,169 @@
+/*
+ * Clientside functions of the network graph of the micro page.
+ * A state only carries the per step attributes of the lines, substations, loads and generators,
+ * the figure skeleton stays in the browser (see src/utils/network_graph.py).
+ * In playback mode, the states come by batches of frames stored column-wise
+ * and are animated here, without fetching a state per step; the slider follows
+ * the played step.
+ */
+(function () {
+    // same as injection_color in network_graph.py
+    function injectionColor(meta, color, bus) {
+        if (bus < 1) {
+            return meta.palette[0];
+        }
+        return bus === 1 ? color : meta.sub_split_color;
+    }
+
+    function applyInjections(trace, powers, buses, color, meta) {
+        return Object.assign({}, trace, {
+            text: trace.text.map(function (text, j) {
+                var name = text.split("<br>")[0];
+                return name + "<br>power: " + powers[j] + " MW<br>bus: " + (buses[j] > 0 ? buses[j] : "disconnected");
+            }),
+            marker: Object.assign({}, trace.marker, {
+                color: buses.map(function (bus) {
+                    return injectionColor(meta, color, bus);
+                })
+            })
+        });
+    }
+
+    function applyState(state, figure) {
+        var meta = figure.layout.meta;
+        var data = figure.data.slice();
+        var i;
+        for (i = 0; i < meta.n_line; i++) {
+            data[i] = Object.assign({}, data[i], {
+                line: {
+                    color: meta.palette[state.colors[i]],
+                    width: 3,
+                    dash: state.status[i] ? "solid" : "dash"
+                },
+                text: data[i].name + "<br>usage rate: " + state.rho[i] + "<br>flow: " + state.p[i] + " MW"
+            });
+        }
+        data[meta.n_line] = Object.assign({}, data[meta.n_line], {
+            text: state.p.map(function (p, j) {
+                return state.status[j] ? p + " MW" : "";
+            })
+        });
+        var subs = data[meta.n_line + 1];
+        data[meta.n_line + 1] = Object.assign({}, subs, {
+            marker: Object.assign({}, subs.marker, {
+                color: state.buses.map(function (buses) {
+                    return buses > 1 ? meta.sub_split_color : meta.sub_color;
+                })
+            })
+        });
+        data[meta.n_line + 2] = applyInjections(data[meta.n_line + 2], state.load_p, state.load_bus,
+            meta.load_color, meta);
+        data[meta.n_line + 3] = applyInjections(data[meta.n_line + 3], state.gen_p, state.gen_bus,
+            meta.gen_color, meta);
+        return Object.assign({}, figure, {data: data});
+    }
+
+    function frameState(frames, step) {
+        if (!frames || step < frames.start || step >= frames.start + frames.colors.length) {
+            return null;
+        }
+        var k = step - frames.start;
+        return {
+            colors: frames.colors[k],
+            rho: frames.rho[k],
+            p: frames.p[k],
+            status: frames.status[k],
+            buses: frames.buses[k],
+            load_p: frames.load_p[k],
+            load_bus: frames.load_bus[k],
+            gen_p: frames.gen_p[k],
+            gen_bus: frames.gen_bus[k]
+        };
+    }
+
+    // last inputs seen by follow_playback, to tell which one changed
+    var lastTarget, lastPosition;
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        network: {
+            apply_state: function (state, figure) {
+                if (!state || !figure || !figure.layout || !figure.layout.meta) {
+                    return figure;
+                }
+                return applyState(state, figure);
+            },
+
+            render: function (state, position, frames, figure) {
+                if (!figure || !figure.layout || !figure.layout.meta) {
+                    return figure;
+                }
+                // the playback frame is shown while playing, and after a pause
+                // until the slider is moved
+                if (position && (position.playing || (state && state.step === position.from))) {
+                    var frame = frameState(frames, position.step);
+                    if (frame) {
+                        return applyState(frame, figure);
+                    }
+                }
+                if (!state) {
+                    return figure;
+                }
+                return applyState(state, figure);
+            },
+
+            follow_playback: function (target, position, min, max) {
+                // the slider goes to the step set by the server (time window, jumps),
+                // and follows the played step while it is in the range of the slider
+                var no_update = window.dash_clientside.no_update;
+                var targetKey = JSON.stringify(target);
+                var positionKey = JSON.stringify(position);
+                if (targetKey !== lastTarget) {
+                    lastTarget = targetKey;
+                    lastPosition = positionKey;
+                    return target === null || target === undefined ? no_update : target;
+                }
+                if (positionKey === lastPosition || !position) {
+                    return no_update;
+                }
+                lastPosition = positionKey;
+                if (position.step < min || position.step > max) {
+                    return no_update;
+                }
+                return position.step;
+            },
+
+            playback: function (n_intervals, n_clicks, frames, slider_value, position) {
+                var no_update = window.dash_clientside.no_update;
+                n_clicks = n_clicks || 0;
+                position = position || {step: slider_value, from: slider_value, clicks: 0, playing: false};
+
+                if (n_clicks !== position.clicks) {
+                    // play / pause button clicked
+                    if (position.playing) {
+                        return [true, "Play", Object.assign({}, position, {clicks: n_clicks, playing: false}), no_update];
+                    }
+                    var start = {step: slider_value, from: slider_value, clicks: n_clicks, playing: true};
+                    return [false, "Pause", start, {step: slider_value}];
+                }
+                if (!position.playing) {
+                    return [no_update, no_update, no_update, no_update];
+                }
+
+                var next = position.step + 1;
+                if (frames && next >= frames.n_steps) {
+                    return [true, "Play", Object.assign({}, position, {playing: false}), no_update];
+                }
+                if (!frameState(frames, next)) {
+                    // the batch is still on its way
+                    return [no_update, no_update, no_update, no_update];
+                }
+                var request = no_update;
+                var end = frames.start + frames.colors.length;
+                if (next === end - frames.prefetch && end < frames.n_steps) {
+                    request = {step: next};
+                }
+                return [no_update, no_update, Object.assign({}, position, {step: next}), request];
+            }
+        }
+    });
+})();
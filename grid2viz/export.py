@@ -0,0 +1,277 @@
+"""
+    Export static reports of the agents, without running the server.
+
+    For each (agent, scenario) the overview, agent overview (macro) and agent study (micro)
+    figures are written as self-contained HTML pages in <output>/<scenario>/<agent>/ and the
+    KPIs of the episode are appended to <output>/kpis.csv. An episode that fails to export is
+    listed in kpis.csv with its error, and the export goes on with the other episodes. The figures are built by the
+    page callbacks and the builders of common_graph, like in the application.
+
+    The episodes are exported on a process pool, one at a time per process: the caches of
+    an episode are dropped once it is written, so that memory stays flat over thousands of
+    episodes. The episodes of the best agents, shown on the pages of all the agents of their
+    scenario, are loaded once before the pool starts and kept by the processes. The file
+    system cache of the application is used and filled as usual.
+
+        python -m grid2viz.export reports --path /path/to/agents --processes 4
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+
+PARSER_EXPORT = argparse.ArgumentParser(description='Export static reports of the agents studied with Grid2Viz.')
+PARSER_EXPORT.add_argument('output', help='The folder where the reports are written')
+PARSER_EXPORT.add_argument('--path', default=None,
+                           help='The path where the log of the experience are stored (default None to export the '
+                                'example data provided in the package)')
+PARSER_EXPORT.add_argument('--agents', nargs='*', default=None, help='Export only these agents (default all)')
+PARSER_EXPORT.add_argument('--scenarios', nargs='*', default=None, help='Export only these scenarios (default all)')
+PARSER_EXPORT.add_argument('--processes', type=int, default=None,
+                           help='Number of export processes (default the number of CPUs)')
+PARSER_EXPORT.add_argument('--plotlyjs', choices=["embed", "cdn"], default="embed",
+                           help='Embed plotly.js in each page (self-contained, default) or load it from a CDN')
+
+KPI_FIELDS = ["scenario", "agent", "best_agent", "nb_timestep_played", "chronics_max_timestep",
+              "cumulative_reward", "nb_overflow", "nb_action", "max_usage_rate", "error"]
+
+# Number of episodes exported by a process before it is replaced
+MAX_TASKS_PER_PROCESS = 100
+
+# RAM cache ids of the episodes loaded before the pool starts, kept between the exports
+shared_episodes = set()
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<h1>{title}</h1>
+{sections}
+</body>
+</html>
+"""
+
+
+def empty_figure():
+    return {"data": [], "layout": {}}
+
+
+def to_html(title, figures, plotlyjs):
+    """
+        Build a HTML page of figures.
+
+        :param title: title of the page
+        :param figures: list of (title, figure dict)
+        :param plotlyjs: "embed" to include plotly.js in the page or "cdn"
+        :return: html string
+    """
+    from plotly import io as pio
+    from plotly.utils import PlotlyJSONEncoder
+
+    sections = []
+    for i, (figure_title, figure) in enumerate(figures):
+        # the callbacks may return graph objects inside figure dicts
+        figure = json.loads(json.dumps(figure, cls=PlotlyJSONEncoder))
+        include_plotlyjs = False if i > 0 else (True if plotlyjs == "embed" else "cdn")
+        sections.append("<h2>{}</h2>\n{}".format(figure_title, pio.to_html(
+            figure, include_plotlyjs=include_plotlyjs, full_html=False, validate=False)))
+    return PAGE_TEMPLATE.format(title=title, sections="\n".join(sections))
+
+
+def overview_figures(agent, scenario):
+    from .src.overview import overview_clbk
+    from .src.manager import make_episode, best_agents
+    from .src.utils.callback_cache import raw
+
+    best_episode = make_episode(best_agents[scenario]["agent"], scenario)
+    overflow, usage = raw(overview_clbk.update_agent_ref_graph)(
+        agent, scenario, None, empty_figure(), empty_figure())
+    return [
+        ("Consumption profile", raw(overview_clbk.update_profile_conso_graph)(scenario, empty_figure())),
+        ("Production share", raw(overview_clbk.update_production_share_graph)(scenario, empty_figure())),
+        ("Loads", raw(overview_clbk.load_environments_ts)(
+            list(best_episode.load_names), None, empty_figure(), "Load", scenario)),
+        ("Overflow and maintenances", overflow),
+        ("Usage rate", usage),
+    ]
+
+
+def macro_figures(agent, ref_agent, scenario):
+    from .src.macro import macro_clbk
+    from .src.utils.callback_cache import raw
+
+    overflow, usage = raw(macro_clbk.update_agent_log_graph)(agent, None, empty_figure(), empty_figure(), scenario)
+    actions_sub, actions_line = raw(macro_clbk.update_agent_log_action_graphs)(
+        agent, empty_figure(), empty_figure(), scenario)
+    return [
+        ("Instant and cumulated rewards", raw(macro_clbk.load_reward_data_scatter)(
+            agent, None, empty_figure(), ref_agent, scenario)),
+        ("Overflow and maintenances", overflow),
+        ("Usage rate", usage),
+        ("Actions", raw(macro_clbk.update_actions_graph)(agent, None, empty_figure(), ref_agent, scenario)),
+        ("Action repartition", raw(macro_clbk.update_action_repartition_pie)(agent, empty_figure(), scenario)),
+        ("Actions per substation", actions_sub),
+        ("Actions per line", actions_line),
+        ("Maintenance duration", raw(macro_clbk.maintenance_duration_hist)(agent, empty_figure(), scenario)),
+    ]
+
+
+def micro_figures(agent, ref_agent, scenario):
+    from .src.manager import make_episode, make_network
+    from .src.utils import common_graph
+
+    episode = make_episode(agent, scenario)
+    overflow, usage = common_graph.agent_overflow_usage_rate_trace(episode, empty_figure(), empty_figure())
+    figures = [
+        ("Instant and cumulated rewards", common_graph.make_rewards_ts(agent, ref_agent, scenario, {})),
+        ("Actions", common_graph.make_action_ts(agent, ref_agent, scenario, {})),
+        ("Overflow", overflow),
+        ("Usage rate", usage),
+    ]
+    # the network at the step where the lines are the most loaded
+    rho = episode.line_states.rho
+    if len(rho) and len(episode.observations):
+        step = min(int(rho.max(axis=1, initial=0).argmax()), len(episode.observations) - 1)
+        figures.append(("Network at {} (highest usage rate)".format(episode.timestamp_index.label(step)),
+                        make_network(episode).get_plot_observation(episode.observations[step])))
+    return figures
+
+
+def episode_kpis(agent, scenario):
+    from .src.utils.episode_kpis import get_nb_action_agent, get_nb_overflow_agent
+    from .src.manager import make_episode, best_agents
+
+    episode = make_episode(agent, scenario)
+    rho = episode.line_states.rho
+    return dict(
+        scenario=scenario,
+        agent=agent,
+        best_agent=best_agents[scenario]["agent"] == agent,
+        nb_timestep_played=episode.meta["nb_timestep_played"],
+        chronics_max_timestep=episode.meta["chronics_max_timestep"],
+        cumulative_reward=episode.meta["cumulative_reward"],
+        nb_overflow=int(get_nb_overflow_agent(episode)),
+        nb_action=int(get_nb_action_agent(episode)),
+        max_usage_rate=float(rho.max()) if rho.size else None,
+    )
+
+
+def export_episode(task):
+    """
+        Write the report pages of an episode, then drop it from the caches in memory.
+
+        :param task: (agent, scenario, output folder, plotlyjs mode)
+        :return: dict of the KPIs of the episode, or of its error and traceback if it failed
+    """
+    agent, scenario, output, plotlyjs = task
+    from .src import manager
+    from .src.utils import callback_cache
+
+    try:
+        ref_agent = manager.best_agents[scenario]["agent"]
+        directory = os.path.join(output, scenario, agent)
+        os.makedirs(directory, exist_ok=True)
+        pages = [
+            ("overview.html", "Scenario Overview", overview_figures(agent, scenario)),
+            ("macro.html", "Agent Overview", macro_figures(agent, ref_agent, scenario)),
+            ("micro.html", "Agent Study", micro_figures(agent, ref_agent, scenario)),
+        ]
+        for file_name, title, figures in pages:
+            with open(os.path.join(directory, file_name), "w") as f:
+                f.write(to_html("{}: {} on {}".format(title, agent, scenario), figures, plotlyjs))
+        return episode_kpis(agent, scenario)
+    except Exception as e:
+        return dict(scenario=scenario, agent=agent, error="{}: {}".format(type(e).__name__, e),
+                    traceback=traceback.format_exc())
+    finally:
+        for key in set(manager.store) - shared_episodes:
+            del manager.store[key]
+        callback_cache.clear()
+
+
+def load_shared_episodes(scenarios):
+    """
+        Load the episodes of the best agents of the scenarios, so that they are computed and
+        written to the file system cache once, and inherited by the export processes.
+
+        :param scenarios: scenarios to export
+    """
+    from .src import manager
+
+    for scenario in scenarios:
+        agent = manager.best_agents[scenario]["agent"]
+        try:
+            manager.make_episode(agent, scenario)
+        except Exception as e:
+            # the episodes of the scenario report the error
+            print("WARNING failed to load {} on {}: {}".format(agent, scenario, e))
+            continue
+        shared_episodes.add(manager.make_ram_cache_id(scenario, agent))
+
+
+def list_episodes(agents=None, scenarios=None):
+    """
+        List the (agent, scenario) pairs to export.
+
+        :param agents: agents to keep (default all)
+        :param scenarios: scenarios to keep (default all)
+        :return: list of (agent, scenario)
+    """
+    from .src import manager
+
+    episodes = []
+    for scenario in sorted(manager.scenarios):
+        if scenarios is not None and scenario not in scenarios:
+            continue
+        for agent in manager.agents_on_scenario(scenario):
+            if agents is None or agent in agents:
+                episodes.append((agent, scenario))
+    return episodes
+
+
+def main(args):
+    from .main import config_file, cur_dir
+
+    with open("config.ini", "w") as f:
+        if args.path is not None:
+            f.write(config_file.format(base_dir=os.path.abspath(args.path)))
+        else:
+            print("INFO Using the default provided environment")
+            f.write(config_file.format(base_dir=""))
+    os.environ["GRID2VIZ_ROOT"] = cur_dir
+    # registers the callbacks before the processes are forked
+    from . import index  # noqa: F401
+
+    output = os.path.abspath(args.output)
+    os.makedirs(output, exist_ok=True)
+    tasks = [(agent, scenario, output, args.plotlyjs)
+             for agent, scenario in list_episodes(args.agents, args.scenarios)]
+    print("INFO Exporting {} episodes to {}".format(len(tasks), output))
+    load_shared_episodes(sorted({scenario for _, scenario, _, _ in tasks}))
+
+    with open(os.path.join(output, "kpis.csv"), "w", newline="") as f, \
+            multiprocessing.Pool(args.processes, maxtasksperchild=MAX_TASKS_PER_PROCESS) as pool:
+        writer = csv.DictWriter(f, fieldnames=KPI_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        failures = []
+        for i, kpis in enumerate(pool.imap_unordered(export_episode, tasks), 1):
+            writer.writerow(kpis)
+            f.flush()
+            if kpis.get("error"):
+                failures.append(kpis)
+                print("WARNING {}/{} failed to export {} on {}:\n{}".format(
+                    i, len(tasks), kpis["agent"], kpis["scenario"], kpis["traceback"]))
+            else:
+                print("INFO {}/{} exported {} on {}".format(i, len(tasks), kpis["agent"], kpis["scenario"]))
+
+    print("INFO {} episodes exported, {} failed".format(len(tasks) - len(failures), len(failures)))
+    for kpis in failures:
+        print("  {} on {}: {}".format(kpis["agent"], kpis["scenario"], kpis["error"]))
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(PARSER_EXPORT.parse_args()) else 0)
@@ -5,6 +5,7 @@ It will generate the layout of a given page and handle the routing
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
+from dash import callback_context, no_update
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
@@ -14,6 +15,10 @@ These imports are mandatory to build the dependance tree and actually add the ca
 Do not remove !
 The "as ..." are also mandatory, other nothing is done.
 '''
+from .src.compare import compare_clbk as compare_clbk
+from .src.compare import compare_lyt as compare
+from .src.dashboard import dashboard_clbk as dashboard_clbk
+from .src.dashboard import dashboard_lyt as dashboard
 from .src.macro import macro_clbk as macro_clbk
 from .src.macro import macro_lyt as macro
 from .src.micro import micro_clbk as micro_clbk
@@ -27,12 +32,18 @@ End Warning
 
 from .app import app
 from .src.episodes import episodes_lyt
+from .src import kpi_api, manager
+from .src.utils import jobs, scheduler, watcher
+from .src.utils.profiling import profile_callbacks
+from .src.utils.scheduler import interactive
 
 nav_items = [
     dbc.NavItem(dbc.NavLink("Scenario Selection", href="/episodes")),
     dbc.NavItem(dbc.NavLink("Scenario Overview", href="/overview")),
     dbc.NavItem(dbc.NavLink("Agent Overview", href="/macro")),
-    dbc.NavItem(dbc.NavLink("Agent Study", href="/micro"))
+    dbc.NavItem(dbc.NavLink("Agent Study", href="/micro")),
+    dbc.NavItem(dbc.NavLink("Agents Comparison", href="/compare")),
+    dbc.NavItem(dbc.NavLink("Agents Dashboard", href="/dashboard"))
 ]
 
 navbar = dbc.Navbar(
@@ -102,14 +113,58 @@ app.layout = html.Div([
     dcc.Store(id="agent_study", storage_type='memory'),
     dcc.Store(id="user_timestamps_store"),
     dcc.Store(id="page"),
+    dcc.Store(id="loading_done"),
     navbar,
     body
 ])
 
 
+def loading_layout(job_ids):
+    """
+        Skeleton of a page whose episodes are loading, polling the progress of the jobs.
+
+        :param job_ids: ids of the loading jobs
+        :return: layout
+    """
+    return html.Div(id="loading_page", className="text-center mt-5", children=[
+        dcc.Store(id="loading_jobs", data=job_ids),
+        dcc.Interval(id="loading_interval", interval=500),
+        dbc.Spinner(color="primary", type="grow"),
+        html.Div(id="loading_progress", children=progress_lines(job_ids))
+    ])
+
+
+def progress_lines(job_ids):
+    lines = []
+    for job_id in job_ids:
+        status = jobs.get_status(job_id)
+        text = "{} on {}: {}".format(status["agent"], status["scenario"], status["stage"])
+        if status["error"] is not None:
+            text = "{} on {}: failed ({})".format(status["agent"], status["scenario"], status["error"])
+        lines.append(html.P(text))
+    return lines
+
+
+def page_or_loading(episodes, make_layout, page):
+    """
+        Get the layout of a page, or a loading skeleton if its episodes are not in the RAM cache.
+
+        Opening another page cancels the loading of the episodes only needed by the previous one.
+
+        :param episodes: list of (agent, scenario) needed by the layout
+        :param make_layout: function building the layout
+        :param page: name of the page
+        :return: layout and page name
+    """
+    job_ids = jobs.load_in_background(episodes, slot="page")
+    if job_ids:
+        return loading_layout(job_ids), "loading"
+    return make_layout(), page
+
+
 @app.callback(
     [Output('page-content', 'children'), Output('page', 'data')],
-    [Input('url', 'pathname')],
+    [Input('url', 'pathname'), Input("loading_done", "data")],
     [State("scenario", "data"),
      State("agent_ref", "data"),
      State("agent_study", "data"),
@@ -117,10 +172,15 @@ app.layout = html.Div([
      State("page", "data"),
      State("user_timestamps_store", "data")]
 )
-def display_page(pathname, scenario, ref_agent, study_agent, user_selected_timestamp, prev_page, timestamps_store):
+def display_page(pathname, loading_done, scenario, ref_agent, study_agent, user_selected_timestamp, prev_page,
+                 timestamps_store):
     if timestamps_store is None:
         timestamps_store = []
     timestamps = [dict(Timestamps=timestamp["label"]) for timestamp in timestamps_store]
+    if callback_context.triggered and callback_context.triggered[0]["prop_id"] == "loading_done.data":
+        # the episodes of the page being loaded are ready
+        if prev_page != "loading" or not loading_done:
+            raise PreventUpdate
     if pathname[1:] == prev_page:
         raise PreventUpdate
     if pathname == "/episodes" or pathname == "/":
@@ -128,21 +188,50 @@ def display_page(pathname, scenario, ref_agent, study_agent, user_selected_times
     elif pathname == "/overview":
         # if ref_agent is None:
         #     raise PreventUpdate
-        return overview.layout(scenario, ref_agent), "overview"
+        best_agents = manager.best_agents
+        episodes = [(best_agents[scenario]["agent"], scenario)] if scenario in best_agents else []
+        return page_or_loading(episodes, lambda: overview.layout(scenario, ref_agent), "overview")
     elif pathname == "/macro":
         if ref_agent is None:
             raise PreventUpdate
-        return macro.layout(timestamps, scenario, study_agent), "macro"
+        episodes = [(study_agent if study_agent is not None else manager.agents[0], scenario)]
+        return page_or_loading(episodes, lambda: macro.layout(timestamps, scenario, study_agent), "macro")
     elif pathname == "/micro":
         if ref_agent is None or study_agent is None:
             raise PreventUpdate
-        return micro.layout(user_selected_timestamp, study_agent, ref_agent, scenario), "micro"
+        episodes = [(manager.best_agents[scenario]["agent"], scenario), (study_agent, scenario), (ref_agent, scenario)]
+        # no loading skeleton: the steps of the window are read from the raw logs
+        # while the episodes load in the background
+        job_ids = jobs.load_in_background(episodes, slot="page")
+        return micro.layout(user_selected_timestamp, study_agent, ref_agent, scenario, job_ids), "micro"
+    elif pathname == "/compare":
+        if scenario is None:
+            raise PreventUpdate
+        episodes = [(agent, scenario) for agent in compare.default_agents(scenario, ref_agent, study_agent)]
+        return page_or_loading(episodes, lambda: compare.layout(scenario, ref_agent, study_agent), "compare")
+    elif pathname == "/dashboard":
+        return dashboard.layout(), "dashboard"
     else:
         return 404, ""
 
 
+@app.callback(
+    [Output("loading_progress", "children"),
+     Output("loading_done", "data"),
+     Output("loading_interval", "disabled")],
+    [Input("loading_interval", "n_intervals")],
+    [State("loading_jobs", "data")]
+)
+@interactive
+def update_loading_progress(n_intervals, job_ids):
+    statuses = [jobs.get_status(job_id) for job_id in job_ids]
+    done = all(status["done"] for status in statuses)
+    return progress_lines(job_ids), job_ids if done else no_update, done
+
+
 @app.callback(Output('scen_lbl', 'children'),
               [Input('scenario', 'data')])
+@interactive
 def update_scenario_label(scenario):
     if scenario is None:
         scenario = ""
@@ -151,6 +240,7 @@ def update_scenario_label(scenario):
 
 @app.callback(Output("ref_ag_lbl", "children"),
               [Input("agent_ref", "data")])
+@interactive
 def update_ref_agent_label(agent):
     if agent is None:
         agent = ""
@@ -159,6 +249,7 @@ def update_ref_agent_label(agent):
 
 @app.callback(Output("study_ag_lbl", "children"),
               [Input("agent_study", "data")])
+@interactive
 def update_study_agent_label(agent):
     if agent is None:
         agent = ""
@@ -167,6 +258,7 @@ def update_study_agent_label(agent):
 
 @app.callback(Output("user_timestamp_div", "className"),
               [Input("url", "pathname")])
+@interactive
 def show_user_timestamps(pathname):
     class_name = "ml-4 row"
     if pathname != "/micro":
@@ -176,12 +268,14 @@ def show_user_timestamps(pathname):
 
 @app.callback(Output("user_timestamps", "options"),
               [Input("user_timestamps_store", "data")])
+@interactive
 def update_user_timestamps_options(data):
     return data
 
 
 @app.callback(Output("user_timestamps", "value"),
               [Input("user_timestamps_store", "data")])
+@interactive
 def update_user_timestamps_value(data):
     if not data:
         raise PreventUpdate
@@ -190,16 +284,26 @@ def update_user_timestamps_value(data):
 
 @app.callback(Output("enlarge_left", "n_clicks"),
               [Input("user_timestamps", "value")])
+@interactive
 def reset_n_cliks_left(value):
     return 0
 
 
 @app.callback(Output("enlarge_right", "n_clicks"),
               [Input("user_timestamps", "value")])
+@interactive
 def reset_n_cliks_right(value):
     return 0
 
 
+profile_callbacks(app)
+scheduler.schedule_callbacks(app)
+scheduler.schedule_blueprint(kpi_api.blueprint)
+app.server.register_blueprint(kpi_api.blueprint)
+app.server.register_blueprint(scheduler.blueprint)
+# in each worker process of a production server
+app.server.before_first_request(watcher.start)
+
 server = app.server
 if __name__ == "__main__":
     app.run_server(port=8050, debug=False)
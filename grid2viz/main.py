@@ -10,6 +10,19 @@ PARSER_MAIN = argparse.ArgumentParser(description='Launch the Grid2Viz applicati
 PARSER_MAIN.add_argument('--path', default=None,
                          help='The path where the log of the experience are stored (default None to study the example'
                          'data provided in the package)')
+PARSER_MAIN.add_argument('--workers', type=int, default=None,
+                         help='Serve the application with a production WSGI server using this number of worker '
+                              'processes (default None to use the flask development server)')
+PARSER_MAIN.add_argument('--threads', type=int, default=None,
+                         help='Number of threads per worker of the production WSGI server (default None to use the '
+                              'flask development server)')
+PARSER_MAIN.add_argument('--host', default="127.0.0.1",
+                         help='The interface the production WSGI server listens on (default 127.0.0.1)')
+PARSER_MAIN.add_argument('--port', type=int, default=8050,
+                         help='The port the production WSGI server listens on (default 8050)')
+PARSER_MAIN.add_argument('--warm', type=int, default=0,
+                         help='Number of scenarios whose best agent is loaded in cache before accepting traffic, in '
+                              'the order of the scenario selection page (default 0)')
 
 # cur_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 
@@ -33,6 +46,59 @@ env_conf_folder =
 """
 
 
+def load_server(warm=0):
+    """
+        Import the application, which scans the agents and builds the layouts, and warm its cache.
+
+        :param warm: number of scenarios to load in cache
+        :return: the flask server of the application
+    """
+    from .index import server
+    from .src.manager import warm_cache
+    warm_cache(warm)
+    return server
+
+
+def serve(args):
+    """
+        Serve the application with a production WSGI server.
+
+        gunicorn is used when available: the application is preloaded in the master
+        process so the scan, the cache warm up and the layouts are done once before
+        forking the workers. Otherwise waitress serves it from a single process.
+    """
+    os.environ["GRID2VIZ_ROOT"] = cur_dir
+    workers = args.workers if args.workers is not None else 1
+    threads = args.threads if args.threads is not None else 1
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class Grid2VizApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", "{}:{}".format(args.host, args.port))
+                self.cfg.set("workers", workers)
+                self.cfg.set("threads", threads)
+                self.cfg.set("preload_app", True)
+                self.cfg.set("timeout", 0)
+
+            def load(self):
+                return load_server(args.warm)
+
+        Grid2VizApplication().run()
+        return
+
+    try:
+        import waitress
+    except ImportError:
+        sys.exit("ERROR The production mode requires gunicorn or waitress: pip install gunicorn")
+    if workers > 1:
+        print("WARNING gunicorn is not available, serving from a single process with waitress")
+    waitress.serve(load_server(args.warm), host=args.host, port=args.port, threads=threads)
+
+
 def main(args):
     with open("config.ini", "w") as f:
         if args.path is not None:
@@ -40,6 +106,9 @@ def main(args):
         else:
             print("INFO Using the default provided environment")
             f.write(config_file.format(base_dir=""))
+    if args.workers is not None or args.threads is not None:
+        serve(args)
+        return
     proc = subprocess.Popen(my_cmd, env=my_env)
     while True:
         try:
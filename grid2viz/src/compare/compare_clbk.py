@@ -0,0 +1,143 @@
+"""
+    This file handles the comparison of any number of agents on the selected scenario.
+    Episodes are loaded in parallel by the background jobs and the KPIs are computed in one batched pass
+    over arrays aligned on the timesteps of the scenario.
+"""
+from collections import namedtuple
+
+import numpy as np
+import plotly.graph_objects as go
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from grid2kpi.episode import observation_model
+
+from grid2viz.app import app
+from ..utils.episode_kpis import get_nb_action_agent, get_nb_overflow_agent
+from ..utils import jobs
+from ..utils.common_graph import use_webgl
+
+AlignedEpisodes = namedtuple(
+    "AlignedEpisodes", ["agents", "timestamps", "rewards", "overflows", "actions", "played", "max_steps",
+                        "nb_overflows", "nb_actions"]
+)
+
+
+def pad(values, length):
+    """
+        Right pad a 1d array with NaN up to the given length.
+
+        :param values: array like of values
+        :param length: wanted length
+        :return: float array of size length
+    """
+    padded = np.full(length, np.nan)
+    values = np.asarray(values, dtype=float)[:length]
+    padded[:len(values)] = values
+    return padded
+
+
+def align_episodes(episodes):
+    """
+        Stack the per step data of several episodes into (agents x steps) matrices.
+
+        Episodes that stopped early are padded with NaN so that each column
+        of the matrices refers to the same timestep of the scenario.
+
+        :param episodes: dict of episodes indexed by agent name
+        :return: AlignedEpisodes
+    """
+    agents = list(episodes)
+    longest = max(episodes.values(), key=lambda episode: len(episode.timestamps))
+    length = len(longest.timestamps)
+
+    rewards = np.vstack([
+        pad(observation_model.get_df_computed_reward(episode)["rewards"], length)
+        for episode in episodes.values()])
+    overflows = np.vstack([
+        pad(episode.total_overflow_ts["value"], length)
+        for episode in episodes.values()])
+    actions = np.vstack([
+        pad(episode.action_data_table[['action_line', 'action_subs']].sum(axis=1), length)
+        for episode in episodes.values()])
+    played = np.array([episode.meta["nb_timestep_played"] for episode in episodes.values()], dtype=float)
+    max_steps = np.array([episode.meta["chronics_max_timestep"] for episode in episodes.values()], dtype=float)
+    # totals computed like on the other pages
+    nb_overflows = np.array([get_nb_overflow_agent(episode) for episode in episodes.values()], dtype=float)
+    nb_actions = np.array([get_nb_action_agent(episode) for episode in episodes.values()], dtype=float)
+
+    return AlignedEpisodes(agents, longest.timestamps, rewards, overflows, actions, played, max_steps,
+                           nb_overflows, nb_actions)
+
+
+def compute_kpi_table(aligned):
+    """
+        Compute the KPIs of all the agents at once from the aligned matrices.
+
+        :param aligned: AlignedEpisodes
+        :return: list of records, one per agent
+    """
+    cum_rewards = np.nansum(aligned.rewards, axis=1)
+    survival = 100 * aligned.played / aligned.max_steps
+
+    return [
+        {
+            "Agent": agent,
+            "Steps played": int(aligned.played[i]),
+            "Survival (%)": round(float(survival[i]), 1),
+            "Cumulative Reward": round(float(cum_rewards[i])),
+            "Number of Overflow": int(aligned.nb_overflows[i]),
+            "Number of Action": int(aligned.nb_actions[i]),
+        }
+        for i, agent in enumerate(aligned.agents)
+    ]
+
+
+def timeseries_traces(aligned, matrix):
+    return use_webgl([go.Scatter(x=aligned.timestamps, y=row, name=agent)
+                      for agent, row in zip(aligned.agents, matrix)])
+
+
+@app.callback(
+    [Output("compare_kpi_table", "columns"),
+     Output("compare_kpi_table", "data"),
+     Output("compare_rewards_graph", "figure"),
+     Output("compare_survival_graph", "figure"),
+     Output("compare_overflow_graph", "figure"),
+     Output("compare_actions_graph", "figure")],
+    [Input("compare_agents_selector", "value")],
+    [State("compare_rewards_graph", "figure"),
+     State("compare_survival_graph", "figure"),
+     State("compare_overflow_graph", "figure"),
+     State("compare_actions_graph", "figure"),
+     State("scenario", "data")]
+)
+def update_comparison(selected_agents, figure_rewards, figure_survival,
+                      figure_overflow, figure_actions, scenario):
+    """
+        Load the selected agents in parallel and overlay their KPIs.
+
+        Triggered when the user changes the agent selection on the comparison page. The
+        episodes are loaded by the background jobs, a newer selection cancelling this one.
+    """
+    if not selected_agents or scenario is None:
+        raise PreventUpdate
+    try:
+        loaded = jobs.wait_episodes([(agent, scenario) for agent in selected_agents], slot="compare")
+    except jobs.JobCancelled:
+        # another selection was made meanwhile
+        raise PreventUpdate
+    aligned = align_episodes({agent: loaded[(agent, scenario)] for agent in selected_agents})
+    table = compute_kpi_table(aligned)
+
+    cum_rewards = np.where(np.isnan(aligned.rewards), np.nan, np.nancumsum(aligned.rewards, axis=1))
+    figure_rewards["data"] = timeseries_traces(aligned, cum_rewards)
+    figure_overflow["data"] = timeseries_traces(aligned, aligned.overflows)
+    figure_actions["data"] = timeseries_traces(aligned, aligned.actions)
+    figure_survival["data"] = [go.Bar(
+        x=aligned.agents, y=aligned.played,
+        text=["{} / {}".format(int(played), int(max_steps))
+              for played, max_steps in zip(aligned.played, aligned.max_steps)]
+    )]
+
+    columns = [{"name": name, "id": name} for name in table[0]]
+    return columns, table, figure_rewards, figure_survival, figure_overflow, figure_actions
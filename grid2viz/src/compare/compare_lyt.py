@@ -0,0 +1,82 @@
+"""
+This file builds the layout for the agents comparison tab.
+This tab overlays the KPIs of any subset of the agents that ran on the selected scenario.
+"""
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_table as dt
+import plotly.graph_objects as go
+
+from ..manager import agents_on_scenario
+
+layout_def = {
+    'legend': {'orientation': 'h'},
+    'margin': {'l': 0, 'r': 0, 't': 0, 'b': 0},
+}
+
+
+def selector_line(scenario_agents, selected_agents):
+    return html.Div(className="lineBlock card", children=[
+        html.H4("Agents"),
+        html.Div(className="card-body row", children=[
+            html.Div(className="col-xl-4", children=[
+                dcc.Dropdown(
+                    id="compare_agents_selector",
+                    placeholder="select the agents to compare",
+                    options=[{'label': agent, 'value': agent}
+                             for agent in scenario_agents],
+                    value=selected_agents,
+                    multi=True
+                ),
+            ]),
+            html.Div(className="col-xl-8", children=[
+                dt.DataTable(
+                    id="compare_kpi_table",
+                    sort_action="native",
+                    sort_mode="multi",
+                    style_table={'overflow-x': 'auto'},
+                )
+            ])
+        ])
+    ])
+
+
+def graph_block(graph_id, title, class_name="col-6"):
+    return html.Div(className=class_name, children=[
+        html.H6(className="text-center", children=title),
+        dcc.Graph(
+            id=graph_id,
+            figure=go.Figure(layout=layout_def)
+        )
+    ])
+
+
+comparison_line = html.Div(className="lineBlock card", children=[
+    html.H4("Comparison"),
+    html.Div(className="card-body col", children=[
+        html.Div(className="row", children=[
+            graph_block("compare_rewards_graph", "Cumulated Reward"),
+            graph_block("compare_survival_graph", "Agent's Survival (steps played)"),
+        ]),
+        html.Div(className="row", children=[
+            graph_block("compare_overflow_graph", "Overflow"),
+            graph_block("compare_actions_graph", "Actions"),
+        ]),
+    ])
+])
+
+
+def default_agents(scenario, ref_agent, study_agent):
+    """Get the agents selected when the page opens: the reference and study agents, or all the agents."""
+    scenario_agents = agents_on_scenario(scenario)
+    selected_agents = [agent for agent in [ref_agent, study_agent] if agent in scenario_agents]
+    if not selected_agents:
+        selected_agents = scenario_agents
+    return list(dict.fromkeys(selected_agents))
+
+
+def layout(scenario, ref_agent, study_agent):
+    return html.Div(id="compare_page", children=[
+        selector_line(agents_on_scenario(scenario), default_agents(scenario, ref_agent, study_agent)),
+        comparison_line
+    ])
@@ -0,0 +1,83 @@
+"""
+    This file handles the agents dashboard: the aggregates of the agents over all the
+    scenarios, folded from the summaries of the episodes while they are being built.
+"""
+import plotly.graph_objects as go
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+
+from grid2viz.app import app
+from ..utils import agent_summaries
+
+
+def compute_agents_table(aggregates):
+    """
+        Make the records of the dashboard table.
+
+        :param aggregates: dict of aggregates indexed by agent, see agent_summaries.aggregate
+        :return: list of records, one per agent
+    """
+    return [
+        {
+            "Agent": agent,
+            "Scenarios": aggregate["nb_scenarios"],
+            "Completed": aggregate["nb_completed"],
+            "Mean Survival (%)": round(100 * aggregate["mean_survival"], 1),
+            "Cumulative Reward": round(aggregate["cumulative_reward"]),
+            "Mean Cumulative Reward": round(aggregate["mean_cumulative_reward"]),
+            "Number of Overflow": aggregate["nb_overflow"],
+            "Number of Action": aggregate["nb_action"],
+        }
+        for agent, aggregate in sorted(aggregates.items())
+    ]
+
+
+def progress_text(progress):
+    if progress["running"]:
+        text = "Summarizing the episodes: {}/{}".format(progress["done"], progress["total"])
+    else:
+        text = "All the episodes are summarized"
+    if progress["errors"]:
+        text += " ({} could not be read)".format(progress["errors"])
+    return text
+
+
+@app.callback(
+    [Output("dashboard_table", "columns"),
+     Output("dashboard_table", "data"),
+     Output("dashboard_survival_graph", "figure"),
+     Output("dashboard_reward_graph", "figure"),
+     Output("dashboard_progress", "children"),
+     Output("dashboard_version", "data"),
+     Output("dashboard_interval", "disabled")],
+    [Input("dashboard_interval", "n_intervals")],
+    [State("dashboard_version", "data"),
+     State("dashboard_survival_graph", "figure"),
+     State("dashboard_reward_graph", "figure")]
+)
+def update_dashboard(n_intervals, shown_version, figure_survival, figure_reward):
+    """
+        Fold the summaries into the agents table and distributions.
+
+        Polled while the summaries are being built, the figures are only sent
+        again when new summaries arrived.
+    """
+    if not n_intervals:
+        # first display: summarize the episodes without a summary of their current logs
+        agent_summaries.start()
+    progress = agent_summaries.get_progress()
+    if progress["version"] == shown_version and progress["running"]:
+        raise PreventUpdate
+
+    aggregates = agent_summaries.aggregate(agent_summaries.iter_summaries())
+    table = compute_agents_table(aggregates)
+    figure_survival["data"] = [
+        go.Box(y=[100 * survival for survival in aggregate["survivals"]], name=agent, boxpoints=False)
+        for agent, aggregate in sorted(aggregates.items())]
+    figure_reward["data"] = [
+        go.Box(y=aggregate["rewards"], name=agent, boxpoints=False)
+        for agent, aggregate in sorted(aggregates.items())]
+
+    columns = [{"name": name, "id": name} for name in table[0]] if table else []
+    return (columns, table, figure_survival, figure_reward, progress_text(progress), progress["version"],
+            not progress["running"])
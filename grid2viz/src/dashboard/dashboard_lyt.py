@@ -0,0 +1,49 @@
+"""
+This file builds the layout for the agents dashboard tab.
+This tab aggregates the performances of each agent over all the scenarios.
+"""
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_table as dt
+import plotly.graph_objects as go
+
+layout_def = {
+    'legend': {'orientation': 'h'},
+    'margin': {'l': 0, 'r': 0, 't': 0, 'b': 0},
+}
+
+
+def graph_block(graph_id, title, class_name="col-6"):
+    return html.Div(className=class_name, children=[
+        html.H6(className="text-center", children=title),
+        dcc.Graph(
+            id=graph_id,
+            figure=go.Figure(layout=layout_def)
+        )
+    ])
+
+
+def layout():
+    return html.Div(id="dashboard_page", children=[
+        dcc.Store(id="dashboard_version"),
+        dcc.Interval(id="dashboard_interval", interval=2000),
+        html.Div(className="lineBlock card", children=[
+            html.H4("Agents"),
+            html.Div(className="card-body col", children=[
+                html.P(id="dashboard_progress"),
+                dt.DataTable(
+                    id="dashboard_table",
+                    sort_action="native",
+                    sort_mode="multi",
+                    style_table={'overflow-x': 'auto'},
+                )
+            ])
+        ]),
+        html.Div(className="lineBlock card", children=[
+            html.H4("Distributions over the scenarios"),
+            html.Div(className="card-body row", children=[
+                graph_block("dashboard_survival_graph", "Survival (%)"),
+                graph_block("dashboard_reward_graph", "Cumulative Reward"),
+            ])
+        ])
+    ])
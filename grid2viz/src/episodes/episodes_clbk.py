@@ -1,8 +1,13 @@
-from dash.dependencies import Input, Output, State
+import json
+
+from dash.dependencies import ALL, Input, Output
 from dash import callback_context
+from dash.exceptions import PreventUpdate
 from grid2kpi.episode import EpisodeTrace
 from grid2viz.app import app
-from ..manager import scenarios, best_agents, meta_json, make_episode
+from .. import manager
+from ..manager import make_episode
+from ..utils.scheduler import interactive
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
@@ -27,6 +32,8 @@ def load_scenario_cards(url):
         'yaxis': {'showticklabels': False},
         'margin': {'l': 0, 'r': 0, 't': 0, 'b': 0},
     }
+    index = manager.index_snapshot()
+    scenarios, best_agents, meta_json = index.scenarios, index.best_agents, index.meta_json
     if cards_count < 15:
         for scenario in sorted(scenarios):
             best_agent_episode = make_episode(best_agents[scenario]['agent'], scenario)
@@ -88,7 +95,7 @@ def load_scenario_cards(url):
                             ])
                         ]),
                         dbc.CardFooter(dbc.Button(
-                            "Open", id=scenario, key=scenario,
+                            "Open", id={"type": "scenario_card", "index": scenario}, key=scenario,
                             className="btn-block",
                             style={"background-color": "#2196F3"}))
                     ])
@@ -100,22 +107,24 @@ def load_scenario_cards(url):
 
 @app.callback(
     [Output('scenario', 'data'), Output('url', 'pathname')],
-    [Input(scenario, 'n_clicks') for scenario in scenarios],
-    [State(scenario, 'key') for scenario in scenarios]
+    [Input({"type": "scenario_card", "index": ALL}, 'n_clicks')]
 )
-def open_scenario(*input_state):
+@interactive
+def open_scenario(n_clicks):
     """
         Open scenario into the overview layout when button
         corresponding button is clicked.
 
-        Use callback context to get triggered input then parse it to get triggered input id
-        then get the state key value from context with is the dict key (input_id + '.key').
+        The buttons of the cards have pattern matching ids, so that the scenarios found
+        after the start of the server get working buttons. The scenario is read from the
+        id of the triggered button.
 
         .. note:: you may need to see https://dash.plot.ly/faqs to get how I determine which Input has changed
     """
     ctx = callback_context
-    input_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    input_key = ctx.states[input_id + '.key']
-    scenario = input_key
+    if not any(n_clicks) or not ctx.triggered:
+        raise PreventUpdate
+    input_id = json.loads(ctx.triggered[0]['prop_id'].rsplit('.', 1)[0])
+    scenario = input_id["index"]
 
     return scenario, '/overview'
@@ -0,0 +1,261 @@
+"""
+    Read-only JSON API of the KPIs of the scenarios and episodes, served by the Flask server of the app.
+
+    GET /api/scenarios
+        best agent, survival and cumulative reward of each scenario
+    GET /api/scenarios/<scenario>
+        KPIs of the scenario and of the episodes of all its agents
+    GET /api/scenarios/<scenario>/agents/<agent>
+        KPIs of an episode
+    GET /api/scenarios/<scenario>/agents/<agent>/timeseries/<kind>?start=<timestamp>&end=<timestamp>
+        time series of an episode (rewards, cumulated_rewards, overflows, actions or usage_rate,
+        with an optional line=<line name> for the usage rate), restricted to a time window
+
+    The responses are serialized once from the episode cache and carry an ETag, so that
+    clients polling with If-None-Match get a 304 without any computation while the data
+    are unchanged. They are dropped when one of their episodes is invalidated in the manager,
+    and all the responses of a scenario when its index changes (new best agent...).
+
+    The episodes missing from the RAM cache are loaded in background jobs (see utils/jobs.py):
+    meanwhile the requests get a 202 Accepted response with the stage of each job and a
+    Retry-After header, and the client repeats the request until it gets the KPIs.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import flask
+import numpy as np
+from grid2kpi.episode import observation_model
+
+from . import manager
+from .utils.episode_kpis import get_nb_action_agent, get_nb_overflow_agent
+from .utils import jobs
+
+MAX_ENTRIES = 1024
+# seconds a client should wait before repeating a request answered while its episodes load
+RETRY_AFTER = 1
+TIMESERIES_KINDS = ["rewards", "cumulated_rewards", "overflows", "actions", "usage_rate"]
+
+blueprint = flask.Blueprint("kpi_api", __name__, url_prefix="/api")
+
+responses = OrderedDict()
+keys_by_episode = {}
+lock = threading.Lock()
+
+
+def json_response(body):
+    response = flask.Response(body, mimetype="application/json")
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    return response.make_conditional(flask.request)
+
+
+def loading_response(job_ids):
+    """
+        Answer a request whose episodes are being loaded.
+
+        :param job_ids: ids of the jobs loading the episodes
+        :return: flask response 202 with the status of the jobs
+    """
+    statuses = [jobs.get_status(job_id) for job_id in job_ids]
+    response = flask.Response(json.dumps(dict(status="loading", jobs=statuses)), status=202,
+                              mimetype="application/json")
+    response.headers["Retry-After"] = str(RETRY_AFTER)
+    return response
+
+
+def forget(key):
+    """Drop a response and its references in keys_by_episode, lock held."""
+    _, episodes = responses.pop(key, (None, ()))
+    for episode in episodes:
+        keys = keys_by_episode.get(episode)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del keys_by_episode[episode]
+
+
+def cached_response(key, episodes, compute):
+    """
+        Answer a request from the serialized responses, computing it if needed once
+        its episodes are in the RAM cache.
+
+        :param key: key of the response, unique per route and arguments, starting with
+            the route name and the scenario
+        :param episodes: (agent, scenario) pairs the response is computed from
+        :param compute: function returning the JSON serializable response
+        :return: flask response with an ETag, or 202 while the episodes are loaded
+    """
+    episodes = [tuple(episode) for episode in episodes]
+    with lock:
+        entry = responses.get(key)
+        if entry is not None:
+            responses.move_to_end(key)
+            return json_response(entry[0])
+    job_ids = jobs.load_in_background(episodes)
+    if job_ids:
+        return loading_response(job_ids)
+    body = json.dumps(compute())
+    with lock:
+        forget(key)
+        responses[key] = (body, episodes)
+        for episode in episodes:
+            keys_by_episode.setdefault(episode, set()).add(key)
+        while len(responses) > MAX_ENTRIES:
+            forget(next(iter(responses)))
+    return json_response(body)
+
+
+def invalidate_episode(agent, episode_name):
+    """
+        Drop the responses computed from an episode.
+
+        :param agent: Agent Name
+        :param episode_name: Name of the episode
+    """
+    with lock:
+        for key in list(keys_by_episode.get((agent, episode_name), ())):
+            forget(key)
+
+
+def refresh_scenario(scenario):
+    """
+        Drop the responses of a scenario whose agents changed on disk, as they
+        carry its best agent.
+
+        :param scenario: Name of the scenario
+    """
+    with lock:
+        for key in [key for key in responses if key[1] == scenario]:
+            forget(key)
+
+
+def check_episode(scenario, agent=None):
+    if scenario not in manager.scenarios:
+        flask.abort(404, "Unknown scenario {}".format(scenario))
+    if agent is not None and agent not in manager.agents_on_scenario(scenario):
+        flask.abort(404, "No episode of {} on {}".format(agent, scenario))
+
+
+def to_list(values):
+    """Convert an array to a JSON list, NaN becoming null."""
+    return [None if np.isnan(value) else value for value in np.asarray(values, dtype=float).tolist()]
+
+
+def scenario_summary(scenario, index=None):
+    if index is None:
+        index = manager.index_snapshot()
+    best = index.best_agents[scenario]
+    max_steps = int(index.meta_json[scenario]["chronics_max_timestep"])
+    return dict(
+        best_agent=best["agent"],
+        best_survival=best["value"],
+        chronics_max_timestep=max_steps,
+        best_cumulative_reward=best.get("cum_reward"),
+        nb_agents=best["out_of"],
+    )
+
+
+def episode_kpis(episode):
+    played = int(episode.meta["nb_timestep_played"])
+    max_steps = int(episode.meta["chronics_max_timestep"])
+    return dict(
+        nb_timestep_played=played,
+        chronics_max_timestep=max_steps,
+        survival=played / max_steps if max_steps else None,
+        cumulative_reward=float(episode.meta["cumulative_reward"]),
+        nb_overflow=int(get_nb_overflow_agent(episode)),
+        nb_action=int(get_nb_action_agent(episode)),
+        nb_maintenances=int(episode.nb_maintenances),
+        nb_hazards=int(episode.nb_hazards),
+        total_maintenance_duration=str(episode.total_maintenance_duration),
+    )
+
+
+def episode_timeseries(episode, kind, line=None):
+    """
+        Get the values of a time series of an episode, one per step.
+
+        :param episode: EpisodeAnalytics
+        :param kind: one of TIMESERIES_KINDS
+        :param line: name of a line for the usage rate (default the maximum usage rate of the lines)
+        :return: float array
+    """
+    if kind in ("rewards", "cumulated_rewards"):
+        rewards = observation_model.get_df_computed_reward(episode)["rewards"].to_numpy(dtype=float)
+        if kind == "rewards":
+            return rewards
+        return np.where(np.isnan(rewards), np.nan, np.nancumsum(rewards))
+    if kind == "overflows":
+        return episode.total_overflow_ts["value"].to_numpy(dtype=float)
+    if kind == "actions":
+        return episode.action_data_table[["action_line", "action_subs"]].sum(axis=1).to_numpy(dtype=float)
+    if line is not None:
+        return episode.line_states.get_rho(line)
+    rho = episode.line_states.rho
+    return np.nanmax(rho, axis=1, initial=0) if rho.size else np.zeros(0)
+
+
+@blueprint.route("/scenarios")
+def get_scenarios():
+    index = manager.index_snapshot()
+    return json_response(json.dumps(
+        {scenario: scenario_summary(scenario, index) for scenario in sorted(index.scenarios)}))
+
+
+@blueprint.route("/scenarios/<scenario>")
+def get_scenario(scenario):
+    check_episode(scenario)
+    agents = manager.agents_on_scenario(scenario)
+
+    def compute():
+        return dict(scenario_summary(scenario),
+                    agents={agent: episode_kpis(manager.make_episode(agent, scenario)) for agent in agents})
+
+    return cached_response(("scenario", scenario), [(agent, scenario) for agent in agents], compute)
+
+
+@blueprint.route("/scenarios/<scenario>/agents/<agent>")
+def get_episode(scenario, agent):
+    check_episode(scenario, agent)
+
+    def compute():
+        episode = manager.make_episode(agent, scenario)
+        return dict(episode_kpis(episode), agent=agent, scenario=scenario,
+                    best=manager.best_agents[scenario]["agent"] == agent)
+
+    return cached_response(("episode", scenario, agent), [(agent, scenario)], compute)
+
+
+@blueprint.route("/scenarios/<scenario>/agents/<agent>/timeseries/<kind>")
+def get_timeseries(scenario, agent, kind):
+    check_episode(scenario, agent)
+    if kind not in TIMESERIES_KINDS:
+        flask.abort(404, "Unknown time series {}, available: {}".format(kind, ", ".join(TIMESERIES_KINDS)))
+    start = flask.request.args.get("start")
+    end = flask.request.args.get("end")
+    line = flask.request.args.get("line")
+
+    def compute():
+        episode = manager.make_episode(agent, scenario)
+        if line is not None and line not in episode.line_states.columns:
+            flask.abort(404, "Unknown line {}".format(line))
+        index = episode.timestamp_index
+        values = episode_timeseries(episode, kind, line)
+        first = index.searchsorted(start) if start else 0
+        last = min(index.searchsorted(end, side="right") if end else len(index), len(values))
+        return dict(
+            agent=agent, scenario=scenario, kind=kind, line=line,
+            timestamps=[index.label(step) for step in range(first, last)],
+            values=to_list(values[first:last]),
+        )
+
+    try:
+        return cached_response(("timeseries", scenario, agent, kind, line, start, end), [(agent, scenario)], compute)
+    except ValueError:
+        flask.abort(400, "Invalid start or end timestamp")
+
+
+manager.invalidation_listeners.append(invalidate_episode)
+manager.index_listeners.append(refresh_scenario)
@@ -2,6 +2,7 @@
     This files handles the generic information about the agent of reference of the selected scenario
     and let choose and compute study agent information.
 """
+from dash import callback_context
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
@@ -13,7 +14,13 @@ from grid2kpi.episode import actions_model
 from grid2viz.src.utils.graph_utils import get_axis_relayout, relayout_callback
 from grid2kpi.episode.maintenances import (hist_duration_maintenances)
 
-from ..utils.common_graph import make_action_ts, make_rewards_ts
+from ..utils import jobs
+from ..utils.callback_cache import memoized_callback
+from ..utils.common_graph import make_action_ts, make_divergence_ts, make_rewards_ts, use_webgl
+from ..utils.divergence import get_divergence
+# re-exported, the KPIs were defined here
+from ..utils.episode_kpis import get_nb_action_agent, get_nb_overflow_agent, get_score_agent  # noqa: F401
+from ..utils.scheduler import interactive, interactive_on
 
 
 @app.callback(
@@ -37,7 +44,7 @@ def load_reward_data_scatter(study_agent, relayout_data_store, figure, ref_agent
     return make_rewards_ts(study_agent, ref_agent, scenario, layout)
 
 
-@app.callback(
+@memoized_callback(
     Output("agent_study_pie_chart", "figure"),
     [Input('agent_study', 'data')],
     [State("agent_study_pie_chart", "figure"),
@@ -57,7 +64,7 @@ def action_repartition_pie(agent):
     )]
 
 
-@app.callback(
+@memoized_callback(
     Output("maintenance_duration", "figure"),
     [Input('agent_study', 'data')],
     [State("maintenance_duration", "figure"),
@@ -74,25 +81,58 @@ def maintenance_duration_hist(study_agent, figure, scenario):
 @app.callback(
     Output("timeseries_table", "data"),
     [Input("cumulated_rewards_timeserie", "clickData"),
-     Input("agent_log_selector", "value")],
+     Input("agent_log_selector", "value"),
+     Input("divergence_timeline", "clickData"),
+     Input("jump_first_divergence", "n_clicks")],
     [State("timeseries_table", "data"),
-     State("agent_study", "data")]
+     State("agent_study", "data"),
+     State("agent_ref", "data"),
+     State("scenario", "data")]
 )
-def add_timestamp(click_data, new_agent, data, agent_stored):
+@interactive
+def add_timestamp(click_data, new_agent, divergence_click_data, jump_clicks, data, agent_stored, ref_agent, scenario):
     if new_agent != agent_stored:
         return []
     if data is None:
         data = []
+    triggered = [trigger["prop_id"] for trigger in callback_context.triggered]
+    if "jump_first_divergence.n_clicks" in triggered:
+        timestamp = get_divergence(agent_stored, ref_agent, scenario).first_label()
+        if timestamp is None:
+            raise PreventUpdate
+        # the first divergence is put first, to be the default timestamp of the micro page
+        new_data = {"Timestamps": timestamp}
+        return [new_data] + [row for row in data if row != new_data]
+    if "divergence_timeline.clickData" in triggered:
+        click_data = divergence_click_data
+    if click_data is None:
+        raise PreventUpdate
     new_data = {"Timestamps": click_data["points"][0]["x"]}
     if new_data not in data:
         data.append(new_data)
     return data
 
 
+@memoized_callback(
+    [Output("divergence_timeline", "figure"),
+     Output("first_divergence_output", "children")],
+    [Input('agent_study', 'data')],
+    [State("divergence_timeline", "figure"),
+     State("agent_ref", "data"),
+     State("scenario", "data")]
+)
+def update_divergence_timeline(study_agent, figure, ref_agent, scenario):
+    """Compute and create the figure of the divergence of the study agent from the ref agent"""
+    figure = make_divergence_ts(study_agent, ref_agent, scenario, figure["layout"])
+    first_label = get_divergence(study_agent, ref_agent, scenario).first_label()
+    return figure, first_label if first_label is not None else "None"
+
+
 @app.callback(
     Output("user_timestamps_store", "data"),
     [Input("timeseries_table", "data")]
 )
+@interactive
 def update_user_timestamps_store(timestamps):
     if timestamps is None:
         raise PreventUpdate
@@ -108,6 +148,7 @@ def update_user_timestamps_store(timestamps):
      Input("cumulated_rewards_timeserie", "relayoutData")],
     [State("relayoutStoreMacro", "data")]
 )
+@interactive
 def relayout_store(*args):
     return relayout_callback(*args)
 
@@ -128,20 +169,6 @@ def update_nbs(study_agent, scenario):
     return score, nb_overflow, nb_action
 
 
-def get_score_agent(agent):
-    score = agent.meta["cumulative_reward"]
-    return round(score)
-
-
-def get_nb_overflow_agent(agent):
-    return agent.total_overflow_ts["value"].sum()
-
-
-def get_nb_action_agent(agent):
-    return agent.action_data_table[['action_line', 'action_subs']].sum(
-        axis=1).sum()
-
-
 @app.callback(
     Output("agent_study", "data"),
     [Input('agent_log_selector', 'value')],
@@ -151,7 +178,11 @@ def get_nb_action_agent(agent):
 def update_study_agent(study_agent, stored_agent, scenario):
     if study_agent == stored_agent:
         raise PreventUpdate
-    make_episode(study_agent, scenario)
+    try:
+        jobs.wait_episode(study_agent, scenario, slot="study_agent")
+    except jobs.JobCancelled:
+        # another agent was selected meanwhile
+        raise PreventUpdate
     return study_agent
 
 
@@ -164,6 +195,7 @@ def update_study_agent(study_agent, stored_agent, scenario):
      State("usage_rate_graph_study", "figure"),
      State("scenario", "data")]
 )
+@interactive_on("relayoutStoreMacro.data")
 def update_agent_log_graph(study_agent, relayout_data_store, figure_overflow, figure_usage, scenario):
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
@@ -174,11 +206,10 @@ def update_agent_log_graph(study_agent, relayout_data_store, figure_overflow, fi
             figure_overflow["layout"].update(new_axis_layout)
             return figure_overflow, figure_usage
     new_episode = make_episode(study_agent, scenario)
-    figure_overflow["data"] = new_episode.total_overflow_trace
     maintenance_trace = EpisodeTrace.get_maintenance_trace(new_episode, ["total"])[0]
     maintenance_trace.update({"name": "Nb of maintenances"})
-    figure_overflow["data"].append(maintenance_trace)
-    figure_usage["data"] = new_episode.usage_rate_trace
+    figure_overflow["data"] = use_webgl([*new_episode.total_overflow_trace, maintenance_trace])
+    figure_usage["data"] = use_webgl(new_episode.usage_rate_trace)
     return figure_overflow, figure_usage
 
 
@@ -190,6 +221,7 @@ def update_agent_log_graph(study_agent, relayout_data_store, figure_overflow, fi
      State("agent_ref", "data"),
      State("scenario", "data")]
 )
+@interactive_on("relayoutStoreMacro.data")
 def update_actions_graph(study_agent, relayout_data_store, figure, agent_ref, scenario):
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
@@ -202,7 +234,7 @@ def update_actions_graph(study_agent, relayout_data_store, figure, agent_ref, sc
     return make_action_ts(study_agent, agent_ref, scenario, figure['layout'])
 
 
-@app.callback(
+@memoized_callback(
     [Output("inspector_datable", "columns"),
      Output("inspector_datable", "data")],
     [Input('agent_study', 'data'),
@@ -214,7 +246,7 @@ def update_agent_log_action_table(study_agent, scenario):
     return [{"name": i, "id": i} for i in table.columns], table.to_dict("record")
 
 
-@app.callback(
+@memoized_callback(
     [Output("distribution_substation_action_chart", "figure"),
      Output("distribution_line_action_chart", "figure")],
     [Input('agent_study', 'data')],
@@ -7,7 +7,8 @@ from collections import namedtuple
 
 from grid2kpi.episode import actions_model
 from grid2kpi.episode.maintenances import hist_duration_maintenances
-from ..manager import make_episode, agents
+from .. import manager
+from ..manager import make_episode
 
 layout_def = {
     'legend': {'orientation': 'h'},
@@ -41,7 +42,7 @@ def indicator_line(scenario, study_agent):
                 dcc.Dropdown(
                     id='agent_log_selector',
                     options=[{'label': agent, 'value': agent}
-                             for agent in agents],
+                             for agent in manager.agents],
                     value=study_agent,
                     placeholder="Agent log"
                 ),
@@ -171,6 +172,36 @@ def overview_line(timestamps=None):
     ])
 
 
+def divergence_line():
+    return html.Div(id="divergence_line_id", className="lineBlock card", children=[
+        html.H4("Divergence From Reference Agent"),
+        html.Div(className="card-body row", children=[
+            html.Div(className="col-2", children=[
+                html.Div(className="m-2", children=[
+                    html.P(id="first_divergence_output",
+                           className="border-bottom h3 mb-0 text-right"),
+                    html.P(className="text-muted", children="First Divergence")
+                ]),
+                html.Button(id="jump_first_divergence", className="btn btn-primary m-2",
+                            children="Study first divergence"),
+                html.Div(html.P(
+                    'Select a timestep on the "Divergence" Time Serie to add it '
+                    'to the studied timestamps'
+                ), className='mt-1')
+            ]),
+            html.Div(className="col-10", children=[
+                dcc.Graph(
+                    id="divergence_timeline",
+                    figure=go.Figure(
+                        layout=layout_def,
+                        data=[dict(type="scatter")]
+                    )
+                )
+            ])
+        ])
+    ])
+
+
 def inspector_line(study_agent, scenario):
     new_episode = make_episode(study_agent, scenario)
     cols, data = get_table(new_episode)
@@ -253,12 +284,13 @@ def action_distrubtion(episode):
 
 def layout(timestamps, scenario, study_agent):
     if study_agent is None:
-        study_agent = agents[0]
+        study_agent = manager.agents[0]
     # if scenario is None:
     #     scenario = list(scenarios)[0]
     return html.Div(id="overview_page", children=[
         dcc.Store(id='relayoutStoreMacro'),
         indicator_line(scenario, study_agent),
         overview_line(timestamps),
+        divergence_line(),
         inspector_line(study_agent, scenario)
     ])
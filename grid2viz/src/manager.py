@@ -1,57 +1,282 @@
+import contextlib
+import hashlib
 import json
+import threading
 import time
+from collections import OrderedDict, namedtuple
 
-from grid2kpi.episode.EpisodeAnalytics import EpisodeAnalytics
-from grid2op.EpisodeData import EpisodeData
 import os
 import configparser
 import csv
 import pickle
+import tempfile
 
-from grid2op.PlotPlotly import PlotObs
+from .utils import agent_sources
+from .utils.episode_index import index_episode
+from .utils.episode_loading import compute_episode as compute_episode_analytics, fs_cache_file, read_fs_cache
+from .utils.episode_memory import compact_episode
+from .utils.episode_window import EpisodeWindow, window_range
+from .utils.network_graph import NetworkRenderer
+from .utils.profiling import profiled
 
-graph = None
+networks = {}
+# reentrant: make_network reads the layouts (read_network_layout) while holding it
+networks_lock = threading.RLock()
+
+# folder of the data provided with the package (example agents, layouts of the grids)
+package_data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
 
 
 def make_network(episode):
     """
-        Create a Plotly network graph with the layout configuration and the selected episode.
+        Get the network graph renderer of the grid of the selected episode.
+
+        One renderer is built per grid, with the substation layout of this grid,
+        and shared by all the episodes played on it.
 
         :param episode: An episode containing targeted data for the graph.
-        :return: Network graph
+        :return: NetworkRenderer building the network skeleton and its per step states
+    """
+    grid_id = get_grid_identity(episode)
+    with networks_lock:
+        if grid_id not in networks:
+            networks[grid_id] = NetworkRenderer(
+                episode.observation_space, substation_layout=find_network_layout(episode))
+        return networks[grid_id]
+
+
+def get_grid_identity(episode):
+    """
+        Identify the grid an episode was played on.
+
+        :param episode: studied episode
+        :return: the grid_path of the episode meta if any, otherwise a hash of the observation space
+    """
+    grid_path = episode.meta.get("grid_path")
+    if grid_path:
+        return grid_path
+    space = episode.observation_space
+    description = json.dumps([list(map(str, space.name_sub)), list(map(str, space.name_line)),
+                              [int(sub) for sub in space.line_or_to_subid],
+                              [int(sub) for sub in space.line_ex_to_subid]])
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def find_network_layout(episode):
+    """
+        Find the substation layout of the grid of an episode.
+
+        The layout is looked for, in order, in a coords.csv next to the grid file,
+        in the configured env_conf_folder and in the layouts provided with the package.
+        Only layouts with the right number of substations are kept.
+
+        :param episode: studied episode
+        :return: list of (x, y) coordinates, or None if no layout fits the grid
     """
-    global graph
-    if graph is None:
-        graph = PlotObs(
-            substation_layout=network_layout, observation_space=episode.observation_space)
-    return graph
+    n_sub = len(episode.observation_space.name_sub)
+    folders = [env_conf_folder]
+    if os.path.isdir(package_data_dir):
+        folders += sorted(os.path.join(package_data_dir, folder) for folder in os.listdir(package_data_dir)
+                          if folder.startswith("env_conf"))
+    grid_path = episode.meta.get("grid_path")
+    if grid_path:
+        folders.insert(0, os.path.dirname(grid_path))
+    for folder in folders:
+        layout = read_network_layout(os.path.join(folder, "coords.csv"))
+        if layout is not None and len(layout) == n_sub:
+            return layout
+    return None
+
+
+network_layouts = {}
+
+
+def read_network_layout(path):
+    """
+        Read a substation layout file, once.
+
+        :param path: path of a coords.csv file
+        :return: list of (x, y) coordinates, or None if the file does not exist
+    """
+    with networks_lock:
+        if path not in network_layouts:
+            layout = None
+            try:
+                with open(path) as csv_file:
+                    csv_reader = csv.reader(csv_file, delimiter=';')
+                    header = next(csv_reader)
+                    # the coordinates are either in the "x" and "y" columns or in the last two ones
+                    if "x" in header and "y" in header:
+                        x_col, y_col = header.index("x"), header.index("y")
+                    else:
+                        x_col, y_col = len(header) - 2, len(header) - 1
+                    layout = [(int(coords[x_col]), int(coords[y_col])) for coords in csv_reader]
+            except (FileNotFoundError, NotADirectoryError):
+                pass  # no layout for this grid here
+            network_layouts[path] = layout
+        return network_layouts[path]
 
 
 store = {}
 
 
-def make_episode(agent, episode_name):
+# episodes read by the current thread, recorded between the start and end of recording_reads
+episode_reads = threading.local()
+
+
+@contextlib.contextmanager
+def recording_reads():
+    """
+        Record the episodes read by the current thread, through make_episode,
+        make_episode_window or record_read, until the end of the with block.
+
+        :return: set of the (agent, episode name) pairs read, filled during the block
+    """
+    reads = episode_reads.reads = set()
+    try:
+        yield reads
+    finally:
+        episode_reads.reads = None
+
+
+def record_read(agent, episode_name):
+    """
+        Record the read of an episode in the current recording_reads block, for
+        the caches that answer from data computed from an episode without reading it.
+
+        :param agent: Agent Name
+        :param episode_name: Name of the episode
+    """
+    reads = getattr(episode_reads, "reads", None)
+    if reads is not None:
+        reads.add((agent, episode_name))
+
+
+@profiled("make_episode")
+def make_episode(agent, episode_name, progress=None):
     """
         Load episode from cache. If not already in, compute episode data
         and save it in cache.
 
         :param agent: Agent Name
         :param episode_name: Name of the studied episode
+        :param progress: function called with the name of each loading stage (default None)
         :return: Episode with computed data
     """
+    if progress is None:
+        def progress(stage):
+            pass
+
+    record_read(agent, episode_name)
     if is_in_ram_cache(episode_name, agent):
         return get_from_ram_cache(episode_name, agent)
     elif is_in_fs_cache(episode_name, agent):
+        progress("loading from cache")
         episode = get_from_fs_cache(episode_name, agent)
+        progress("indexing")
+        episode = index_episode(compact_episode(episode))
         save_in_ram_cache(episode_name, agent, episode)
         return episode
     else:
-        episode = compute_episode(episode_name, agent)
+        episode = compute_episode(episode_name, agent, progress)
+        progress("indexing")
+        episode = index_episode(compact_episode(episode))
+        progress("saving in cache")
         save_in_fs_cache(episode_name, agent, episode)
         save_in_ram_cache(episode_name, agent, episode)
         return episode
 
 
+# number of episode windows kept in RAM for the micro page, the least recently used is dropped
+MAX_EPISODE_WINDOWS = 16
+
+window_store = OrderedDict()
+window_lock = threading.Lock()
+
+
+@profiled("make_episode_window")
+def make_episode_window(agent, episode_name, window=None, steps=None, purpose="view"):
+    """
+        Get the steps of an episode shown in a time window of the micro page.
+
+        When the episode is not in the RAM cache, only the steps of the window and
+        window_margin steps on each side are decoded from the raw logs (see
+        utils/episode_window.py). The last windows read are kept in RAM, one per
+        episode and purpose.
+
+        :param agent: Agent Name
+        :param episode_name: Name of the studied episode
+        :param window: [xmin, xmax] timestamps of the window
+        :param steps: (first, stop) steps of the window, used when window is None
+        :param purpose: use of the window, the batches of the playback ("playback") being
+            kept apart from the studied window ("view") so that they do not evict it
+        :return: the episode if it is in the RAM cache, otherwise an EpisodeWindow
+    """
+    record_read(agent, episode_name)
+    if is_in_ram_cache(episode_name, agent):
+        return get_from_ram_cache(episode_name, agent)
+
+    key = (make_ram_cache_id(episode_name, agent), purpose)
+    with window_lock:
+        cached = window_store.get(key)
+    timestamp_index = None
+    if cached is not None:
+        if cached.covers(*window_range(cached.timestamp_index, window, steps)):
+            with window_lock:
+                if key in window_store:
+                    window_store.move_to_end(key)
+            return cached
+        timestamp_index = cached.timestamp_index
+
+    source = get_source(agent)
+    with source.episode_dir(episode_name, os.path.join(archives_dir, agent)) as path:
+        episode = EpisodeWindow.read(path, agent, episode_name, source.read_meta(episode_name),
+                                     window, steps, window_margin, timestamp_index)
+    with window_lock:
+        window_store[key] = episode
+        window_store.move_to_end(key)
+        if len(window_store) > MAX_EPISODE_WINDOWS:
+            window_store.popitem(last=False)
+    return episode
+
+
+def warm_cache(n_scenarios):
+    """
+        Load in cache the best agent's episode of the first scenarios.
+
+        The scenarios are taken in the order of the scenario selection page.
+
+        :param n_scenarios: number of scenarios to load
+    """
+    for scenario in sorted(scenarios)[:n_scenarios]:
+        print("INFO Warming the cache with scenario {}".format(scenario))
+        make_episode(best_agents[scenario]["agent"], scenario)
+
+
+invalidation_listeners = []
+
+
+def invalidate_episode(agent, episode_name):
+    """
+        Drop an episode from the RAM and file system caches, so that it is computed
+        again on its next use, and notify the invalidation listeners (memoized callbacks...).
+
+        :param agent: Agent Name
+        :param episode_name: Name of the episode
+    """
+    store.pop(make_ram_cache_id(episode_name, agent), None)
+    with window_lock:
+        for key in [key for key in window_store if key[0] == make_ram_cache_id(episode_name, agent)]:
+            del window_store[key]
+    try:
+        os.remove(fs_cache_file(cache_dir, episode_name, agent))
+    except FileNotFoundError:
+        pass  # not cached, or removed by another process meanwhile
+    finally:
+        for listener in invalidation_listeners:
+            listener(agent, episode_name)
+
+
 def clear_fs_cache():
     os.rmdir(cache_dir)
 
@@ -61,33 +286,38 @@ def is_in_fs_cache(episode_name, agent):
 
 
 def get_fs_cached_file(episode_name, agent):
-    episode_dir = os.path.join(cache_dir, episode_name)
-    if not os.path.exists(episode_dir):
-        os.makedirs(episode_dir)
-    return os.path.join(episode_dir, agent + ".pickle")
+    path = fs_cache_file(cache_dir, episode_name, agent)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
 
 
 def save_in_fs_cache(episode_name, agent, episode):
     path = get_fs_cached_file(episode_name, agent)
-    with open(path, "wb") as f:
-        pickle.dump(episode, f, protocol=4)
+    # written aside then renamed, so that the processes and threads reading the cache
+    # never see a partly written file
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+        try:
+            pickle.dump(episode, f, protocol=4)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
 
 
 def get_from_fs_cache(episode_name, agent):
     beg = time.time()
     path = get_fs_cached_file(episode_name, agent)
-    with open(path, "rb") as f:
-        episode_loaded = pickle.load(f)
+    episode_loaded = read_fs_cache(path)
     end = time.time()
     print(f"end loading scenario file: {end - beg}")
     return episode_loaded
 
 
-def compute_episode(episode_name, agent):
-    path = os.path.join(base_dir, agent)
-    return EpisodeAnalytics(EpisodeData.from_disk(
-        path, episode_name
-    ), episode_name, agent)
+def compute_episode(episode_name, agent, progress=None):
+    # the episodes of archives are extracted to a scratch folder while they are read
+    return compute_episode_analytics(get_source(agent), episode_name, agent,
+                                     os.path.join(archives_dir, agent), progress)
 
 
 def is_in_ram_cache(episode_name, agent):
@@ -106,28 +336,180 @@ def make_ram_cache_id(episode_name, agent):
     return agent + episode_name
 
 
+def agents_on_scenario(scenario):
+    """
+        List the agents that have a log for the given scenario.
+
+        :param scenario: Name of the scenario
+        :return: sorted list of agent names
+    """
+    index = index_snapshot()
+    return [agent for agent in index.agents if (agent, scenario) in index.episode_signatures]
+
+
+def get_source(agent):
+    """
+        Open the logs of an agent, stored as a folder or an archive in base_dir.
+
+        :param agent: Agent Name
+        :return: source of the logs (see utils/agent_sources.py)
+    """
+    source = agent_sources.open_source(base_dir, agent, archives_dir)
+    if source is None:
+        raise FileNotFoundError("No logs of agent {} in {}".format(agent, base_dir))
+    return source
+
+
 def check_all_tree_and_get_meta_and_best(base_dir, agents):
     best_agents = {}
     meta_json = {}
 
     for agent in agents:
-        for scenario_name in os.listdir(os.path.join(base_dir, agent)):
-            scenario_folder = os.path.join(base_dir, agent, scenario_name)
-            if not os.path.isdir(scenario_folder):
-                continue
-            with open(os.path.join(scenario_folder, "episode_meta.json")) as f:
-                episode_meta = json.load(fp=f)
-                meta_json[scenario_name] = episode_meta
-                if scenario_name not in best_agents:
-                    best_agents[scenario_name] = {"value": -1, "agent": None, "out_of": 0}
-                if best_agents[scenario_name]["value"] < episode_meta["nb_timestep_played"]:
-                    best_agents[scenario_name]["value"] = episode_meta["nb_timestep_played"]
-                    best_agents[scenario_name]["agent"] = agent
-                    best_agents[scenario_name]['cum_reward'] = episode_meta['cumulative_reward']
-            best_agents[scenario_name]["out_of"] = best_agents[scenario_name]["out_of"] + 1
+        source = agent_sources.open_source(base_dir, agent, archives_dir)
+        for scenario_name in sorted(source.scan()):
+            episode_meta = source.read_meta(scenario_name)
+            record_episode_meta(meta_json, best_agents, agent, scenario_name, episode_meta)
     return meta_json, best_agents
 
 
+def record_episode_meta(meta_json, best_agents, agent, scenario_name, episode_meta):
+    """
+        Take the meta data of an episode into account in the scenario index and best agent table.
+
+        :param meta_json: meta data of the scenarios, updated in place
+        :param best_agents: best agent table, updated in place
+        :param agent: Agent Name
+        :param scenario_name: Name of the scenario
+        :param episode_meta: content of the episode_meta.json of the episode
+    """
+    meta_json[scenario_name] = episode_meta
+    if scenario_name not in best_agents:
+        best_agents[scenario_name] = {"value": -1, "agent": None, "out_of": 0}
+    if best_agents[scenario_name]["value"] < episode_meta["nb_timestep_played"]:
+        best_agents[scenario_name]["value"] = episode_meta["nb_timestep_played"]
+        best_agents[scenario_name]["agent"] = agent
+        best_agents[scenario_name]['cum_reward'] = episode_meta['cumulative_reward']
+    best_agents[scenario_name]["out_of"] = best_agents[scenario_name]["out_of"] + 1
+
+
+def list_agents():
+    return sorted(agent_sources.find_agents(base_dir))
+
+
+def scan_episodes(agent_names):
+    """
+        Get the signature of the episodes of some agents, stored as folders or archives.
+
+        Episodes without episode_meta.json, like episodes still being written, are ignored.
+
+        :param agent_names: names of the agents
+        :return: dict of signatures indexed by (agent, scenario)
+    """
+    signatures = {}
+    for agent in agent_names:
+        source = agent_sources.open_source(base_dir, agent, archives_dir)
+        if source is None:
+            continue  # removed agent
+        for scenario_name, signature in source.scan().items():
+            signatures[(agent, scenario_name)] = signature
+    return signatures
+
+
+index_lock = threading.Lock()
+# held while the containers of the index are swapped, see update_index and index_snapshot
+swap_lock = threading.Lock()
+index_listeners = []
+episode_signatures = {}
+
+IndexSnapshot = namedtuple("IndexSnapshot", ["agents", "episode_signatures", "meta_json", "best_agents", "scenarios"])
+
+
+def index_snapshot():
+    """
+        Get the containers of the index as of the same update, to read several of them together.
+
+        :return: IndexSnapshot
+    """
+    with swap_lock:
+        return IndexSnapshot(agents, episode_signatures, meta_json, best_agents, scenarios)
+
+
+def index_scenario(scenario_name, signatures):
+    """
+        Build the meta data and best agent entries of a scenario from its episodes on disk.
+
+        :param scenario_name: Name of the scenario
+        :param signatures: signatures of the episodes, indexed by (agent, scenario)
+        :return: (meta data, best agent entry) of the scenario, (None, None) if it has no readable episode
+    """
+    scenario_meta, scenario_best = {}, {}
+    for agent in sorted(agent for agent, scenario in signatures if scenario == scenario_name):
+        try:
+            episode_meta = get_source(agent).read_meta(scenario_name)
+        except agent_sources.READ_ERRORS:
+            continue  # being written
+        record_episode_meta(scenario_meta, scenario_best, agent, scenario_name, episode_meta)
+    return scenario_meta.get(scenario_name), scenario_best.get(scenario_name)
+
+
+def update_index(agent_names=None):
+    """
+        Update the agents, scenarios, meta data and best agents with the episodes added,
+        modified or removed on disk since the last update.
+
+        New lists and dicts are built and swapped for the module attributes at once, so that
+        a request reading them sees either the old or the new index: read them as attributes
+        of the module (manager.best_agents...), or with index_snapshot to use several of them
+        together. Only the scenarios of the changed episodes are refreshed, the modified or
+        removed episodes are invalidated in the caches, then the index listeners are notified
+        of each refreshed scenario.
+
+        :param agent_names: agents to look at (default None to scan all the agents)
+        :return: set of the refreshed scenarios
+    """
+    global agents, episode_signatures, meta_json, best_agents, scenarios
+    with index_lock:
+        if agent_names is None:
+            agent_names = list_agents()
+            looked_at = set(agent_names) | set(agents)
+        else:
+            looked_at = set(agent_names)
+        new = scan_episodes(looked_at)
+        old = {pair: signature for pair, signature in episode_signatures.items() if pair[0] in looked_at}
+        changed = {pair for pair in new.keys() & old.keys() if new[pair] != old[pair]}
+        removed = old.keys() - new.keys()
+        added = new.keys() - old.keys()
+        if not (changed or removed or added):
+            return set()
+
+        new_signatures = {pair: signature for pair, signature in episode_signatures.items() if pair not in removed}
+        new_signatures.update(new)
+        present = looked_at & set(list_agents())
+        new_agents = sorted((set(agents) - looked_at) | present)
+        new_meta, new_best, new_scenarios = dict(meta_json), dict(best_agents), set(scenarios)
+        refreshed = {scenario_name for _, scenario_name in changed | removed | added}
+        for scenario_name in refreshed:
+            scenario_meta, scenario_best = index_scenario(scenario_name, new_signatures)
+            if scenario_best is not None:
+                new_meta[scenario_name] = scenario_meta
+                new_best[scenario_name] = scenario_best
+                new_scenarios.add(scenario_name)
+            else:
+                new_scenarios.discard(scenario_name)
+                new_best.pop(scenario_name, None)
+                new_meta.pop(scenario_name, None)
+
+        with swap_lock:
+            agents, episode_signatures, meta_json, best_agents, scenarios = \
+                new_agents, new_signatures, new_meta, new_best, new_scenarios
+        for agent, scenario_name in changed | removed:
+            invalidate_episode(agent, scenario_name)
+        for scenario_name in refreshed:
+            for listener in index_listeners:
+                listener(scenario_name)
+    return refreshed
+
+
 """
 Initialisation routine
 """
@@ -150,40 +532,29 @@ if base_dir == "":
     base_dir = os.path.join(default_dir, "data", "agents")
 
 print("Agents ata used are located at: {}".format(base_dir))
+# number of steps sent on each side of the time window of the micro page
+window_margin = parser.getint("DEFAULT", "window_margin", fallback=50)
+# points of a figure above which its scatter traces are drawn with WebGL, 0 to disable (see common_graph.use_webgl)
+webgl_threshold = parser.getint("DEFAULT", "webgl_threshold", fallback=20000)
+# concurrent executions of the interactive and bulk callbacks (see utils/scheduler.py)
+interactive_workers = parser.getint("DEFAULT", "interactive_workers", fallback=4)
+bulk_workers = parser.getint("DEFAULT", "bulk_workers", fallback=2)
+# seconds between two scans of base_dir for new or modified agent logs, 0 to disable (see utils/watcher.py)
+watch_interval = parser.getfloat("DEFAULT", "watch_interval", fallback=10)
+# processes summarizing the episodes for the agents dashboard (see utils/agent_summaries.py)
+summary_processes = parser.getint("DEFAULT", "summary_processes", fallback=2)
 cache_dir = os.path.join(base_dir, "_cache")
+# indexes of the tar archives and scratch folders of the episodes being extracted
+archives_dir = os.path.join(cache_dir, "_archives")
 '''Parsing of agent folder tree'''
-agents = sorted([file for file in os.listdir(base_dir)
-                 if os.path.isdir(os.path.join(base_dir, file)) and not file.startswith("_")])
+agents = list_agents()
+episode_signatures = scan_episodes(agents)
 meta_json, best_agents = check_all_tree_and_get_meta_and_best(base_dir, agents)
-scenarios = []
-for agent in agents:
-    scen_path = os.path.join(base_dir, agent)
-    scens = [file for file in os.listdir(
-        scen_path) if os.path.isdir(os.path.join(scen_path, file))]
-    scenarios = scenarios + scens
-
-scenarios = set(scenarios)
+scenarios = {scenario for _, scenario in episode_signatures}
 
 '''Parsing of the environment configuration'''
 env_conf_folder = parser.get('DEFAULT', 'env_conf_folder')
 if env_conf_folder == "":
     env_conf_folder = os.path.join(default_dir, "data", "env_conf")
 print("Data used are located at: {}".format(base_dir))
-network_layout = []
-try:
-    network_layout_file = 'coords.csv'
-    with open(os.path.join(env_conf_folder, network_layout_file)) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=';')
-        line = 0  # skip the header part
-        for coords in csv_reader:
-            if line == 0:
-                line = line + 1
-                continue
-            network_layout.append(
-                (int(coords[0]),
-                 int(coords[1]))
-            )
-except configparser.NoOptionError as ex:
-    pass  # ignoring this error
-except FileNotFoundError as e:
-    pass  # ignoring that too
\ No newline at end of file
+network_layout = read_network_layout(os.path.join(env_conf_folder, 'coords.csv'))
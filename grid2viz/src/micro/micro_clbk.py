@@ -1,35 +1,64 @@
-import datetime as dt
-
 import plotly.graph_objects as go
-from dash.dependencies import Input, Output, State
+from dash import callback_context
+from dash.dependencies import ClientsideFunction, Input, Output, State
 from dash.exceptions import PreventUpdate
 
 from grid2viz.app import app
-from ..manager import make_episode, make_network
+from .. import manager
+from ..manager import make_episode, make_episode_window, make_network
 from ..utils.graph_utils import relayout_callback, get_axis_relayout
-from ..utils import common_graph
+from ..utils import common_graph, jobs
+from ..utils.callback_cache import memoized_callback
+from ..utils.divergence import get_divergence
+from ..utils.scheduler import interactive, interactive_on
+
+# number of steps sent by batch in playback mode, the next batch is requested
+# when less than PLAYBACK_PREFETCH steps of the current one remain to be played
+PLAYBACK_BATCH_SIZE = 96
+PLAYBACK_PREFETCH = 32
+
+
+def is_divergence_jump():
+    return any(trigger["prop_id"] == "micro_jump_divergence.n_clicks" for trigger in callback_context.triggered)
+
+
+def get_first_divergence(study_agent, ref_agent, scenario, episodes_ready):
+    """Get the first step where the study agent diverges from the ref agent, once the full episodes are loaded."""
+    if not episodes_ready:
+        raise PreventUpdate
+    first_step = get_divergence(study_agent, ref_agent, scenario).first_step
+    if first_step is None:
+        raise PreventUpdate
+    return first_step
 
 
 @app.callback(
-    [Output("slider", "min"), Output("slider", "max"), Output("slider", "value"), Output("slider", "marks")],
-    [Input("window", "data")],
-    [State("slider", "value"), State("agent_study", "data"), State("scenario", "data")]
+    [Output("slider", "min"), Output("slider", "max"), Output("slider_target", "data"), Output("slider", "marks")],
+    [Input("window", "data"),
+     Input("micro_jump_divergence", "n_clicks")],
+    [State("slider", "value"), State("agent_study", "data"), State("agent_ref", "data"),
+     State("scenario", "data"), State("micro_episodes_ready", "data")]
 )
-def update_slider(window, value, study_agent, scenario):
+@interactive
+def update_slider(window, jump_clicks, value, study_agent, ref_agent, scenario, episodes_ready):
+    """
+        Set the range of the slider to the time window, and the step it should be on.
+
+        The value goes through the slider_target store: the network.follow_playback
+        clientside callback owns slider.value to also move it with the playback.
+    """
     if window is None:
         raise PreventUpdate
-    new_episode = make_episode(study_agent, scenario)
+    new_episode = make_episode_window(study_agent, scenario, window)
 
-    min_ = new_episode.timestamps.index(
-        dt.datetime.strptime(window[0], "%Y-%m-%dT%H:%M:%S")
-    )
-    max_ = new_episode.timestamps.index(
-        dt.datetime.strptime(window[1], "%Y-%m-%dT%H:%M:%S")
-    )
-    if value not in range(min_, max_):
+    min_ = new_episode.timestamp_index.index(window[0])
+    max_ = new_episode.timestamp_index.index(window[1])
+    if is_divergence_jump():
+        value = min(max(get_first_divergence(study_agent, ref_agent, scenario, episodes_ready), min_), max_)
+    elif value not in range(min_, max_):
         value = min_
 
-    marks = dict(enumerate(map(lambda x: x.time(), new_episode.timestamps)))
+    marks = common_graph.make_slider_marks(new_episode, min_, max_)
 
     return min_, max_, value, marks
 
@@ -44,6 +73,7 @@ def update_slider(window, value, study_agent, scenario):
      Input("voltage_flow_graph", "relayoutData")],
     [State("relayoutStoreMicro", "data")]
 )
+@interactive
 def relayout_store_overview(*args):
     return relayout_callback(*args)
 
@@ -52,48 +82,88 @@ def relayout_store_overview(*args):
     Output("window", "data"),
     [Input("enlarge_left", "n_clicks"),
      Input("enlarge_right", "n_clicks"),
-     Input("user_timestamps", "value")],
-    [State('agent_study', 'data'), State("scenario", "data")]
+     Input("user_timestamps", "value"),
+     Input("micro_jump_divergence", "n_clicks")],
+    [State('agent_study', 'data'), State("agent_ref", "data"), State("scenario", "data"),
+     State("micro_episodes_ready", "data")]
 )
-def compute_window(n_clicks_left, n_clicks_right, user_selected_timestamp,
-                   study_agent, scenario):
-    if user_selected_timestamp is None:
-        raise PreventUpdate
+@interactive
+def compute_window(n_clicks_left, n_clicks_right, user_selected_timestamp, jump_clicks,
+                   study_agent, ref_agent, scenario, episodes_ready):
     if n_clicks_left is None:
         n_clicks_left = 0
     if n_clicks_right is None:
         n_clicks_right = 0
-    new_episode = make_episode(study_agent, scenario)
-    center_indx = new_episode.timestamps.index(
-        dt.datetime.strptime(user_selected_timestamp, '%Y-%m-%d %H:%M')
-    )
+    if is_divergence_jump():
+        # window centered on the first divergence, the slider being moved to it by update_slider
+        first_step = get_first_divergence(study_agent, ref_agent, scenario, episodes_ready)
+        return common_graph.compute_windows_range(
+            make_episode(study_agent, scenario), first_step, 0, 0
+        )
+    if user_selected_timestamp is None:
+        raise PreventUpdate
+    new_episode = make_episode_window(study_agent, scenario, [user_selected_timestamp] * 2)
+    center_indx = new_episode.timestamp_index.index(user_selected_timestamp)
     return common_graph.compute_windows_range(
         new_episode, center_indx, n_clicks_left, n_clicks_right
     )
 
 
+@app.callback(
+    [Output("micro_episodes_ready", "data"), Output("micro_loading_interval", "disabled")],
+    [Input("micro_loading_interval", "n_intervals")],
+    [State("micro_loading_jobs", "data")]
+)
+@interactive
+def update_micro_loading(n_intervals, job_ids):
+    """
+        Tell when the full episodes loading in the background are all in the caches.
+
+        A job that is done may have failed or been cancelled, and the process answering the
+        poll may not be the one running the job: the episodes themselves are looked up.
+    """
+    for job_id in job_ids or []:
+        agent, scenario = jobs.parse_job_id(job_id)
+        if not (manager.is_in_ram_cache(scenario, agent) or manager.is_in_fs_cache(scenario, agent)):
+            # submits the job again in this process if it does not know it
+            jobs.get_status(job_id)
+            raise PreventUpdate
+    return True, True
+
+
 # indicator line
 @app.callback(
     Output("cum_instant_reward_ts", "figure"),
     [Input("relayoutStoreMicro", "data"),
      Input("window", "data"),
-     Input("user_timestamps", "value")],
+     Input("user_timestamps", "value"),
+     Input("micro_episodes_ready", "data")],
     [State("cum_instant_reward_ts", "figure"),
      State("agent_study", "data"),
      State("agent_ref", "data"),
      State("scenario", "data")]
 )
-def load_reward_ts(relayout_data_store, window, selected_timestamp, figure, study_agent, agent_ref, scenario):
+@interactive_on("relayoutStoreMicro.data")
+def load_reward_ts(relayout_data_store, window, selected_timestamp, episodes_ready, figure, study_agent, agent_ref,
+                   scenario):
+    if not episodes_ready:
+        raise PreventUpdate
 
     layout = figure["layout"]
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
         new_axis_layout = get_axis_relayout(figure, relayout_data)
         if new_axis_layout is not None:
-            layout.update(new_axis_layout)
-            return figure
+            new_window = common_graph.relayout_window(relayout_data)
+            if new_window is None or common_graph.is_window_loaded(figure, new_window):
+                layout.update(common_graph.window_axis_layout(new_axis_layout, window))
+                return figure
+            # panned past the loaded data: load around the new range
+            window = new_window
 
-    figure = common_graph.make_rewards_ts(study_agent, agent_ref, scenario, layout)
+    new_episode = make_episode(study_agent, scenario)
+    figure = common_graph.make_rewards_ts(study_agent, agent_ref, scenario, layout,
+                                          common_graph.window_steps(new_episode, window))
 
     if window is not None:
         figure["layout"].update(
@@ -106,14 +176,19 @@ def load_reward_ts(relayout_data_store, window, selected_timestamp, figure, stud
 @app.callback(
     Output("actions_ts", "figure"),
     [Input('relayoutStoreMicro', 'data'),
-     Input("window", "data")],
+     Input("window", "data"),
+     Input("micro_episodes_ready", "data")],
     [State("actions_ts", "figure"),
      State("user_timestamps", "value"),
      State('agent_study', 'data'),
      State('agent_ref', 'data'),
      State("scenario", "data")]
 )
-def load_actions_ts(relayout_data_store, window, figure, selected_timestamp, study_agent, agent_ref, scenario):
+@interactive_on("relayoutStoreMicro.data")
+def load_actions_ts(relayout_data_store, window, episodes_ready, figure, selected_timestamp, study_agent, agent_ref,
+                    scenario):
+    if not episodes_ready:
+        raise PreventUpdate
 
     layout = figure["layout"]
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
@@ -121,10 +196,16 @@ def load_actions_ts(relayout_data_store, window, figure, selected_timestamp, stu
 
         new_axis_layout = get_axis_relayout(figure, relayout_data)
         if new_axis_layout is not None:
-            layout.update(new_axis_layout)
-            return figure
+            new_window = common_graph.relayout_window(relayout_data)
+            if new_window is None or common_graph.is_window_loaded(figure, new_window):
+                layout.update(common_graph.window_axis_layout(new_axis_layout, window))
+                return figure
+            # panned past the loaded data: load around the new range
+            window = new_window
 
-    figure = common_graph.make_action_ts(study_agent, agent_ref, scenario, layout)
+    new_episode = make_episode(study_agent, scenario)
+    figure = common_graph.make_action_ts(study_agent, agent_ref, scenario, layout,
+                                         common_graph.window_steps(new_episode, window))
 
     if window is not None:
         figure["layout"].update(
@@ -135,7 +216,7 @@ def load_actions_ts(relayout_data_store, window, figure, selected_timestamp, stu
 
 
 # flux line callback
-@app.callback(
+@memoized_callback(
     [Output('line_side_choices', 'options'),
      Output('line_side_choices', 'value')],
     [Input('voltage_flow_choice', 'value'),
@@ -143,9 +224,10 @@ def load_actions_ts(relayout_data_store, window, figure, selected_timestamp, stu
     [State('agent_study', 'data'),
      State("scenario", "data")]
 )
+@interactive
 def load_voltage_flow_line_choice(category, flow_choice, study_agent, scenario):
     option = []
-    new_episode = make_episode(study_agent, scenario)
+    new_episode = make_episode_window(study_agent, scenario)
 
     for name in new_episode.line_names:
         if category == 'voltage':
@@ -196,20 +278,26 @@ def load_voltage_flow_line_choice(category, flow_choice, study_agent, scenario):
      State('agent_study', 'data'),
      State("scenario", "data")]
 )
+@interactive_on("relayoutStoreMicro.data")
 def load_flow_voltage_graph(selected_lines, choice, relayout_data_store, window, figure, study_agent, scenario):
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
         layout = figure["layout"]
         new_axis_layout = get_axis_relayout(figure, relayout_data)
         if new_axis_layout is not None:
-            layout.update(new_axis_layout)
-            return figure
-    new_episode = make_episode(study_agent, scenario)
+            new_window = common_graph.relayout_window(relayout_data)
+            if new_window is None or common_graph.is_window_loaded(figure, new_window):
+                layout.update(common_graph.window_axis_layout(new_axis_layout, window))
+                return figure
+            # panned past the loaded data: load around the new range
+            window = new_window
+    new_episode = make_episode_window(study_agent, scenario, window)
+    steps = common_graph.window_steps(new_episode, window)
     if selected_lines is not None:
         if choice == 'voltage':
-            figure['data'] = load_voltage_for_lines(selected_lines, new_episode)
+            figure['data'] = common_graph.use_webgl(load_voltage_for_lines(selected_lines, new_episode, steps))
         if 'flow' in choice:
-            figure['data'] = load_flows_for_lines(selected_lines, new_episode)
+            figure['data'] = common_graph.use_webgl(load_flows_for_lines(selected_lines, new_episode, steps))
 
     if window is not None:
         figure["layout"].update(
@@ -223,6 +311,7 @@ def load_flow_voltage_graph(selected_lines, choice, relayout_data_store, window,
     Output('flow_radio', 'style'),
     [Input('voltage_flow_choice', 'value')],
 )
+@interactive
 def load_flow_graph(choice):
     if choice == 'flow':
         return {'display': 'block'}
@@ -230,59 +319,49 @@ def load_flow_graph(choice):
         return {'display': 'none'}
 
 
-def load_voltage_for_lines(lines, new_episode):
-    voltage = new_episode.flow_and_voltage_line
+def load_voltage_for_lines(lines, new_episode, steps=None):
+    line_states = new_episode.line_states
+    if steps is None:
+        steps = slice(None)
+    x = new_episode.timestamps[steps]
     traces = []
 
     for value in lines:
         # the first 2 characters are the side of line ('ex' or 'or')
         line_side = str(value)[:2]
         line_name = str(value)
-        if line_side == 'ex':
+        if line_side in ('ex', 'or'):
             traces.append(go.Scatter(
-                x=new_episode.timestamps,
-                # remove the first 3 char to get the line name and round to 3 dec
-                y=voltage['ex']['voltage'][line_name[3:]],
-                name=line_name)
-            )
-        if line_side == 'or':
-            traces.append(go.Scatter(
-                x=new_episode.timestamps,
-                y=voltage['or']['voltage'][line_name[3:]],
+                x=x,
+                # remove the first 3 char to get the line name
+                y=line_states.get(line_side, 'voltage', line_name[3:])[steps],
                 name=line_name)
             )
     return traces
 
 
-def load_flows_for_lines(lines, new_episode):
-    flow = new_episode.flow_and_voltage_line
+def load_flows_for_lines(lines, new_episode, steps=None):
+    line_states = new_episode.line_states
+    if steps is None:
+        steps = slice(None)
+    x = new_episode.timestamps[steps]
     traces = []
 
     for value in lines:
         line_side = str(value)[:2]  # the first 2 characters are the side of line ('ex' or 'or')
         flow_type = str(value)[3:].split('_', 1)[0]  # the type is the 1st part of the string: 'type_name'
         line_name = str(value)[3:].split('_', 1)[1]  # the name is the 2nd part of the string: 'type_name'
-        x = new_episode.timestamps
-        if line_side == 'ex':
+        if line_side in ('ex', 'or'):
             traces.append(go.Scatter(
                 x=x,
-                y=flow['ex'][flow_type][line_name],
-                name=value)
-            )
-        elif line_side == 'or':
-            traces.append(go.Scatter(
-                x=x,
-                y=flow['or'][flow_type][line_name],
+                y=line_states.get(line_side, flow_type, line_name)[steps],
                 name=value)
             )
         else:  # this concern usage rate
             name = value.split('_', 2)[2]  # get the powerline name
-            index_powerline = list(new_episode.line_names).index(name)
-            usage_rate_powerline = new_episode.rho.loc[new_episode.rho['equipment'] == index_powerline]['value']
-
             traces.append(go.Scatter(
                 x=x,
-                y=usage_rate_powerline,
+                y=line_states.get_rho(name)[steps],
                 name=name
             ))
 
@@ -290,14 +369,18 @@ def load_flows_for_lines(lines, new_episode):
 
 
 # context line callback
-@app.callback(
+@memoized_callback(
     [Output("asset_selector", "options"),
      Output("asset_selector", "value")],
-    [Input("environment_choices_buttons", "value")],
+    [Input("environment_choices_buttons", "value"),
+     Input("micro_episodes_ready", "data")],
     [State("agent_study", "data"),
      State("scenario", "data")]
 )
-def update_ts_graph_avail_assets(kind, study_agent, scenario):
+@interactive
+def update_ts_graph_avail_assets(kind, episodes_ready, study_agent, scenario):
+    if not episodes_ready:
+        raise PreventUpdate
     new_episode = make_episode(study_agent, scenario)
     return common_graph.ts_graph_avail_assets(kind, new_episode)
 
@@ -306,27 +389,36 @@ def update_ts_graph_avail_assets(kind, study_agent, scenario):
     Output("env_charts_ts", "figure"),
     [Input("asset_selector", "value"),
      Input("relayoutStoreMicro", "data"),
-     Input("window", "data")],
+     Input("window", "data"),
+     Input("micro_episodes_ready", "data")],
     [State("env_charts_ts", "figure"),
      State("environment_choices_buttons", "value"),
      State("scenario", "data"),
      State('agent_study', 'data')]
 )
-def load_context_data(equipments, relayout_data_store, window, figure, kind, scenario, agent_study):
+@interactive_on("relayoutStoreMicro.data")
+def load_context_data(equipments, relayout_data_store, window, episodes_ready, figure, kind, scenario, agent_study):
+    if not episodes_ready:
+        raise PreventUpdate
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
         layout = figure["layout"]
         new_axis_layout = get_axis_relayout(figure, relayout_data)
         if new_axis_layout is not None:
-            layout.update(new_axis_layout)
-            return figure
+            new_window = common_graph.relayout_window(relayout_data)
+            if new_window is None or common_graph.is_window_loaded(figure, new_window):
+                layout.update(common_graph.window_axis_layout(new_axis_layout, window))
+                return figure
+            # panned past the loaded data: load around the new range
+            window = new_window
 
     if kind is None:
         return figure
     if isinstance(equipments, str):
         equipments = [equipments]  # to make pd.series.isin() work
     episode = make_episode(agent_study, scenario)
-    figure['data'] = common_graph.environment_ts_data(kind, episode, equipments)
+    figure['data'] = common_graph.environment_ts_data(
+        kind, episode, equipments, common_graph.window_steps(episode, window))
 
     if window is not None:
         figure["layout"].update(
@@ -339,23 +431,32 @@ def load_context_data(equipments, relayout_data_store, window, figure, kind, sce
 @app.callback(
     [Output("overflow_ts", "figure"), Output("usage_rate_ts", "figure")],
     [Input("relayoutStoreMicro", "data"),
-     Input("window", "data")],
+     Input("window", "data"),
+     Input("micro_episodes_ready", "data")],
     [State("overflow_ts", "figure"),
      State("usage_rate_ts", "figure"),
      State('agent_study', 'data'),
      State('agent_ref', 'data'),
      State("scenario", "data")]
 )
-def update_agent_ref_graph(relayout_data_store, window,
+@interactive_on("relayoutStoreMicro.data")
+def update_agent_ref_graph(relayout_data_store, window, episodes_ready,
                            figure_overflow, figure_usage, study_agent, agent_ref, scenario):
+    if not episodes_ready:
+        raise PreventUpdate
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
         layout_usage = figure_usage["layout"]
         new_axis_layout = get_axis_relayout(figure_usage, relayout_data)
         if new_axis_layout is not None:
-            layout_usage.update(new_axis_layout)
-            figure_overflow["layout"].update(new_axis_layout)
-            return figure_overflow, figure_usage
+            new_window = common_graph.relayout_window(relayout_data)
+            if new_window is None or common_graph.is_window_loaded(figure_usage, new_window):
+                new_axis_layout = common_graph.window_axis_layout(new_axis_layout, window)
+                layout_usage.update(new_axis_layout)
+                figure_overflow["layout"].update(new_axis_layout)
+                return figure_overflow, figure_usage
+            # panned past the loaded data: load around the new range
+            window = new_window
 
     if window is not None:
         figure_overflow["layout"].update(
@@ -365,10 +466,12 @@ def update_agent_ref_graph(relayout_data_store, window,
             xaxis=dict(range=window, autorange=False)
         )
 
+    new_episode = make_episode(study_agent, scenario)
     return common_graph.agent_overflow_usage_rate_trace(
-        make_episode(study_agent, scenario),
+        new_episode,
         figure_overflow,
-        figure_usage
+        figure_usage,
+        common_graph.window_steps(new_episode, window)
     )
 
 
@@ -376,16 +479,98 @@ def update_agent_ref_graph(relayout_data_store, window,
     Output("timeseries_table_micro", "data"),
     [Input("timeseries_table", "data")]
 )
+@interactive
 def sync_timeseries_table(data):
     return data
 
 
 @app.callback(
-    Output("interactive_graph", "figure"),
+    Output("network_state", "data"),
     [Input("slider", "value")],
+    [State("agent_study", "data"),
+     State("scenario", "data"),
+     State("playback_position", "data")]
+)
+@interactive
+def update_interactive_graph(slider_value, study_agent, scenario, playback_position):
+    """
+        Send the state of the network at the selected step.
+
+        Only the per step attributes are sent, the network.render clientside callback
+        applies them to the figure skeleton already in the browser. While playing, the
+        slider follows the playback whose frames are already in the browser.
+    """
+    if playback_position is not None and playback_position.get("playing"):
+        raise PreventUpdate
+    new_episode = make_episode_window(study_agent, scenario, steps=(slider_value, slider_value + 1))
+    state = make_network(new_episode).get_state(new_episode.observations[slider_value])
+    state["step"] = slider_value
+    return state
+
+
+@app.callback(
+    Output("network_frames", "data"),
+    [Input("playback_request", "data")],
     [State("agent_study", "data"),
      State("scenario", "data")]
 )
-def update_interactive_graph(slider_value, study_agent, scenario):
-    new_episode = make_episode(study_agent, scenario)
-    return make_network(new_episode).get_plot_observation(new_episode.observations[slider_value])
+def load_network_frames(request, study_agent, scenario):
+    """
+        Send a batch of network states for the playback mode.
+
+        Triggered when the playback starts and, in the background, when the played
+        step comes close to the end of the current batch.
+    """
+    if request is None:
+        raise PreventUpdate
+    new_episode = make_episode_window(
+        study_agent, scenario, steps=(request["step"], request["step"] + PLAYBACK_BATCH_SIZE), purpose="playback")
+    n_steps = len(new_episode.observations)
+    start = min(max(0, request["step"]), n_steps - 1)
+    stop = min(start + PLAYBACK_BATCH_SIZE, n_steps)
+    frames = make_network(new_episode).get_states(new_episode.observations[start:stop])
+    frames.update(start=start, n_steps=n_steps, prefetch=PLAYBACK_PREFETCH)
+    return frames
+
+
+@app.callback(
+    Output("playback_interval", "interval"),
+    [Input("playback_speed", "value")]
+)
+@interactive
+def update_playback_speed(interval):
+    if interval is None:
+        raise PreventUpdate
+    return interval
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="network", function_name="playback"),
+    [Output("playback_interval", "disabled"),
+     Output("playback_button", "children"),
+     Output("playback_position", "data"),
+     Output("playback_request", "data")],
+    [Input("playback_interval", "n_intervals"),
+     Input("playback_button", "n_clicks")],
+    [State("network_frames", "data"),
+     State("slider", "value"),
+     State("playback_position", "data")]
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="network", function_name="follow_playback"),
+    Output("slider", "value"),
+    [Input("slider_target", "data"),
+     Input("playback_position", "data")],
+    [State("slider", "min"),
+     State("slider", "max")]
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="network", function_name="render"),
+    Output("interactive_graph", "figure"),
+    [Input("network_state", "data"),
+     Input("playback_position", "data")],
+    [State("network_frames", "data"),
+     State("interactive_graph", "figure")]
+)
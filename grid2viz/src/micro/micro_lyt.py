@@ -3,10 +3,10 @@ import dash_core_components as dcc
 import dash_antd_components as dac
 import plotly.graph_objects as go
 import dash_table as dt
-import datetime
 from collections import namedtuple
 
-from ..manager import make_episode, make_network, best_agents
+from .. import manager
+from ..manager import make_episode, make_episode_window, make_network
 from ..utils import common_graph
 
 layout_def = {
@@ -46,6 +46,32 @@ def indicator_line():
     ])
 
 
+def playback_controls():
+    return html.Div(className="row mt-4", children=[
+        dcc.Store(id="network_frames"),
+        dcc.Store(id="playback_position"),
+        dcc.Store(id="slider_target"),
+        dcc.Store(id="playback_request"),
+        dcc.Interval(id="playback_interval", interval=500, disabled=True),
+        html.Div(className="col-2", children=[
+            html.Button(id="playback_button", children="Play", className="btn btn-dark btn-block")
+        ]),
+        html.Div(className="col-3", children=[
+            dcc.Dropdown(
+                id="playback_speed",
+                options=[{'label': label, 'value': interval} for label, interval in
+                         [("x0.5", 1000), ("x1", 500), ("x2", 250), ("x4", 125)]],
+                value=500,
+                clearable=False
+            )
+        ]),
+        html.Div(className="col-3", children=[
+            html.Button(id="micro_jump_divergence", children="First divergence",
+                        className="btn btn-outline-dark btn-block")
+        ])
+    ])
+
+
 def flux_inspector_line(network_graph=None, slider_params=None):
     return html.Div(id="flux_inspector_line_id", className="lineBlock card", children=[
         html.H4("Flow"),
@@ -57,6 +83,7 @@ def flux_inspector_line(network_graph=None, slider_params=None):
                         html.H6(className="text-center",
                                 children="Interactive Graph"),
 
+                        dcc.Store(id="network_state"),
                         dcc.Graph(
                             id="interactive_graph",
                             figure=network_graph
@@ -65,10 +92,11 @@ def flux_inspector_line(network_graph=None, slider_params=None):
                             id="slider",
                             min=slider_params.min,
                             max=slider_params.max,
-                            step=None,
+                            step=1,
                             marks=slider_params.marks,
                             value=slider_params.value
-                        )
+                        ),
+                        playback_controls()
                     ])
                 ]),
                 html.Div(className="row", children=[
@@ -113,7 +141,17 @@ def flux_inspector_line(network_graph=None, slider_params=None):
     ])
 
 
-def context_inspector_line(best_episode, study_episode):
+def context_inspector_line(best_episode, study_episode, steps=None):
+    """
+        Context line of the micro page. When the episodes are still loading
+        (best_episode is None), its figures are left empty for the callbacks to fill them.
+    """
+    if best_episode is None:
+        load_names, usage_rate_traces, overflow_traces = [], [], []
+    else:
+        load_names = best_episode.load_names
+        usage_rate_traces = common_graph.slice_traces(study_episode.usage_rate_trace, study_episode, steps)
+        overflow_traces = common_graph.slice_traces(study_episode.total_overflow_trace, study_episode, steps)
     return html.Div(id="context_inspector_line_id", className="lineBlock card ", children=[
         html.H4("Context"),
         html.Div(className="card-body col row", children=[
@@ -134,8 +172,8 @@ def context_inspector_line(best_episode, study_episode):
                     id='asset_selector',
                     options=[{'label': load_name,
                               'value': load_name}
-                             for load_name in best_episode.load_names],
-                    value=best_episode.load_names[0],
+                             for load_name in load_names],
+                    value=load_names[0] if len(load_names) else None,
                     mode='multiple',
                     showArrow=True
                 ),
@@ -157,7 +195,7 @@ def context_inspector_line(best_episode, study_episode):
                             style={'margin-top': '1em'},
                             figure=go.Figure(
                                 layout=layout_def,
-                                data=study_episode.usage_rate_trace
+                                data=usage_rate_traces
                             ),
                             config=dict(displayModeBar=False)
                         )
@@ -169,7 +207,7 @@ def context_inspector_line(best_episode, study_episode):
                             style={'margin-top': '1em'},
                             figure=go.Figure(
                                 layout=layout_def,
-                                data=study_episode.total_overflow_trace
+                                data=overflow_traces
                             ),
                             config=dict(displayModeBar=False)
                         ),
@@ -202,10 +240,7 @@ all_info_line = html.Div(id="all_info_line_id", className="lineBlock card ", chi
 
 def center_index(user_selected_timestamp, episode):
     if user_selected_timestamp is not None:
-        center_indx = episode.timestamps.index(
-            datetime.datetime.strptime(
-                user_selected_timestamp, '%Y-%m-%d %H:%M')
-        )
+        center_indx = episode.timestamp_index.index(user_selected_timestamp)
     else:
         center_indx = 0
     return center_indx
@@ -217,38 +252,64 @@ def slider_params(user_selected_timestamp, episode):
     n_clicks_left = 0
     n_clicks_right = 0
     min_ = max([0, (value - 10 - 5 * n_clicks_left)])
-    max_ = min([(value + 10 + 5 * n_clicks_right), len(episode.timestamps)])
-    timestamp_range = episode.timestamps[
-                      min_:max_
-                      ]
-    timestamp_range = [timestamp.time() for timestamp in timestamp_range]
-    marks = dict(enumerate(timestamp_range))
+    max_ = min([(value + 10 + 5 * n_clicks_right), len(episode.timestamps)]) - 1
+    marks = common_graph.make_slider_marks(episode, min_, max_)
     return SliderParams(min_, max_, marks, value)
 
 
-def compute_window(user_selected_timestamp, study_agent, scenario):
+def compute_window(user_selected_timestamp, episode):
     if user_selected_timestamp is not None:
         n_clicks_left = 0
         n_clicks_right = 0
-        new_episode = make_episode(study_agent, scenario)
-        center_indx = center_index(user_selected_timestamp, new_episode)
+        center_indx = center_index(user_selected_timestamp, episode)
 
         return common_graph.compute_windows_range(
-            new_episode, center_indx, n_clicks_left, n_clicks_right
+            episode, center_indx, n_clicks_left, n_clicks_right
         )
 
 
-def layout(user_selected_timestamp, study_agent, ref_agent, scenario):
-    best_episode = make_episode(best_agents[scenario]["agent"], scenario)
-    new_episode = make_episode(study_agent, scenario)
+def episodes_loading(job_ids):
+    """
+        Components polling the loading of the full episodes of the page.
+
+        micro_episodes_ready becomes True when they are all loaded, which
+        triggers the callbacks of the indicator and context lines.
+    """
+    return html.Div(children=[
+        dcc.Store(id="micro_loading_jobs", data=job_ids),
+        dcc.Store(id="micro_episodes_ready", data=not job_ids),
+        dcc.Interval(id="micro_loading_interval", interval=1000, disabled=not job_ids),
+    ])
+
+
+def layout(user_selected_timestamp, study_agent, ref_agent, scenario, job_ids=()):
+    """
+        Layout of the agent study page.
+
+        While the full episodes are loading (job_ids not empty), the network and the
+        flows are shown from the steps of the window read from the raw logs, and the
+        indicator and context lines are filled once the episodes are loaded.
+
+        :param job_ids: ids of the background jobs loading the episodes of the page
+    """
+    job_ids = list(job_ids)
+    best_episode = None if job_ids else make_episode(manager.best_agents[scenario]["agent"], scenario)
+    if user_selected_timestamp is not None:
+        new_episode = make_episode_window(study_agent, scenario, [user_selected_timestamp] * 2)
+    else:
+        new_episode = make_episode_window(study_agent, scenario)
+    window = compute_window(user_selected_timestamp, new_episode)
+    if window is not None:
+        new_episode = make_episode_window(study_agent, scenario, window)
     center_indx = center_index(user_selected_timestamp, new_episode)
     network_graph = make_network(new_episode).get_plot_observation(new_episode.observations[center_indx])
 
     return html.Div(id="micro_page", children=[
         dcc.Store(id="relayoutStoreMicro"),
-        dcc.Store(id="window", data=compute_window(user_selected_timestamp, study_agent, scenario)),
+        dcc.Store(id="window", data=window),
+        episodes_loading(job_ids),
         indicator_line(),
         flux_inspector_line(network_graph, slider_params(user_selected_timestamp, new_episode)),
-        context_inspector_line(best_episode, new_episode),
+        context_inspector_line(best_episode, new_episode, common_graph.window_steps(new_episode, window)),
         all_info_line
     ])
@@ -5,9 +5,12 @@ from grid2viz.app import app
 import pandas as pd
 
 from ..utils.graph_utils import relayout_callback, get_axis_relayout
-from ..utils import common_graph
+from ..utils import common_graph, jobs
+from ..utils.callback_cache import memoized_callback
+from ..utils.scheduler import interactive, interactive_on
 from grid2kpi.episode import observation_model, EpisodeTrace
-from ..manager import make_episode, best_agents
+from .. import manager
+from ..manager import make_episode
 
 
 @app.callback(
@@ -17,16 +20,18 @@ from ..manager import make_episode, best_agents
      Input("overflow_graph", "relayoutData")],
     [State("relayoutStoreOverview", "data")]
 )
+@interactive
 def relayout_store_overview(*args):
     return relayout_callback(*args)
 
 
-@app.callback(
+@memoized_callback(
     [Output("input_assets_selector", "options"),
      Output("input_assets_selector", "value")],
     [Input("scen_overview_ts_switch", "value")],
     [State('scenario', 'data')]
 )
+@interactive
 def update_ts_graph_avail_assets(kind, scenario):
     """
         Change the selector's options according to the kind of trace selected.
@@ -34,7 +39,7 @@ def update_ts_graph_avail_assets(kind, scenario):
         Triggered when user click on one of the input in the scen_overview_ts_switch
         component in overview layout.
     """
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
     return common_graph.ts_graph_avail_assets(kind, best_agent_ep)
 
 
@@ -68,14 +73,14 @@ def load_environments_ts(equipments, relayout_data_store, figure, kind, scenario
 
     figure['data'] = common_graph.environment_ts_data(
         kind,
-        make_episode(best_agents[scenario]['agent'], scenario),
+        make_episode(manager.best_agents[scenario]['agent'], scenario),
         equipments
     )
 
     return figure
 
 
-@app.callback(
+@memoized_callback(
     Output("select_loads_for_tb", "options"),
     [Input('indicator_line', 'children')],
     [State('scenario', 'data')]
@@ -86,13 +91,13 @@ def update_select_loads(children, scenario):
 
         Triggered when indicator line is loaded.
     """
-    episode = make_episode(best_agents[scenario]["agent"], scenario)
+    episode = make_episode(manager.best_agents[scenario]["agent"], scenario)
     return [
         {'label': load, "value": load} for load in [*episode.load_names, 'total']
     ]
 
 
-@app.callback(
+@memoized_callback(
     Output("select_prods_for_tb", "options"),
     [Input('indicator_line', 'children')],
     [State('scenario', 'data')]
@@ -103,7 +108,7 @@ def update_select_prods(children, scenario):
 
         Triggered when indicator line is loaded.
     """
-    episode = make_episode(best_agents[scenario]["agent"], scenario)
+    episode = make_episode(manager.best_agents[scenario]["agent"], scenario)
     return [
         {'label': prod, "value": prod} for prod in episode.prod_names
     ]
@@ -160,7 +165,7 @@ def update_table(loads, prods, agent_ref, start_date, end_date, data, scenario):
 )
 def update_card_step(scenario):
     """Display the best agent number of step when the page is loaded."""
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
     return '{} / {}'.format(best_agent_ep.meta['nb_timestep_played'], best_agent_ep.meta['chronics_max_timestep'])
 
 
@@ -170,7 +175,7 @@ def update_card_step(scenario):
 )
 def update_card_maintenance(scenario):
     """Display the number of maintenance of the best agent when page is loaded."""
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
     return best_agent_ep.nb_maintenances
 
 
@@ -180,7 +185,7 @@ def update_card_maintenance(scenario):
 )
 def update_card_hazard(scenario):
     """Display the number of hazard of the best agent when page is loaded."""
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
     return best_agent_ep.nb_hazards
 
 
@@ -193,7 +198,7 @@ def update_card_duration_maintenances(scenario):
         Display the total duration of maintenances made by the best agent when
         page is loaded.
     """
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
     return best_agent_ep.total_maintenance_duration
 
 
@@ -208,7 +213,11 @@ def update_selected_ref_agent(ref_agent, scenario):
 
         Triggered when user select a new agent with the agent selector on layout.
     """
-    make_episode(ref_agent, scenario)
+    try:
+        jobs.wait_episode(ref_agent, scenario, slot="ref_agent")
+    except jobs.JobCancelled:
+        # another agent was selected meanwhile
+        raise PreventUpdate
     return ref_agent
 
 
@@ -219,6 +228,7 @@ def update_selected_ref_agent(ref_agent, scenario):
      Input("relayoutStoreOverview", "data")],
     [State("overflow_graph", "figure"), State("usage_rate_graph", "figure")]
 )
+@interactive_on("relayoutStoreOverview.data")
 def update_agent_ref_graph(ref_agent, scenario, relayout_data_store, figure_overflow, figure_usage):
     if relayout_data_store is not None and relayout_data_store["relayout_data"]:
         relayout_data = relayout_data_store["relayout_data"]
@@ -243,8 +253,8 @@ def update_agent_ref_graph(ref_agent, scenario, relayout_data_store, figure_over
 )
 def update_profile_conso_graph(scenario, figure):
     """Display best agent's consumption profile when page is loaded"""
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
-    figure["data"] = best_agent_ep.profile_traces
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
+    figure["data"] = common_graph.use_webgl(best_agent_ep.profile_traces)
     return figure
 
 
@@ -255,7 +265,7 @@ def update_profile_conso_graph(scenario, figure):
 )
 def update_production_share_graph(scenario, figure):
     """Display best agent's production share when page load"""
-    best_agent_ep = make_episode(best_agents[scenario]['agent'], scenario)
+    best_agent_ep = make_episode(manager.best_agents[scenario]['agent'], scenario)
     share_prod = EpisodeTrace.get_prod_share_trace(best_agent_ep)
     figure["data"] = share_prod
     return figure
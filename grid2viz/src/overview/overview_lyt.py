@@ -9,7 +9,8 @@ import dash_html_components as html
 import dash_table as dt
 import plotly.graph_objects as go
 
-from ..manager import agents, make_episode, best_agents
+from .. import manager
+from ..manager import make_episode
 
 layout_def = {
     'legend': {'orientation': 'h'},
@@ -116,7 +117,7 @@ def summary_line(episode, ref_agent):
                 dcc.Dropdown(
                     id="input_agent_selector", placeholder="select a ref agent",
                     options=[{'label': agent, 'value': agent}
-                             for agent in agents],
+                             for agent in manager.agents],
                     value=ref_agent
                 ),
                 html.Div(children=[
@@ -192,12 +193,12 @@ ref_agent_line = html.Div(children=[
 
 def layout(scenario, ref_agent):
     try:
-        episode = make_episode(best_agents[scenario]["agent"], scenario)
+        episode = make_episode(manager.best_agents[scenario]["agent"], scenario)
     except Exception as ex:
         print(ex)
         return
     if ref_agent is None:
-        ref_agent = agents[0]
+        ref_agent = manager.agents[0]
     return html.Div(id="overview_page", children=[
         dcc.Store(id="relayoutStoreOverview"),
         indicators_line,
@@ -0,0 +1,337 @@
+"""
+    Access to the logs of the agents, stored in base_dir as folders or as archives.
+
+    An agent is a folder <agent>/ or an archive <agent>.zip, <agent>.tar.zst (with the optional
+    zstandard package), <agent>.tar.gz or <agent>.tar holding the same tree: one folder per
+    scenario next to the dict_*_space.json files, directly or under a top folder. When both
+    exist, the folder is used.
+
+    A zip archive is indexed from its central directory, and the episode_meta.json of its
+    scenarios are read directly. A tar archive can only be read sequentially, so it is read
+    once to index it and the index is kept in the cache folder until the archive changes.
+    To compute an episode, only the members of its scenario and the files of the agent are
+    streamed to a scratch folder of the cache, removed once the episode is loaded.
+"""
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+META_FILE = "episode_meta.json"
+ARCHIVE_EXTENSIONS = (".tar.zst", ".tar.gz", ".tgz", ".tar", ".zip")
+
+# Errors of archives being written or corrupted, whose episodes are ignored until they are readable
+READ_ERRORS = (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile, tarfile.TarError)
+if zstandard is not None:
+    READ_ERRORS += (zstandard.ZstdError,)
+
+# index of the archives read in this process, by path: (stat of the archive, index)
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def archive_agent_name(file_name):
+    """
+        Get the agent name of an archive.
+
+        :param file_name: name of a file of base_dir
+        :return: agent name, or None if the file is not an archive
+    """
+    for extension in ARCHIVE_EXTENSIONS:
+        if file_name.endswith(extension) and len(file_name) > len(extension):
+            return file_name[:-len(extension)]
+    return None
+
+
+def agent_name(file_name):
+    """Get the agent name of a folder or archive of base_dir."""
+    name = archive_agent_name(file_name)
+    return file_name if name is None else name
+
+
+def find_agents(base_dir):
+    """
+        Find the agents of base_dir, the folders starting with "_" like _cache being ignored.
+
+        :param base_dir: folder of the agent logs
+        :return: dict of the paths of the folders or archives, indexed by agent name
+    """
+    found = {}
+    for file_name in sorted(os.listdir(base_dir)):
+        if file_name.startswith("_"):
+            continue
+        path = os.path.join(base_dir, file_name)
+        if os.path.isdir(path):
+            found[file_name] = path
+        else:
+            name = archive_agent_name(file_name)
+            if name is not None:
+                found.setdefault(name, path)
+    return found
+
+
+def open_source(base_dir, agent, index_dir):
+    """
+        Open the logs of an agent.
+
+        :param base_dir: folder of the agent logs
+        :param agent: Agent Name
+        :param index_dir: folder where the indexes of the tar archives are kept
+        :return: DirectorySource or archive source, None if the agent has no logs
+    """
+    path = os.path.join(base_dir, agent)
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    for extension in ARCHIVE_EXTENSIONS:
+        if os.path.isfile(path + extension):
+            if extension == ".zip":
+                return ZipSource(path + extension, index_dir)
+            return TarSource(path + extension, index_dir)
+    return None
+
+
+def safe_relative_path(name):
+    """Get the path of an archive member, None if it would be written out of the scratch folder."""
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    return os.path.join(*parts)
+
+
+class DirectorySource(object):
+    """
+    Logs of an agent stored in a folder.
+
+    Attributes
+    ----------
+    path : str
+        folder of the agent.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def scan(self):
+        """
+            Get the signature (modification time of episode_meta.json) of the episodes.
+
+            Folders without episode_meta.json, like episodes still being written, are ignored.
+
+            :return: dict of signatures indexed by scenario
+        """
+        signatures = {}
+        try:
+            scenario_names = os.listdir(self.path)
+        except OSError:
+            return signatures  # removed agent
+        for scenario_name in scenario_names:
+            try:
+                signatures[scenario_name] = os.stat(
+                    os.path.join(self.path, scenario_name, META_FILE)).st_mtime_ns
+            except OSError:
+                pass
+        return signatures
+
+    def read_meta(self, scenario):
+        with open(os.path.join(self.path, scenario, META_FILE)) as f:
+            return json.load(fp=f)
+
+    @contextmanager
+    def episode_dir(self, scenario, scratch_dir):
+        """Get the folder of the agent, to read the episode of a scenario with EpisodeData.from_disk."""
+        yield self.path
+
+
+class ArchiveSource(object):
+    """
+    Logs of an agent stored in an archive, indexed without extracting it.
+
+    The index holds, for each scenario, the signature and content of its episode_meta.json,
+    the prefix of its members and the prefix of the files of the agent.
+
+    Attributes
+    ----------
+    path : str
+        path of the archive.
+
+    """
+
+    persistent_index = False
+
+    def __init__(self, path, index_dir):
+        self.path = path
+        self.index_path = os.path.join(index_dir, os.path.basename(path) + ".index.json")
+
+    def scan(self):
+        """
+            Get the signature of the episodes, the archives being read only when they changed.
+
+            :return: dict of signatures indexed by scenario, empty if the archive is unreadable
+        """
+        try:
+            index = self.get_index()
+        except READ_ERRORS as ex:
+            print("WARNING Could not index {}: {}".format(self.path, ex))
+            return {}
+        return {scenario: entry["signature"] for scenario, entry in index.items()}
+
+    def read_meta(self, scenario):
+        return self.get_index()[scenario]["meta"]
+
+    def get_index(self):
+        stat = os.stat(self.path)
+        key = [stat.st_mtime_ns, stat.st_size]
+        with indexes_lock:
+            cached = indexes.get(self.path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        index = None
+        if self.persistent_index and os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    saved = json.load(fp=f)
+                if saved["stat"] == key:
+                    index = saved["episodes"]
+            except (OSError, ValueError, KeyError):
+                pass
+        if index is None:
+            index = self.make_index()
+            if self.persistent_index:
+                os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+                with open(self.index_path, "w") as f:
+                    json.dump(dict(stat=key, episodes=index), f)
+        with indexes_lock:
+            indexes[self.path] = (key, index)
+        return index
+
+    def make_index(self):
+        index = {}
+        for name, signature, read in self.iter_meta_members():
+            scenario_prefix = name[:-len(META_FILE)]
+            parts = scenario_prefix.rstrip("/").split("/")
+            scenario = parts[-1]
+            if not scenario:
+                continue  # episode_meta.json at the top of the archive
+            index[scenario] = dict(
+                signature=signature,
+                meta=json.loads(read().decode("utf-8")),
+                prefix=scenario_prefix,
+                agent_prefix="/".join(parts[:-1] + [""]).lstrip("/"),
+            )
+        return index
+
+    def iter_meta_members(self):
+        """Iterate over the (name, signature, function reading the content) of the episode_meta.json members."""
+        raise NotImplementedError
+
+    def is_episode_member(self, name, entry):
+        """Tell if a member belongs to the episode of an index entry, or is a file of the agent."""
+        if name.startswith(entry["prefix"]):
+            return True
+        agent_prefix = entry["agent_prefix"]
+        return name.startswith(agent_prefix) and "/" not in name[len(agent_prefix):]
+
+    @contextmanager
+    def episode_dir(self, scenario, scratch_dir):
+        """
+            Extract the episode of a scenario to a scratch folder, removed on exit.
+
+            :param scenario: Name of the scenario
+            :param scratch_dir: folder where the scratch folders are created
+            :return: scratch folder of the agent, to read the episode with EpisodeData.from_disk
+        """
+        entry = self.get_index()[scenario]
+        os.makedirs(scratch_dir, exist_ok=True)
+        path = tempfile.mkdtemp(dir=scratch_dir)
+        try:
+            self.extract_episode(entry, scenario, path)
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def extract_episode(self, entry, scenario, path):
+        raise NotImplementedError
+
+    def member_destination(self, name, entry, scenario, path):
+        if name.startswith(entry["prefix"]):
+            relative_path = safe_relative_path(name[len(entry["prefix"]):])
+            if relative_path is None:
+                return None
+            destination = os.path.join(path, scenario, relative_path)
+        else:
+            relative_path = safe_relative_path(name[len(entry["agent_prefix"]):])
+            if relative_path is None:
+                return None
+            destination = os.path.join(path, relative_path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        return destination
+
+
+class ZipSource(ArchiveSource):
+    """Logs of an agent in a zip archive, whose members are read at random."""
+
+    def iter_meta_members(self):
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith("/" + META_FILE) or info.filename == META_FILE:
+                    yield (info.filename, "{}:{}".format(info.CRC, info.file_size),
+                           lambda info=info: archive.read(info))
+
+    def extract_episode(self, entry, scenario, path):
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not self.is_episode_member(info.filename, entry):
+                    continue
+                destination = self.member_destination(info.filename, entry, scenario, path)
+                if destination is not None:
+                    with archive.open(info) as source, open(destination, "wb") as f:
+                        shutil.copyfileobj(source, f)
+
+
+class TarSource(ArchiveSource):
+    """Logs of an agent in a tar archive, compressed or not, read as a stream."""
+
+    persistent_index = True
+
+    @contextmanager
+    def open_stream(self):
+        with open(self.path, "rb") as f:
+            if self.path.endswith(".tar.zst"):
+                if zstandard is None:
+                    raise OSError("the zstandard package is needed to read .tar.zst archives")
+                with zstandard.ZstdDecompressor().stream_reader(f) as stream, \
+                        tarfile.open(fileobj=stream, mode="r|") as archive:
+                    yield archive
+            else:
+                with tarfile.open(fileobj=f, mode="r|*") as archive:
+                    yield archive
+
+    def iter_meta_members(self):
+        with self.open_stream() as archive:
+            for member in archive:
+                if member.isfile() and (member.name.endswith("/" + META_FILE) or member.name == META_FILE):
+                    # the content of a member of a stream is read before going to the next one
+                    content = archive.extractfile(member).read()
+                    yield (member.name, "{}:{}".format(member.mtime, member.size),
+                           lambda content=content: content)
+
+    def extract_episode(self, entry, scenario, path):
+        with self.open_stream() as archive:
+            for member in archive:
+                if not member.isfile() or not self.is_episode_member(member.name, entry):
+                    continue
+                destination = self.member_destination(member.name, entry, scenario, path)
+                if destination is not None:
+                    with open(destination, "wb") as f:
+                        shutil.copyfileobj(archive.extractfile(member), f)
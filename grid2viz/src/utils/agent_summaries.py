@@ -0,0 +1,187 @@
+"""
+    Performances of the agents across all the scenarios, built by a streaming map-reduce.
+
+    Map: each episode is reduced to a small summary (survival, cumulative reward, numbers
+    of overflows and actions) in a process of a pool, one episode at a time, the episode
+    being dropped as soon as it is summarized (see summary_worker.py). The summaries are appended to one JSON lines
+    file per agent in the _summaries folder of the cache as they arrive, so that a build
+    that is stopped resumes where it was, and only the episodes added or modified since
+    the last build are summarized again (see manager.episode_signatures).
+
+    Reduce: the aggregates of the agents are folded from the summaries, without holding
+    any episode in RAM, and can be computed while the build is still running.
+"""
+import json
+import multiprocessing
+import os
+import threading
+
+from .. import manager
+from . import summary_worker
+
+# episodes summarized by a process before it is replaced, to bound its memory
+MAX_TASKS_PER_PROCESS = 50
+
+summaries = {}
+lock = threading.Lock()
+loaded = False
+version = 0
+progress = dict(running=False, done=0, total=0, errors=0)
+
+
+def get_summaries_dir():
+    return os.path.join(manager.cache_dir, "_summaries")
+
+
+def load_summaries():
+    """Read the summaries saved by the previous builds, once."""
+    global loaded
+    with lock:
+        if loaded:
+            return
+        loaded = True
+    summaries_dir = get_summaries_dir()
+    if not os.path.isdir(summaries_dir):
+        return
+    for file_name in os.listdir(summaries_dir):
+        if not file_name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(summaries_dir, file_name)) as f:
+            for line in f:
+                try:
+                    summary = json.loads(line)
+                except ValueError:
+                    continue  # line cut by a stopped build
+                with lock:
+                    # the last summary of an episode is the most recent
+                    summaries[(summary["agent"], summary["scenario"])] = summary
+
+
+def is_valid(summary, signatures):
+    return summary is not None and summary["signature"] == signatures.get((summary["agent"], summary["scenario"]))
+
+
+def missing_episodes():
+    """
+        List the episodes without a summary of their current logs.
+
+        :return: list of (agent, scenario, signature)
+    """
+    signatures = dict(manager.episode_signatures)
+    with lock:
+        return [(agent, scenario, signature) for (agent, scenario), signature in sorted(signatures.items())
+                if not is_valid(summaries.get((agent, scenario)), signatures)]
+
+
+def save_summary(summary):
+    global version
+    summaries_dir = get_summaries_dir()
+    os.makedirs(summaries_dir, exist_ok=True)
+    with open(os.path.join(summaries_dir, summary["agent"] + ".jsonl"), "a") as f:
+        f.write(json.dumps(summary) + "\n")
+    with lock:
+        summaries[(summary["agent"], summary["scenario"])] = summary
+        version += 1
+
+
+def build(tasks, processes):
+    """
+        Summarize episodes on a pool of processes, saving each summary as it arrives.
+
+        :param tasks: list of (agent, scenario, signature)
+        :param processes: number of processes of the pool
+    """
+    # spawned processes do not inherit the threads and locks of the server
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(processes, initializer=summary_worker.init_worker,
+                          initargs=(manager.cache_dir, manager.base_dir, manager.archives_dir),
+                          maxtasksperchild=MAX_TASKS_PER_PROCESS) as pool:
+            for summary in pool.imap_unordered(summary_worker.summarize_episode, tasks):
+                if "error" in summary:
+                    print("WARNING Could not summarize {} on {}: {}".format(
+                        summary["agent"], summary["scenario"], summary["error"]))
+                    with lock:
+                        progress["errors"] += 1
+                else:
+                    save_summary(summary)
+                with lock:
+                    progress["done"] += 1
+    finally:
+        with lock:
+            progress["running"] = False
+
+
+def start():
+    """
+        Summarize the episodes without a valid summary in the background, unless it is already running.
+
+        :return: True if a build was started
+    """
+    load_summaries()
+    with lock:
+        if progress["running"]:
+            return False
+    tasks = missing_episodes()
+    if not tasks:
+        return False
+    with lock:
+        if progress["running"]:
+            return False
+        progress.update(running=True, done=0, total=len(tasks), errors=0)
+    threading.Thread(target=build, args=(tasks, manager.summary_processes),
+                     name="grid2viz_summaries", daemon=True).start()
+    return True
+
+
+def get_progress():
+    with lock:
+        return dict(progress, version=version)
+
+
+def iter_summaries():
+    """Iterate over the valid summaries, one at a time."""
+    signatures = dict(manager.episode_signatures)
+    with lock:
+        current = list(summaries.values())
+    for summary in current:
+        if is_valid(summary, signatures):
+            yield summary
+
+
+def aggregate(summaries_iter):
+    """
+        Fold summaries into per agent aggregates.
+
+        :param summaries_iter: iterable of summaries
+        :return: dict of aggregates indexed by agent, each with the number of scenarios,
+            of completed scenarios (survival of 1), the mean survival, the total and mean
+            cumulative reward, the total numbers of overflows and actions and the survival
+            and cumulative reward of each scenario (for the distributions)
+    """
+    aggregates = {}
+    for summary in summaries_iter:
+        agent = aggregates.setdefault(summary["agent"], dict(
+            nb_scenarios=0, nb_completed=0, survival_sum=0., cumulative_reward=0.,
+            nb_overflow=0, nb_action=0, survivals=[], rewards=[]))
+        survival = summary["survival"] if summary["survival"] is not None else 0.
+        agent["nb_scenarios"] += 1
+        agent["nb_completed"] += survival >= 1
+        agent["survival_sum"] += survival
+        agent["cumulative_reward"] += summary["cumulative_reward"]
+        agent["nb_overflow"] += summary["nb_overflow"]
+        agent["nb_action"] += summary["nb_action"]
+        agent["survivals"].append(survival)
+        agent["rewards"].append(summary["cumulative_reward"])
+    for agent in aggregates.values():
+        agent["mean_survival"] = agent.pop("survival_sum") / agent["nb_scenarios"]
+        agent["mean_cumulative_reward"] = agent["cumulative_reward"] / agent["nb_scenarios"]
+    return aggregates
+
+
+def invalidate_episode(agent, episode_name):
+    with lock:
+        summaries.pop((agent, episode_name), None)
+
+
+manager.invalidation_listeners.append(invalidate_episode)
@@ -0,0 +1,144 @@
+"""
+    Memoization of the callbacks that are pure functions of their inputs.
+
+    The responses are memoized at the Dash dispatch: the JSON response built by Dash
+    is stored as is, so a repeated call is answered from the stored JSON without
+    touching the episode data nor encoding the outputs again. The episodes read while
+    computing an entry are recorded with it (manager.recording_reads), and the entry is
+    dropped when one of them is invalidated in the manager or when the index of their
+    scenario changes (new best agent...).
+"""
+import functools
+import hashlib
+import inspect
+import json
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+from grid2viz.app import app
+from .. import manager
+
+MAX_ENTRIES = 1024
+
+# serialized responses and the episodes they were computed from, by key
+results = OrderedDict()
+keys_by_episode = {}
+lock = threading.Lock()
+
+
+def make_key(func, args):
+    description = json.dumps([func.__module__, func.__name__, args], cls=PlotlyJSONEncoder, sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def forget(key):
+    """Drop an entry and its references in keys_by_episode, lock held."""
+    _, episodes = results.pop(key, (None, ()))
+    for episode in episodes:
+        keys = keys_by_episode.get(episode)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del keys_by_episode[episode]
+
+
+def store(key, serialized, episodes):
+    with lock:
+        forget(key)
+        results[key] = (serialized, frozenset(episodes))
+        for episode in episodes:
+            keys_by_episode.setdefault(episode, set()).add(key)
+        while len(results) > MAX_ENTRIES:
+            forget(next(iter(results)))
+
+
+def memoize(dispatch):
+    """
+        Memoize the JSON responses of a callback registered in app.callback_map.
+
+        :param dispatch: function called by the Dash dispatch, returning the JSON response
+        :return: memoized dispatch function
+    """
+    @functools.wraps(dispatch)
+    def memoized(*args, **kwargs):
+        # the ids of the outputs are in the response
+        key = make_key(dispatch, [args, kwargs.get("outputs_list")])
+        with lock:
+            entry = results.get(key)
+            if entry is not None:
+                results.move_to_end(key)
+                return entry[0]
+        with manager.recording_reads() as episodes:
+            serialized = dispatch(*args, **kwargs)
+        store(key, serialized, episodes)
+        return serialized
+
+    return memoized
+
+
+def memoized_callback(output, inputs, state=()):
+    """
+        Register a callback like app.callback and memoize its JSON responses.
+
+        :param output: Output(s) of the callback
+        :param inputs: Inputs of the callback
+        :param state: States of the callback
+        :return: decorator
+    """
+    def wrap(func):
+        callback = app.callback(output, inputs, list(state))(func)
+        for entry in app.callback_map.values():
+            if entry["callback"] is callback:
+                entry["callback"] = memoize(callback)
+        return callback
+
+    return wrap
+
+
+def raw(callback):
+    """
+        Get the function decorated by a page callback, without the Dash and memoization wrappers,
+        to call it outside of the Dash dispatch (exports, benchmarks).
+
+        :param callback: function returned by app.callback or memoized_callback
+        :return: decorated function
+    """
+    return inspect.unwrap(callback)
+
+
+def invalidate_episode(agent, episode_name):
+    """
+        Drop the memoized responses computed from an episode.
+
+        :param agent: Agent Name
+        :param episode_name: Name of the episode
+    """
+    with lock:
+        for key in list(keys_by_episode.get((agent, episode_name), ())):
+            forget(key)
+
+
+def refresh_scenario(scenario):
+    """
+        Drop the memoized responses computed from the episodes of a scenario whose
+        index changed, as they may depend on its best agent.
+
+        :param scenario: Name of the scenario
+    """
+    with lock:
+        for episode in [episode for episode in keys_by_episode if episode[1] == scenario]:
+            for key in list(keys_by_episode.get(episode, ())):
+                forget(key)
+
+
+def clear():
+    """Drop all the memoized responses."""
+    with lock:
+        results.clear()
+        keys_by_episode.clear()
+
+
+manager.invalidation_listeners.append(invalidate_episode)
+manager.index_listeners.append(refresh_scenario)
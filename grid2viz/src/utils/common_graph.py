@@ -7,7 +7,10 @@ from plotly import graph_objects as go
 from grid2kpi.episode import EpisodeTrace, observation_model
 from grid2kpi.episode.actions_model import get_actions_sum
 
-from ..manager import make_episode
+from ..manager import make_episode, webgl_threshold, window_margin
+from .divergence import get_divergence
+
+MAX_SLIDER_MARKS = 8
 
 
 def ts_graph_avail_assets(ts_kind, episode):
@@ -45,7 +48,7 @@ def ts_graph_avail_assets(ts_kind, episode):
     return options, value
 
 
-def environment_ts_data(kind, episode, equipments):
+def environment_ts_data(kind, episode, equipments, steps=None):
     """
         Get the selected kind of timeserie trace for an equipment used in episode.
 
@@ -59,30 +62,53 @@ def environment_ts_data(kind, episode, equipments):
         :param episode: Episode studied
         :param equipments: A equipment to analyze like substation etc.
         :param prod_types: Different types of production
+        :param steps: slice of the steps to keep (default None to keep the whole episode)
         :return: A list of plotly object corresponding to a trace
     """
+    traces = None
     if kind == "Load":
-        return EpisodeTrace.get_load_trace_per_equipment(episode, equipments)
+        traces = EpisodeTrace.get_load_trace_per_equipment(episode, equipments)
     if kind == "Production":
         prod_types = episode.get_prod_types()
-        return EpisodeTrace.get_all_prod_trace(episode, prod_types, equipments)
+        traces = EpisodeTrace.get_all_prod_trace(episode, prod_types, equipments)
     if kind == "Hazards":
-        return EpisodeTrace.get_hazard_trace(episode, equipments)
+        traces = EpisodeTrace.get_hazard_trace(episode, equipments)
     if kind == "Maintenances":
-        return EpisodeTrace.get_maintenance_trace(episode, equipments)
+        traces = EpisodeTrace.get_maintenance_trace(episode, equipments)
+    if traces is None:
+        return None
+    return use_webgl(slice_traces(selected_traces(traces, episode, equipments), episode, steps))
+
+
+def selected_traces(traces, episode, equipments):
+    """
+        Drop the traces of the equipments that are not selected.
+
+        The equipment names of the cached episodes are categoricals (see episode_memory.py),
+        and grid2kpi groups them after filtering on the selection: the groupby also returns
+        the absent categories, as traces of equipments that are not selected.
+
+        :param traces: list of plotly traces named after their equipment
+        :param episode: Episode studied
+        :param equipments: list of selected equipments
+        :return: list of traces
+    """
+    absent = {*episode.load_names, *episode.prod_names, *episode.line_names} - set(equipments)
+    return [trace for trace in traces if trace["name"] not in absent]
 
 
-def agent_overflow_usage_rate_trace(episode, figure_overflow, figure_usage):
+def agent_overflow_usage_rate_trace(episode, figure_overflow, figure_usage, steps=None):
     """
         Get the trace of the overflow and the usage_rate for given episode.
 
         :param episode: Episode studied
         :param figure_overflow: figure which will contain the overflow trace
         :param figure_usage: figure which will contain the usage rate trace
+        :param steps: slice of the steps to keep (default None to keep the whole episode)
         :returns: Plotly figure for usage_rate and for overflow
     """
-    figure_overflow["data"] = episode.total_overflow_trace
-    figure_usage["data"] = episode.usage_rate_trace
+    figure_overflow["data"] = use_webgl(slice_traces(episode.total_overflow_trace, episode, steps))
+    figure_usage["data"] = use_webgl(slice_traces(episode.usage_rate_trace, episode, steps))
     return figure_overflow, figure_usage
 
 
@@ -160,7 +186,7 @@ def action_tooltip(episode_actions):
     return tooltip
 
 
-def make_action_ts(study_agent, ref_agent, scenario, layout_def=None):
+def make_action_ts(study_agent, ref_agent, scenario, layout_def=None, steps=None):
     """
         Make the action timeseries trace of study and reference agents.
 
@@ -168,6 +194,7 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_def=None):
         :param ref_agent: reference agent to compare with
         :param scenario:
         :param layout_def: layout page
+        :param steps: slice of the study agent's steps to keep (default None to keep the whole episode)
         :return: nb action and distance for each agents
     """
     ref_episode = make_episode(ref_agent, scenario)
@@ -176,7 +203,7 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_def=None):
     ref_agent_actions_ts = get_actions_sum(ref_episode)
 
     figure = {
-        'data': [
+        'data': use_webgl(slice_traces([
             go.Scatter(x=study_episode.action_data_table.timestamp,
                        y=actions_ts["Nb Actions"], name=study_agent,
                        text=action_tooltip(study_episode.actions)),
@@ -188,7 +215,7 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_def=None):
                        y=study_episode.action_data_table["distance"], name=study_agent + " distance", yaxis='y2'),
             go.Scatter(x=ref_episode.action_data_table.timestamp,
                        y=ref_episode.action_data_table["distance"], name=ref_agent + " distance", yaxis='y2'),
-        ],
+        ], study_episode, steps)),
         'layout': {**layout_def,
                    'yaxis': {'title': 'Actions'},
                    'yaxis2': {'title': 'Distance', 'side': 'right', 'anchor': 'x', 'overlaying': 'y'}}
@@ -197,7 +224,7 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_def=None):
     return figure
 
 
-def make_rewards_ts(study_agent, ref_agent, scenario, layout):
+def make_rewards_ts(study_agent, ref_agent, scenario, layout, steps=None):
     """
         Make kpi with rewards and cumulated reward for both reference agent and study agent.
 
@@ -205,6 +232,7 @@ def make_rewards_ts(study_agent, ref_agent, scenario, layout):
         :param ref_agent: agent to compare with
         :param scenario:
         :param layout: display configuration
+        :param steps: slice of the study agent's steps to keep (default None to keep the whole episode)
         :return: rewards and cumulated rewards for each agents
     """
     study_episode = make_episode(study_agent, scenario)
@@ -225,14 +253,46 @@ def make_rewards_ts(study_agent, ref_agent, scenario, layout):
     ref_episode_reward_trace = ref_episode.reward_trace
     studied_agent_reward_trace = study_episode.reward_trace
     return {
-        'data': [*ref_episode_reward_trace, *studied_agent_reward_trace,
-                 action_trace],
+        'data': use_webgl(slice_traces([*ref_episode_reward_trace, *studied_agent_reward_trace,
+                                        action_trace], study_episode, steps)),
         'layout': {**layout,
                    'yaxis': {'title': 'Instant Reward'},
                    'yaxis2': {'title': 'Cumulated Reward', 'side': 'right', 'anchor': 'x', 'overlaying': 'y'}, }
     }
 
 
+def make_divergence_ts(study_agent, ref_agent, scenario, layout):
+    """
+        Make the timeseries of the divergence of the study agent from the reference agent.
+
+        :param study_agent: agent studied
+        :param ref_agent: agent to compare with
+        :param scenario:
+        :param layout: display configuration
+        :return: numbers of elements on different buses and of lines with a different status,
+            largest usage rate difference and the first divergence marked
+    """
+    divergence = get_divergence(study_agent, ref_agent, scenario)
+    timestamps = pd.DatetimeIndex(divergence.timestamps)
+    shapes = []
+    first_label = divergence.first_label()
+    if first_label is not None:
+        shapes.append(dict(type="line", xref="x", yref="paper", x0=first_label, x1=first_label,
+                           y0=0, y1=1, line=dict(color="#F44336", dash="dash")))
+    return {
+        'data': use_webgl([
+            go.Bar(x=timestamps, y=divergence.topology, name="Elements on different buses"),
+            go.Bar(x=timestamps, y=divergence.line_status, name="Lines with different status"),
+            go.Scatter(x=timestamps, y=divergence.rho_delta, name="Max usage rate difference", yaxis='y2'),
+        ]),
+        'layout': {**layout,
+                   'barmode': 'stack',
+                   'shapes': shapes,
+                   'yaxis': {'title': 'Differences'},
+                   'yaxis2': {'title': 'Usage Rate', 'side': 'right', 'anchor': 'x', 'overlaying': 'y'}}
+    }
+
+
 def compute_windows_range(episode, center_idx, n_clicks_left, n_clicks_right):
     """
         Compute the timestamp range for the time window
@@ -242,10 +302,196 @@ def compute_windows_range(episode, center_idx, n_clicks_left, n_clicks_right):
         :param n_clicks_right: number of times user as click on enlarge right
         :return: the timesteps minimum and maximum
     """
-    timestamp_range = episode.timestamps[
-                      max([0, (center_idx - 10 - 5 * n_clicks_left)]):(center_idx + 10 + 5 * n_clicks_right)
-                      ]
-    xmin = timestamp_range[0].strftime("%Y-%m-%dT%H:%M:%S")
-    xmax = timestamp_range[-1].strftime("%Y-%m-%dT%H:%M:%S")
+    index = episode.timestamp_index
+    step_min = max([0, (center_idx - 10 - 5 * n_clicks_left)])
+    step_max = min([(center_idx + 10 + 5 * n_clicks_right), len(index)]) - 1
+
+    return index.label(step_min), index.label(step_max)
+
+
+def make_slider_marks(episode, min_, max_, max_marks=MAX_SLIDER_MARKS):
+    """
+        Make the marks of the steps slider for the visible window only.
+
+        The marks are thinned to at most max_marks labels so that they stay readable,
+        the slider itself still moves step by step.
+
+        :param episode: studied episode
+        :param min_: first step of the window
+        :param max_: last step of the window
+        :param max_marks: maximum number of labels
+        :return: dict of labels ("%H:%M") indexed by step
+    """
+    stride = max(1, int(np.ceil((max_ - min_ + 1) / max_marks)))
+    steps = range(min_, max_ + 1, stride)
+    return {step: episode.timestamp_index.label(step)[11:16] for step in steps}
+
+
+def window_steps(episode, window, margin=None):
+    """
+        Get the steps of the data to send for a time window.
+
+        The window is extended by margin steps on each side so that small pans
+        do not need new data.
+
+        :param episode: studied episode
+        :param window: [xmin, xmax] timestamps of the window (None for the whole episode)
+        :param margin: number of steps added on each side (default window_margin of the config)
+        :return: slice of steps, or None for the whole episode
+    """
+    if window is None:
+        return None
+    if margin is None:
+        margin = window_margin
+    index = episode.timestamp_index
+    start = max(0, index.searchsorted(window[0]) - margin)
+    stop = min(len(index), index.searchsorted(window[1], side="right") + margin)
+    return slice(start, max(start + 1, stop))
+
+
+def follows_steps(x, index):
+    """
+        Tell if the x values of a trace are the timestamps of the steps of an episode, one per step.
 
-    return xmin, xmax
+        Only the first and last values are converted, the traces built from the episode data
+        have one point per step.
+
+        :param x: x values of a trace
+        :param index: TimestampIndex of the episode
+        :return: True if x can be sliced by step
+    """
+    if len(x) != len(index) or len(x) == 0:
+        return False
+    ends = pd.to_datetime(np.concatenate([np.asarray(x[:1]), np.asarray(x[-1:])]))
+    return bool((ends.to_numpy(dtype="datetime64[s]") == index.values[[0, -1]]).all())
+
+
+def slice_traces(traces, episode, steps):
+    """
+        Keep only the points of traces that are in the timestamps of some steps.
+
+        The traces with one point per step are sliced by step, without converting their
+        timestamps; the other ones are filtered on their timestamps.
+        The traces are copied, the ones cached in the episodes are left untouched.
+
+        :param traces: list of plotly traces (objects or dicts) with timestamps as x
+        :param episode: episode whose timestamps define the steps
+        :param steps: slice of steps (None to keep everything)
+        :return: list of traces
+    """
+    if steps is None:
+        return traces
+    index = episode.timestamp_index
+    values = index.values[steps]
+    xmin, xmax = values[0], values[-1]
+    sliced = []
+    for trace in traces:
+        trace = dict(trace) if isinstance(trace, dict) else trace.to_plotly_json()
+        x = trace.get("x")
+        if x is None:
+            sliced.append(trace)
+            continue
+        n_points = len(x)
+        if follows_steps(x, index):
+            selection = steps
+        else:
+            x = pd.to_datetime(pd.Series(x)).to_numpy(dtype="datetime64[s]")
+            selection = (x >= xmin) & (x <= xmax)
+        for key in ("x", "y", "text", "hovertext", "customdata"):
+            value = trace.get(key)
+            if value is not None and not isinstance(value, str) and len(value) == n_points:
+                trace[key] = np.asarray(value)[selection]
+        sliced.append(trace)
+    return sliced
+
+
+def is_window_loaded(figure, window):
+    """
+        Check whether the data of a figure covers a time window.
+
+        :param figure: figure dict
+        :param window: [xmin, xmax] timestamps
+        :return: True if every point of the window is in the loaded data
+    """
+    xs = [pd.to_datetime(pd.Series(trace["x"])) for trace in figure.get("data", [])
+          if trace.get("x") is not None and len(trace["x"]) > 0]
+    if not xs:
+        return False
+    loaded_min = min(x.min() for x in xs)
+    loaded_max = max(x.max() for x in xs)
+    return loaded_min <= pd.Timestamp(window[0]) and pd.Timestamp(window[1]) <= loaded_max
+
+
+def window_axis_layout(new_axis_layout, window):
+    """
+        Get the x axis layout to apply to a graph holding a time window after a zoom event.
+
+        The graphs only hold the steps of the window and their margin, so a zoom reset
+        (autorange) goes back to the window rather than to the extent of the loaded data.
+
+        :param new_axis_layout: layout given by get_axis_relayout
+        :param window: [xmin, xmax] timestamps of the window (None when the whole episode is loaded)
+        :return: layout
+    """
+    if window is not None and new_axis_layout.get("xaxis", {}).get("autorange"):
+        return dict(xaxis=dict(range=window, autorange=False))
+    return new_axis_layout
+
+
+def relayout_window(relayout_data):
+    """
+        Get the time window of a zoom or pan event.
+
+        :param relayout_data: relayoutData of a graph
+        :return: [xmin, xmax] or None if the event has no x range
+    """
+    if "xaxis.range[0]" in relayout_data:
+        return [relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]]
+    return None
+
+
+def trace_attribute(trace, name, default=None):
+    value = trace.get(name) if isinstance(trace, dict) else getattr(trace, name, None)
+    return default if value is None else value
+
+
+def count_points(traces):
+    """
+        Count the points of the scatter traces of a figure.
+
+        :param traces: list of plotly traces (objects or dicts)
+        :return: number of points
+    """
+    n_points = 0
+    for trace in traces:
+        if trace_attribute(trace, "type", "scatter") != "scatter":
+            continue
+        values = trace_attribute(trace, "x", trace_attribute(trace, "y"))
+        if values is not None and not isinstance(values, str):
+            n_points += len(values)
+    return n_points
+
+
+def use_webgl(traces, threshold=None):
+    """
+        Draw the scatter traces of a figure with WebGL when it has many points.
+
+        SVG scatter traces make the browser unresponsive beyond a few tens of thousands of points
+        (like the usage rate of all the lines of a long episode). Above the threshold, all the
+        scatter traces of the figure become scattergl traces, so that they keep their drawing order.
+
+        :param traces: list of plotly traces (objects or dicts)
+        :param threshold: number of points (default webgl_threshold of the config, 0 to never switch)
+        :return: list of traces, the switched ones being copied as dicts
+    """
+    if threshold is None:
+        threshold = webgl_threshold
+    if traces is None or not threshold or count_points(traces) <= threshold:
+        return traces
+    switched = []
+    for trace in traces:
+        if trace_attribute(trace, "type", "scatter") == "scatter":
+            trace = dict(trace) if isinstance(trace, dict) else trace.to_plotly_json()
+            trace["type"] = "scattergl"
+        switched.append(trace)
+    return switched
@@ -0,0 +1,52 @@
+"""
+    Step by step divergence between a study agent and a reference agent on a scenario.
+
+    The divergences are computed from the cached episodes (see episode_divergence.py) and
+    cached per (scenario, study agent, reference agent), until one of the episodes is
+    invalidated in the manager.
+"""
+import threading
+from collections import OrderedDict
+
+from .. import manager
+from .episode_divergence import compute_divergence
+
+MAX_ENTRIES = 64
+
+divergences = OrderedDict()
+lock = threading.Lock()
+
+
+def get_divergence(study_agent, ref_agent, scenario):
+    """
+        Get the divergence of a study agent from a reference agent, computing it if needed.
+
+        :param study_agent: Name of the study agent
+        :param ref_agent: Name of the reference agent
+        :param scenario: Name of the scenario
+        :return: Divergence
+    """
+    key = (scenario, study_agent, ref_agent)
+    manager.record_read(study_agent, scenario)
+    manager.record_read(ref_agent, scenario)
+    with lock:
+        divergence = divergences.get(key)
+        if divergence is not None:
+            divergences.move_to_end(key)
+            return divergence
+    divergence = compute_divergence(manager.make_episode(study_agent, scenario),
+                                    manager.make_episode(ref_agent, scenario))
+    with lock:
+        divergences[key] = divergence
+        if len(divergences) > MAX_ENTRIES:
+            divergences.popitem(last=False)
+    return divergence
+
+
+def invalidate_episode(agent, episode_name):
+    with lock:
+        for key in [key for key in divergences if key[0] == episode_name and agent in key[1:]]:
+            del divergences[key]
+
+
+manager.invalidation_listeners.append(invalidate_episode)
@@ -0,0 +1,73 @@
+"""
+    Step by step divergence between the episodes of two agents on a scenario.
+
+    The topology vectors and line status of the observations of an episode are stacked in
+    (steps x elements) matrices when it enters the cache (episode_index.index_episode), so
+    that they are pickled with it, and the usage rates come from its LineStates. The
+    divergence of two episodes is computed with array operations over their common steps:
+    number of elements on different buses, number of lines with a different status, largest
+    usage rate difference and first step where the grids differ.
+
+    The module has no side effect when imported, the divergences are cached in divergence.py.
+"""
+import numpy as np
+
+
+class Divergence(object):
+    """
+    Per step differences between two episodes of a scenario, on their common steps.
+
+    Attributes
+    ----------
+    timestamps : numpy.ndarray
+        datetime64[s] timestamps of the common steps.
+    topology : numpy.ndarray
+        number of elements connected to different buses, per step.
+    line_status : numpy.ndarray
+        number of lines with a different status, per step.
+    rho_delta : numpy.ndarray
+        largest absolute difference of usage rate of a line, per step.
+    first_step : int
+        first step where the topologies or line status differ, None if they never do.
+
+    """
+
+    def __init__(self, timestamps, topology, line_status, rho_delta):
+        self.timestamps = timestamps
+        self.topology = topology
+        self.line_status = line_status
+        self.rho_delta = rho_delta
+        differ = (topology > 0) | (line_status > 0)
+        self.first_step = int(np.argmax(differ)) if differ.any() else None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def label(self, step):
+        """Get the label of a step, in the format of the x values of the figures ("%Y-%m-%d %H:%M")."""
+        return str(np.datetime_as_string(self.timestamps[step], unit="m")).replace("T", " ")
+
+    def first_label(self):
+        return None if self.first_step is None else self.label(self.first_step)
+
+
+def compute_divergence(study_episode, ref_episode):
+    """
+        Compute the divergence of two episodes of the same scenario.
+
+        :param study_episode: EpisodeAnalytics of the study agent, indexed by episode_index.index_episode
+        :param ref_episode: EpisodeAnalytics of the reference agent, indexed likewise
+        :return: Divergence
+    """
+    topology = [episode.observation_matrices["topo_vect"] for episode in (study_episode, ref_episode)]
+    status = [episode.observation_matrices["line_status"] for episode in (study_episode, ref_episode)]
+    rho = [episode.line_states.rho for episode in (study_episode, ref_episode)]
+    n_steps = min(len(study_episode.timestamp_index), len(ref_episode.timestamp_index),
+                  *[len(matrix) for matrix in topology + status + rho])
+
+    return Divergence(
+        study_episode.timestamp_index.values[:n_steps],
+        np.count_nonzero(topology[0][:n_steps] != topology[1][:n_steps], axis=1),
+        np.count_nonzero(status[0][:n_steps] != status[1][:n_steps], axis=1),
+        np.nan_to_num(np.abs(rho[0][:n_steps] - rho[1][:n_steps])).max(axis=1, initial=0),
+    )
@@ -0,0 +1,151 @@
+"""
+    Indexes and columnar stores attached to the episodes when they enter the cache,
+    so that the callbacks do not have to scan the episode data on each call.
+"""
+import numpy as np
+import pandas as pd
+
+
+class TimestampIndex(object):
+    """
+    Constant time lookup of the step of a timestamp in an episode.
+
+    Attributes
+    ----------
+    values : numpy.ndarray
+        datetime64[s] array of the timestamps of the episode, one per step.
+
+    """
+
+    def __init__(self, timestamps):
+        self.values = np.array(timestamps, dtype="datetime64[s]")
+        self._positions = dict(zip(self.values.astype(np.int64).tolist(), range(len(self.values))))
+
+    def __len__(self):
+        return len(self.values)
+
+    def index(self, timestamp):
+        """
+            Get the step of a timestamp.
+
+            :param timestamp: datetime or string ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M"...)
+            :return: step of the timestamp in the episode
+            :raises ValueError: if the timestamp is not in the episode (like list.index)
+        """
+        key = np.datetime64(timestamp, "s").astype(np.int64).item()
+        try:
+            return self._positions[key]
+        except KeyError:
+            raise ValueError("{} is not in the episode".format(timestamp))
+
+    def searchsorted(self, timestamp, side="left"):
+        """
+            Get the step where a timestamp, possibly not in the episode, would be inserted.
+
+            :param timestamp: datetime or string (fractions of seconds are ignored)
+            :param side: "left" or "right", see numpy.searchsorted
+            :return: step in [0, len(episode)]
+        """
+        timestamp = pd.Timestamp(timestamp).floor("s").to_datetime64()
+        return int(np.searchsorted(self.values, np.datetime64(timestamp, "s"), side=side))
+
+    def label(self, step):
+        """
+            Get the ISO label ("%Y-%m-%dT%H:%M:%S") of a step.
+
+            :param step: step in the episode
+            :return: string label
+        """
+        return str(np.datetime_as_string(self.values[step], unit="s"))
+
+
+# attributes of the observations stacked in (steps x elements) matrices, with their dtype,
+# small to keep long episodes light (see episode_divergence.py)
+OBSERVATION_MATRICES = {"topo_vect": np.int8, "line_status": bool}
+
+
+def stack_observations(observations, attribute, dtype):
+    """
+        Stack a vector attribute of observations.
+
+        :param observations: list of grid2op observations
+        :param attribute: name of the attribute (topo_vect, line_status...)
+        :param dtype: dtype of the matrix
+        :return: (steps x elements) matrix
+    """
+    if not len(observations):
+        return np.zeros((0, 0), dtype=dtype)
+    return np.vstack([np.asarray(getattr(observation, attribute), dtype=dtype) for observation in observations])
+
+
+class LineStates(object):
+    """
+    Columnar store of the per line time series of an episode.
+
+    Each kind of data is a (steps x lines) float32 matrix whose columns follow
+    the order of episode.line_names, so that selecting a line is a column slice.
+
+    Attributes
+    ----------
+    columns : dict
+        column of each line, indexed by line name.
+    matrices : dict
+        matrices indexed by (side, kind), side being "or" or "ex" and kind one of the
+        kinds of episode.flow_and_voltage_line ("active", "current", "voltage"...).
+    rho : numpy.ndarray
+        usage rate matrix of the lines.
+
+    """
+
+    def __init__(self, episode):
+        line_names = list(episode.line_names)
+        self.columns = {name: column for column, name in enumerate(line_names)}
+        self.matrices = {
+            (side, kind): frame.reindex(columns=line_names).to_numpy(dtype=np.float32)
+            for side, kinds in episode.flow_and_voltage_line.items()
+            for kind, frame in kinds.items()
+        }
+
+        # the usage rate comes in long format: one row per (step, line)
+        steps, _ = pd.factorize(episode.rho["timestamp"], sort=False)
+        self.rho = np.full((steps.max(initial=-1) + 1, len(line_names)), np.nan, dtype=np.float32)
+        self.rho[steps, episode.rho["equipment"].to_numpy(dtype=int)] = episode.rho["value"].to_numpy()
+
+    def get(self, side, kind, line_name):
+        """
+            Get the time series of a line.
+
+            :param side: "or" or "ex"
+            :param kind: kind of data ("active", "current", "voltage"...)
+            :param line_name: name of the line
+            :return: float32 array with one value per step
+        """
+        return self.matrices[(side, kind)][:, self.columns[line_name]]
+
+    def get_rho(self, line_name):
+        """
+            Get the usage rate time series of a line.
+
+            :param line_name: name of the line
+            :return: float32 array with one value per step
+        """
+        return self.rho[:, self.columns[line_name]]
+
+
+def index_episode(episode):
+    """
+        Attach the indexes to an episode if it does not have them yet.
+
+        Episodes pickled before the indexes existed get them when loaded.
+
+        :param episode: EpisodeAnalytics
+        :return: the same episode
+    """
+    if getattr(episode, "timestamp_index", None) is None:
+        episode.timestamp_index = TimestampIndex(episode.timestamps)
+    if getattr(episode, "line_states", None) is None:
+        episode.line_states = LineStates(episode)
+    if getattr(episode, "observation_matrices", None) is None:
+        episode.observation_matrices = {attribute: stack_observations(episode.observations, attribute, dtype)
+                                        for attribute, dtype in OBSERVATION_MATRICES.items()}
+    return episode
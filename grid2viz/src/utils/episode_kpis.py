@@ -0,0 +1,20 @@
+"""
+    KPIs of an episode, shared by the pages, the KPI API, the exports and the agent summaries.
+
+    The module has no side effect when imported, so that the worker processes computing
+    the KPIs can import it without the application (see summary_worker.py).
+"""
+
+
+def get_score_agent(agent):
+    score = agent.meta["cumulative_reward"]
+    return round(score)
+
+
+def get_nb_overflow_agent(agent):
+    return agent.total_overflow_ts["value"].sum()
+
+
+def get_nb_action_agent(agent):
+    return agent.action_data_table[['action_line', 'action_subs']].sum(
+        axis=1).sum()
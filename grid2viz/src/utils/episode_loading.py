@@ -0,0 +1,49 @@
+"""
+    Reading of the episodes from the file system cache and computation from the raw logs.
+
+    The functions take the folders they use as arguments and the module has no side effect
+    when imported, so that they are shared by the manager and by the worker processes,
+    which do not import the application (see summary_worker.py).
+"""
+import os
+import pickle
+
+from grid2kpi.episode.EpisodeAnalytics import EpisodeAnalytics
+from grid2op.EpisodeData import EpisodeData
+
+
+def fs_cache_file(cache_dir, episode_name, agent):
+    """
+        Get the path of an episode in the file system cache.
+
+        :param cache_dir: folder of the cache
+        :param episode_name: Name of the episode
+        :param agent: Agent Name
+        :return: path of the pickle file
+    """
+    return os.path.join(cache_dir, episode_name, agent + ".pickle")
+
+
+def read_fs_cache(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def compute_episode(source, episode_name, agent, scratch_dir, progress=None):
+    """
+        Compute an episode from its raw logs.
+
+        :param source: source of the logs of the agent (see agent_sources.py)
+        :param episode_name: Name of the episode
+        :param agent: Agent Name
+        :param scratch_dir: folder where the episodes of archives are extracted while they are read
+        :param progress: function called with the name of each loading stage (default None)
+        :return: EpisodeAnalytics
+    """
+    if progress is not None:
+        progress("loading raw logs")
+    with source.episode_dir(episode_name, scratch_dir) as path:
+        episode_data = EpisodeData.from_disk(path, episode_name)
+    if progress is not None:
+        progress("computing flows, actions and KPIs")
+    return EpisodeAnalytics(episode_data, episode_name, agent)
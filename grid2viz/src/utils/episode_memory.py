@@ -0,0 +1,140 @@
+"""
+    Compact storage of the data frames of the episodes, and their memory usage.
+
+    grid2kpi builds the frames of an episode in long format (one row per step and equipment)
+    with float64 values and object columns repeating the equipment names on every step.
+    Before an episode enters the cache, the measurements of the grid (FLOAT32_COLUMNS of the
+    long frames, and the wide frames of FLOAT32_FRAMES) are downcast to float32 and the
+    integer columns to the smallest integer type. The other float columns, like the rewards
+    and their cumulated sums, keep their float64 precision. The repeated string columns, like
+    the equipment names, become categoricals with sorted categories, so that the columns of
+    two episodes of a grid compare. The groupby of a categorical column also returns the
+    categories absent from a filtered frame: the traces grid2kpi builds per equipment are
+    filtered on the selected equipments (see common_graph.environment_ts_data). The
+    timestamp columns stay datetime64, so that they can still be compared and used with the
+    .dt accessor; the steps themselves are indexed by the TimestampIndex.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+# A string column becomes categorical when it has at most this share of distinct values
+MAX_CATEGORY_RATIO = 0.5
+# float columns of the long frames holding measurements of the grid, stored as float32
+FLOAT32_COLUMNS = frozenset(["value"])
+# wide frames of measurements of the grid (one column per equipment), stored as float32
+FLOAT32_FRAMES = ("flow_and_voltage_line",)
+# version of the compaction, episodes cached with a previous one are compacted again when loaded
+COMPACTION_VERSION = 3
+# attributes of the episodes holding a grid2op object per step
+OBJECT_LISTS = ("observations", "actions")
+# attributes of the indexed episodes holding arrays computed from the frames and observations
+INDEX_ATTRIBUTES = ("line_states", "observation_matrices")
+
+
+def compact_frame(frame, float32_columns=FLOAT32_COLUMNS):
+    """
+        Downcast the columns of a data frame in place.
+
+        :param frame: pandas.DataFrame
+        :param float32_columns: float columns downcast to float32, all the float columns if None
+        :return: the same frame
+    """
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_float_dtype(values.dtype):
+            if values.dtype.itemsize > 4 and (float32_columns is None or column in float32_columns):
+                frame[column] = values.astype("float32")
+        elif pd.api.types.is_integer_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            frame[column] = pd.to_numeric(values, downcast="integer")
+        elif values.dtype == object and len(values):
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind == "string" and values.nunique() <= MAX_CATEGORY_RATIO * len(values):
+                frame[column] = values.astype("category")
+            elif kind in ("datetime", "datetime64"):
+                frame[column] = pd.to_datetime(values)
+    return frame
+
+
+def iter_frames(episode):
+    """
+        Iterate over the data frames of an episode, including the ones nested in dicts
+        like flow_and_voltage_line.
+
+        :param episode: EpisodeAnalytics
+        :return: iterator of (name, frame)
+    """
+    def walk(name, value):
+        if isinstance(value, pd.DataFrame):
+            yield name, value
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                yield from walk("{}.{}".format(name, key), item)
+
+    for name, value in vars(episode).items():
+        yield from walk(name, value)
+
+
+def compact_episode(episode):
+    """
+        Downcast all the data frames of an episode in place.
+
+        Episodes pickled before the compaction, or with a previous version of it, get it when loaded.
+
+        :param episode: EpisodeAnalytics
+        :return: the same episode
+    """
+    if getattr(episode, "compacted", False) != COMPACTION_VERSION:
+        for name, frame in iter_frames(episode):
+            wide = name.split(".")[0] in FLOAT32_FRAMES
+            compact_frame(frame, None if wide else FLOAT32_COLUMNS)
+        episode.compacted = COMPACTION_VERSION
+    return episode
+
+
+def objects_memory_usage(objects):
+    """
+        Estimate the memory used by a list of grid2op objects (observations, actions):
+        the objects and the values of their attributes, arrays counted by their buffers.
+
+        :param objects: list of objects
+        :return: bytes
+    """
+    total = sys.getsizeof(objects)
+    for item in objects:
+        total += sys.getsizeof(item)
+        for value in getattr(item, "__dict__", {}).values():
+            total += value.nbytes if isinstance(value, np.ndarray) else sys.getsizeof(value)
+    return total
+
+
+def arrays_memory_usage(value):
+    """
+        Get the memory used by the arrays of an index, a dict of arrays or an object holding arrays.
+
+        :param value: dict or object
+        :return: bytes
+    """
+    values = value.values() if isinstance(value, dict) else vars(value).values()
+    return sum(item.nbytes for item in values if isinstance(item, np.ndarray))
+
+
+def memory_usage(episode):
+    """
+        Get the memory used by the data frames of an episode, and by its lists of grid2op
+        objects, which the compaction leaves unchanged, and by its indexes once indexed.
+
+        :param episode: EpisodeAnalytics
+        :return: dict of the bytes used by each frame or list of objects, indexed by name
+    """
+    usage = {name: int(frame.memory_usage(index=True, deep=True).sum()) for name, frame in iter_frames(episode)}
+    for name in OBJECT_LISTS:
+        objects = getattr(episode, name, None)
+        if objects is not None:
+            usage[name] = objects_memory_usage(objects)
+    for name in INDEX_ATTRIBUTES:
+        index = getattr(episode, name, None)
+        if index is not None:
+            usage[name] = arrays_memory_usage(index)
+    return usage
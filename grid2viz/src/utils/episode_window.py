@@ -0,0 +1,271 @@
+"""
+    Partial episodes read from the raw logs, for the agent study (micro) page.
+
+    The micro page only shows a window of steps around the studied timestamp, but computing
+    the EpisodeAnalytics of an episode decodes all its steps. An EpisodeWindow decodes only
+    the observations of the steps [first - margin, stop + margin) of the window, the
+    observations.npy log being memory mapped, and computes the flows, voltages, usage rates
+    and network states of these steps. It has the attributes of the episodes used by the
+    network and flow parts of the micro page, indexed by the steps of the whole episode.
+
+    The timestamps of all the steps are extrapolated from the first two observations when the
+    time step of the chronics is constant, which the last observation and the observations of
+    each window read confirm. Otherwise the timestamps of all the observations are decoded,
+    so that the steps always have the timestamps of the full EpisodeAnalytics.
+"""
+import datetime as dt
+import os
+
+import numpy as np
+import pandas as pd
+from grid2op.Observation import ObservationSpace
+
+from .episode_index import TimestampIndex
+
+# kinds of the flow and voltage data of the lines, as in EpisodeAnalytics.flow_and_voltage_line,
+# with the prefix of the matching observation attributes (p_or, a_ex...)
+LINE_KINDS = {"active": "p", "reactive": "q", "current": "a", "voltage": "v"}
+
+
+def read_observation_vectors(episode_path):
+    """
+        Open the observations log of an episode without reading it.
+
+        :param episode_path: folder of the episode
+        :return: (steps x observation size) array, memory mapped for .npy logs
+    """
+    path = os.path.join(episode_path, "observations.npy")
+    if os.path.isfile(path):
+        return np.load(path, mmap_mode="r")
+    # compressed logs cannot be memory mapped
+    return np.load(os.path.join(episode_path, "observations.npz"))["data"]
+
+
+def observation_datetime(observation):
+    return dt.datetime(int(observation.year), int(observation.month), int(observation.day),
+                       int(observation.hour_of_day), int(observation.minute_of_hour))
+
+
+def vector_datetime(observation_space, vector):
+    return observation_datetime(observation_space.from_vect(np.asarray(vector)))
+
+
+def decode_timeline(observation_space, vectors, n_steps):
+    """
+        Get the timestamps of all the steps of an episode by decoding all its observations.
+
+        :param observation_space: grid2op observation space of the episode
+        :param vectors: observation vectors of the episode
+        :param n_steps: number of steps of the episode
+        :return: TimestampIndex
+    """
+    return TimestampIndex([vector_datetime(observation_space, vectors[step]) for step in range(n_steps)])
+
+
+def make_timeline(observation_space, vectors, n_steps):
+    """
+        Get the timestamps of all the steps of an episode, extrapolated from its first two
+        observations if its last observation is at the extrapolated timestamp, decoded otherwise.
+
+        :param observation_space: grid2op observation space of the episode
+        :param vectors: observation vectors of the episode
+        :param n_steps: number of steps of the episode
+        :return: TimestampIndex
+    """
+    if n_steps <= 2:
+        return decode_timeline(observation_space, vectors, n_steps)
+    start = vector_datetime(observation_space, vectors[0])
+    time_step = vector_datetime(observation_space, vectors[1]) - start
+    if time_step <= dt.timedelta(0) or \
+            vector_datetime(observation_space, vectors[n_steps - 1]) != start + (n_steps - 1) * time_step:
+        return decode_timeline(observation_space, vectors, n_steps)
+    return TimestampIndex(pd.date_range(start, periods=n_steps, freq=time_step))
+
+
+def matches_timeline(timestamp_index, first, observations):
+    """Tell if decoded observations have the timestamps of their steps in a timeline."""
+    timestamps = np.array([observation_datetime(observation) for observation in observations], dtype="datetime64[s]")
+    return np.array_equal(timestamps, timestamp_index.values[first:first + len(observations)])
+
+
+def window_range(timestamp_index, window=None, steps=None, margin=0):
+    """
+        Get the steps of a time window, extended by a margin.
+
+        :param timestamp_index: TimestampIndex of the episode
+        :param window: [xmin, xmax] timestamps of the window
+        :param steps: (first, stop) steps of the window, used when window is None
+        :param margin: number of steps added on each side
+        :return: (first, stop) steps, at least one step in the episode
+    """
+    n_steps = len(timestamp_index)
+    if window is not None:
+        first = timestamp_index.searchsorted(window[0])
+        stop = timestamp_index.searchsorted(window[1], side="right")
+    elif steps is not None:
+        first, stop = steps
+    else:
+        first, stop = 0, 1
+    first = min(max(0, first - margin), max(0, n_steps - 1))
+    stop = min(n_steps, max(first + 1, stop + margin))
+    return first, stop
+
+
+class StepSeries(object):
+    """
+    Time series known on a window of steps, indexed by the steps of the whole episode.
+
+    Selecting steps out of the window gives NaN, like the steps after a game over.
+
+    """
+
+    def __init__(self, values, first, n_steps):
+        self.values = values
+        self.first = first
+        self.n_steps = n_steps
+
+    def __len__(self):
+        return self.n_steps
+
+    def __getitem__(self, steps):
+        indices = np.arange(self.n_steps)[steps]
+        if np.ndim(indices) == 0:
+            return self[[int(indices)]][0]
+        result = np.full(len(indices), np.nan, dtype=np.float32)
+        inside = (indices >= self.first) & (indices < self.first + len(self.values))
+        result[inside] = self.values[indices[inside] - self.first]
+        return result
+
+
+class WindowLineStates(object):
+    """
+    Per line time series of a window of steps, with the interface of episode_index.LineStates.
+
+    Attributes
+    ----------
+    columns : dict
+        column of each line, indexed by line name.
+    matrices : dict
+        (window steps x lines) float32 matrices indexed by (side, kind).
+    rho : numpy.ndarray
+        (window steps x lines) usage rate matrix.
+
+    """
+
+    def __init__(self, line_names, observations, first, n_steps):
+        self.columns = {name: column for column, name in enumerate(line_names)}
+        self.first = first
+        self.n_steps = n_steps
+        self.matrices = {
+            (side, kind): self._stack(observations, "{}_{}".format(prefix, side), len(line_names))
+            for side in ("or", "ex") for kind, prefix in LINE_KINDS.items()
+        }
+        self.rho = self._stack(observations, "rho", len(line_names))
+
+    @staticmethod
+    def _stack(observations, attribute, n_lines):
+        if not observations:
+            return np.zeros((0, n_lines), dtype=np.float32)
+        return np.vstack([getattr(observation, attribute) for observation in observations]).astype(np.float32)
+
+    def get(self, side, kind, line_name):
+        return StepSeries(self.matrices[(side, kind)][:, self.columns[line_name]], self.first, self.n_steps)
+
+    def get_rho(self, line_name):
+        return StepSeries(self.rho[:, self.columns[line_name]], self.first, self.n_steps)
+
+
+class WindowObservations(object):
+    """Observations of a window of steps, indexed by the steps of the whole episode."""
+
+    def __init__(self, observations, first, n_steps):
+        self.observations = observations
+        self.first = first
+        self.n_steps = n_steps
+
+    def __len__(self):
+        return self.n_steps
+
+    def __getitem__(self, steps):
+        stop = self.first + len(self.observations)
+        if isinstance(steps, slice):
+            start, end, stride = steps.indices(self.n_steps)
+            if end > start and (start < self.first or end > stop):
+                raise IndexError("steps {} to {} are not all in the window [{}, {})".format(
+                    start, end, self.first, stop))
+            return self.observations[start - self.first:end - self.first:stride]
+        step = steps + self.n_steps if steps < 0 else steps
+        if not self.first <= step < stop:
+            raise IndexError("step {} is not in the window [{}, {})".format(steps, self.first, stop))
+        return self.observations[step - self.first]
+
+
+class EpisodeWindow(object):
+    """
+    Window of steps of an episode, decoded from the raw logs.
+
+    Attributes
+    ----------
+    agent : str
+        name of the agent.
+    episode_name : str
+        name of the scenario.
+    meta : dict
+        content of the episode_meta.json of the episode.
+    observation_space : grid2op ObservationSpace
+        observation space of the episode.
+    first, stop : int
+        steps of the window, stop excluded.
+    timestamp_index : TimestampIndex
+        timestamps of all the steps of the episode.
+    observations : WindowObservations
+        observations of the window.
+    line_states : WindowLineStates
+        flows, voltages and usage rates of the lines on the window.
+
+    """
+
+    def __init__(self, agent, episode_name, meta, observation_space, timestamp_index, first, observations):
+        self.agent = agent
+        self.episode_name = episode_name
+        self.meta = meta
+        self.observation_space = observation_space
+        self.timestamp_index = timestamp_index
+        self.timestamps = pd.DatetimeIndex(timestamp_index.values)
+        self.line_names = [str(name) for name in observation_space.name_line]
+        self.first = first
+        self.stop = first + len(observations)
+        self.observations = WindowObservations(observations, first, len(timestamp_index))
+        self.line_states = WindowLineStates(self.line_names, observations, first, len(timestamp_index))
+
+    def covers(self, first, stop):
+        return self.first <= first and stop <= self.stop
+
+    @classmethod
+    def read(cls, agent_path, agent, episode_name, meta, window=None, steps=None, margin=0, timestamp_index=None):
+        """
+            Decode the steps of a window of an episode.
+
+            :param agent_path: folder of the logs of the agent
+            :param agent: Agent Name
+            :param episode_name: Name of the episode
+            :param meta: content of the episode_meta.json of the episode
+            :param window: [xmin, xmax] timestamps of the window
+            :param steps: (first, stop) steps of the window, used when window is None
+            :param margin: number of steps read on each side of the window
+            :param timestamp_index: TimestampIndex of the episode if already known
+            :return: EpisodeWindow
+        """
+        observation_space = ObservationSpace.from_dict(os.path.join(agent_path, "dict_observation_space.json"))
+        vectors = read_observation_vectors(os.path.join(agent_path, episode_name))
+        n_steps = min(len(vectors), int(meta["nb_timestep_played"]))
+        if timestamp_index is None:
+            timestamp_index = make_timeline(observation_space, vectors, n_steps)
+        first, stop = window_range(timestamp_index, window, steps, margin)
+        observations = [observation_space.from_vect(vector) for vector in np.asarray(vectors[first:stop])]
+        if not matches_timeline(timestamp_index, first, observations):
+            # time step not constant between the observations checked by make_timeline
+            timestamp_index = decode_timeline(observation_space, vectors, n_steps)
+            first, stop = window_range(timestamp_index, window, steps, margin)
+            observations = [observation_space.from_vect(vector) for vector in np.asarray(vectors[first:stop])]
+        return cls(agent, episode_name, meta, observation_space, timestamp_index, first, observations)
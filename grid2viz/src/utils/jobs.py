@@ -0,0 +1,262 @@
+"""
+    Background loading of the episodes on a local pool of threads, with progress reporting.
+
+    A page needing episodes that are not in the RAM cache submits one job per episode and
+    returns a skeleton at once; the skeleton polls the stage of the jobs until they are done.
+    A job of an episode already being loaded is shared by all the pages waiting for it.
+
+    The jobs can be attached to a slot of the user session (the page, the study agent...):
+    a new request of the session for the same slot cancels the jobs of the previous one.
+    The jobs leave their slots when they finish, and a slot is dropped once it has no
+    running job, so that the slots of the past sessions are not kept.
+    A job waiting for a worker is dropped; a running job stops at the next stage boundary
+    before the episode is computed. Episodes already computed are still cached.
+
+    The jobs are local to a process of the server. When the server runs several processes,
+    the polls of a skeleton may reach another process than the one that submitted its jobs:
+    get_status submits the unknown jobs again, so that they are never taken as done.
+"""
+import os
+import threading
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError
+
+import flask
+
+from .. import manager
+from . import scheduler
+
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Stages at which a cancelled job stops, the later ones only cache the computed episode
+CANCELLABLE_STAGES = ("loading from cache", "loading raw logs", "computing flows, actions and KPIs")
+
+# Seconds between two checks of a waiting request for a newer request of its session slot
+WAIT_POLL_INTERVAL = 0.2
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="grid2viz_job")
+jobs = {}
+slots = {}
+lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised in a job, or in a request waiting for it, when the job is cancelled."""
+
+
+class Job(object):
+    """
+    Loading of an episode in the background.
+
+    Attributes
+    ----------
+    stage : str
+        current stage of the loading, updated by manager.make_episode.
+    future : concurrent.futures.Future
+        future of the loading.
+    cancelled : threading.Event
+        set when no request waits for the job anymore.
+
+    """
+
+    def __init__(self, agent, scenario):
+        self.agent = agent
+        self.scenario = scenario
+        self.stage = "waiting for a worker"
+        self.future = None
+        self.cancelled = threading.Event()
+
+    @property
+    def id(self):
+        return make_job_id(self.agent, self.scenario)
+
+    def set_stage(self, stage):
+        if self.cancelled.is_set() and stage in CANCELLABLE_STAGES:
+            raise JobCancelled("{} on {}".format(self.agent, self.scenario))
+        self.stage = stage
+
+    def run(self):
+        # the episode is kept by the cache, not by the job
+        manager.make_episode(self.agent, self.scenario, progress=self.set_stage)
+
+    def cancel(self):
+        if not self.future.cancel():
+            self.cancelled.set()
+
+    def status(self):
+        """
+            Get the status of the job.
+
+            :return: dict with the agent, scenario, stage, done flag and error message if any
+        """
+        done = self.future.done()
+        error = None
+        if self.future.cancelled():
+            error = "cancelled"
+        elif done and self.future.exception() is not None:
+            error = repr(self.future.exception())
+        return dict(agent=self.agent, scenario=self.scenario, stage="done" if done else self.stage,
+                    done=done, error=error)
+
+
+def make_job_id(agent, scenario):
+    return "{}/{}".format(agent, scenario)
+
+
+def parse_job_id(job_id):
+    """Get the (agent, scenario) of a job id, the agents being folder names."""
+    agent, scenario = job_id.split("/", 1)
+    return agent, scenario
+
+
+def get_session_id():
+    """Get the id of the user session of the current request."""
+    if "grid2viz_id" not in flask.session:
+        flask.session["grid2viz_id"] = uuid.uuid4().hex
+    return flask.session["grid2viz_id"]
+
+
+def submit_episode(agent, scenario):
+    """
+        Load an episode in the background, unless it is already being loaded.
+
+        :param agent: Agent Name
+        :param scenario: Name of the episode
+        :return: id of the job
+    """
+    job_id = make_job_id(agent, scenario)
+    with lock:
+        job = jobs.get(job_id)
+        submitted = job is None or job.future.done()
+        if submitted:
+            job = Job(agent, scenario)
+            job.future = executor.submit(job.run)
+            jobs[job_id] = job
+        else:
+            # requested again before it stopped
+            job.cancelled.clear()
+    if submitted:
+        # outside of the lock: called at once if the job is already done
+        job.future.add_done_callback(lambda future: release_job(job))
+    return job_id
+
+
+def release_job(job):
+    """
+        Detach a finished job from the slots, dropping the slots left without jobs,
+        so that the slots of the past sessions do not pile up.
+
+        :param job: Job
+    """
+    job_id = job.id
+    with lock:
+        if jobs.get(job_id) is not job:
+            return  # replaced by a new job of the episode, attached in its place
+        for key in [key for key, job_ids in slots.items() if job_id in job_ids]:
+            slots[key] = [other for other in slots[key] if other != job_id]
+            if not slots[key]:
+                del slots[key]
+
+
+def attach_to_slot(job_ids, slot):
+    """
+        Attach jobs to a slot of the current session and cancel the ones previously attached,
+        unless another slot still needs them.
+
+        :param job_ids: ids of the jobs
+        :param slot: name of the slot
+    """
+    key = (get_session_id(), slot)
+    with lock:
+        stale = set(slots.get(key, [])) - set(job_ids)
+        # the jobs already done are not waited for, see release_job
+        running = [job_id for job_id in job_ids if job_id in jobs and not jobs[job_id].future.done()]
+        if running:
+            slots[key] = running
+        else:
+            slots.pop(key, None)
+        needed = {job_id for job_ids in slots.values() for job_id in job_ids}
+        for job_id in stale - needed:
+            job = jobs.get(job_id)
+            if job is not None and not job.future.done():
+                job.cancel()
+
+
+def is_attached(job_id, slot):
+    with lock:
+        return job_id in slots.get((get_session_id(), slot), [])
+
+
+def get_status(job_id):
+    """
+        Get the status of a job.
+
+        The jobs are local to the process: a job unknown here, submitted by another process
+        of the server, is submitted again in this one, whose RAM cache needs the episode too.
+
+        :param job_id: id given by submit_episode
+        :return: status dict (see Job.status)
+    """
+    with lock:
+        job = jobs.get(job_id)
+    if job is None:
+        submit_episode(*parse_job_id(job_id))
+        with lock:
+            job = jobs[job_id]
+    return job.status()
+
+
+def load_in_background(episodes, slot=None):
+    """
+        Submit the jobs of the episodes that are not in the RAM cache.
+
+        :param episodes: list of (agent, scenario)
+        :param slot: slot of the current session the jobs are attached to (default None)
+        :return: list of job ids, empty if all the episodes are in the RAM cache
+    """
+    job_ids = [submit_episode(agent, scenario) for agent, scenario in dict.fromkeys(episodes)
+               if agent is not None and not manager.is_in_ram_cache(scenario, agent)]
+    if slot is not None:
+        attach_to_slot(job_ids, slot)
+    return job_ids
+
+
+def wait_episodes(episodes, slot):
+    """
+        Load episodes in parallel jobs attached to a slot of the current session and wait for them.
+
+        :param episodes: list of (agent, scenario)
+        :param slot: slot of the current session
+        :return: dict of the episodes indexed by (agent, scenario)
+        :raises JobCancelled: if a newer request of the session replaced this one in the slot
+    """
+    episodes = list(dict.fromkeys(episodes))
+    job_ids = load_in_background(episodes, slot)
+    with lock:
+        waited = [jobs[job_id] for job_id in job_ids]
+    # the jobs run on their own pool, the callback slot is free for other requests meanwhile
+    with scheduler.waiting():
+        for job in waited:
+            while True:
+                try:
+                    job.future.result(timeout=WAIT_POLL_INTERVAL)
+                    break
+                except TimeoutError:
+                    if not is_attached(job.id, slot):
+                        raise JobCancelled("{} on {}".format(job.agent, job.scenario))
+                except CancelledError:
+                    raise JobCancelled("{} on {}".format(job.agent, job.scenario))
+    return {(agent, scenario): manager.make_episode(agent, scenario) for agent, scenario in episodes}
+
+
+def wait_episode(agent, scenario, slot):
+    """
+        Load an episode in a job attached to a slot of the current session and wait for it.
+
+        :param agent: Agent Name
+        :param scenario: Name of the episode
+        :param slot: slot of the current session
+        :return: the episode
+        :raises JobCancelled: if a newer request of the session replaced this one in the slot
+    """
+    return wait_episodes([(agent, scenario)], slot)[(agent, scenario)]
@@ -0,0 +1,214 @@
+"""
+    Network graph of the micro page split into a static topology skeleton and per step states.
+
+    The skeleton (substations, lines and their labels, loads and generators around their
+    substation) is built once per grid layout. A state only holds the numeric attributes
+    that change from one step to another (usage rate, flow, line status and number of buses
+    per substation, power and bus of the loads and generators) and is applied
+    to the skeleton either on the server with :meth:`NetworkRenderer.apply_state` or
+    in the browser by the ``network`` clientside functions (assets/network.js), which also
+    animate batches of states in playback mode.
+"""
+import copy
+
+import numpy as np
+
+# Colors of the lines, indexed by the "colors" entry of a state
+LINE_PALETTE = ["#9E9E9E", "#2196F3", "#FF9800", "#F44336"]
+RHO_THRESHOLDS = [0.9, 1.]
+SUB_COLOR = "#607D8B"
+SUB_SPLIT_COLOR = "#FFEB3B"
+LOAD_COLOR = "#8BC34A"
+GEN_COLOR = "#9C27B0"
+# distance of the loads and generators to their substation
+INJECTION_RADIUS = 25
+
+
+def injection_color(color, bus):
+    """Color of a load or generator: its own on bus 1, the one of split substations on bus 2, grey if disconnected."""
+    if bus < 1:
+        return LINE_PALETTE[0]
+    return color if bus == 1 else SUB_SPLIT_COLOR
+
+
+class NetworkRenderer(object):
+    """
+    Build the Plotly network figure of a grid and the compact states of its observations.
+
+    Attributes
+    ----------
+    line_names : list
+        names of the powerlines, in the order of the line traces of the figure.
+    sub_names : list
+        names of the substations.
+    sub_coords : numpy.ndarray
+        (n_sub, 2) array of the substation coordinates.
+    load_names : list
+        names of the loads.
+    gen_names : list
+        names of the generators.
+
+    """
+
+    def __init__(self, observation_space, substation_layout=None):
+        self.line_names = [str(name) for name in observation_space.name_line]
+        self.sub_names = [str(name) for name in observation_space.name_sub]
+        self.n_line = len(self.line_names)
+        self.n_sub = len(self.sub_names)
+        self.line_or_to_subid = np.asarray(observation_space.line_or_to_subid, dtype=int)
+        self.line_ex_to_subid = np.asarray(observation_space.line_ex_to_subid, dtype=int)
+        # grid2op orders the topology vector substation by substation
+        self.topo_to_subid = np.repeat(np.arange(self.n_sub), np.asarray(observation_space.sub_info, dtype=int))
+        self.load_names = [str(name) for name in observation_space.name_load]
+        self.gen_names = [str(name) for name in observation_space.name_gen]
+        self.load_to_subid = np.asarray(observation_space.load_to_subid, dtype=int)
+        self.gen_to_subid = np.asarray(observation_space.gen_to_subid, dtype=int)
+        self.load_pos_topo_vect = np.asarray(observation_space.load_pos_topo_vect, dtype=int)
+        self.gen_pos_topo_vect = np.asarray(observation_space.gen_pos_topo_vect, dtype=int)
+
+        if substation_layout is not None and len(substation_layout) >= self.n_sub:
+            self.sub_coords = np.asarray(substation_layout[:self.n_sub], dtype=float)
+        else:
+            angles = 2 * np.pi * np.arange(self.n_sub) / max(self.n_sub, 1)
+            self.sub_coords = 300 * np.column_stack([np.cos(angles), np.sin(angles)])
+
+        self._skeleton = self._make_skeleton()
+
+    def _injection_coords(self):
+        """Coordinates of the loads then the generators, spread on a circle around their substation."""
+        subids = np.concatenate([self.load_to_subid, self.gen_to_subid])
+        coords = np.empty((len(subids), 2))
+        for subid in np.unique(subids):
+            elements = np.flatnonzero(subids == subid)
+            angles = np.pi / 4 + 2 * np.pi * np.arange(len(elements)) / len(elements)
+            coords[elements] = self.sub_coords[subid] + INJECTION_RADIUS * np.column_stack(
+                [np.cos(angles), np.sin(angles)])
+        return coords[:len(self.load_names)], coords[len(self.load_names):]
+
+    def _make_skeleton(self):
+        or_coords = self.sub_coords[self.line_or_to_subid]
+        ex_coords = self.sub_coords[self.line_ex_to_subid]
+        middles = (or_coords + ex_coords) / 2
+
+        lines = [
+            dict(type="scatter", mode="lines", name=name, hoverinfo="text", text=name, showlegend=False,
+                 x=[float(or_coords[i, 0]), float(ex_coords[i, 0])],
+                 y=[float(or_coords[i, 1]), float(ex_coords[i, 1])],
+                 line=dict(color=LINE_PALETTE[1], width=3))
+            for i, name in enumerate(self.line_names)
+        ]
+        labels = dict(type="scatter", mode="text", hoverinfo="none", showlegend=False,
+                      x=middles[:, 0].tolist(), y=middles[:, 1].tolist(),
+                      text=[""] * self.n_line, textfont=dict(size=10))
+        substations = dict(type="scatter", mode="markers+text", hoverinfo="text", showlegend=False,
+                           x=self.sub_coords[:, 0].tolist(), y=self.sub_coords[:, 1].tolist(),
+                           text=self.sub_names, textposition="top center",
+                           marker=dict(size=20, color=[SUB_COLOR] * self.n_sub,
+                                       line=dict(width=1, color="black")))
+        load_coords, gen_coords = self._injection_coords()
+        loads = dict(type="scatter", mode="markers", name="loads", hoverinfo="text", showlegend=False,
+                     x=load_coords[:, 0].tolist(), y=load_coords[:, 1].tolist(), text=self.load_names,
+                     marker=dict(size=9, symbol="square", color=[LOAD_COLOR] * len(self.load_names)))
+        generators = dict(type="scatter", mode="markers", name="generators", hoverinfo="text", showlegend=False,
+                          x=gen_coords[:, 0].tolist(), y=gen_coords[:, 1].tolist(), text=self.gen_names,
+                          marker=dict(size=11, symbol="triangle-up", color=[GEN_COLOR] * len(self.gen_names)))
+        layout = dict(
+            margin=dict(l=0, r=0, t=0, b=0),
+            xaxis=dict(visible=False), yaxis=dict(visible=False, scaleanchor="x"),
+            plot_bgcolor="rgba(0,0,0,0)", hovermode="closest",
+            # read by the clientside function to apply the states
+            meta=dict(n_line=self.n_line, palette=LINE_PALETTE,
+                      sub_color=SUB_COLOR, sub_split_color=SUB_SPLIT_COLOR,
+                      load_color=LOAD_COLOR, gen_color=GEN_COLOR)
+        )
+        return dict(data=[*lines, labels, substations, loads, generators], layout=layout)
+
+    def get_skeleton(self):
+        """
+            Get a copy of the static part of the network figure.
+
+            :return: figure dict without any state applied
+        """
+        return copy.deepcopy(self._skeleton)
+
+    def get_states(self, observations):
+        """
+            Extract the per step attributes of several observations at once.
+
+            The states are stored column-wise: each entry is a (steps x elements) list
+            of lists, the k-th row being the state of the k-th observation.
+
+            :param observations: list of grid2op observations
+            :return: dict of lists of lists (colors, rho, p, status per line, buses per substation,
+                power and bus of the loads and generators)
+        """
+        rho = np.nan_to_num(np.vstack([observation.rho for observation in observations]).astype(float))
+        status = np.vstack([observation.line_status for observation in observations]).astype(bool)
+        p_or = np.nan_to_num(np.vstack([observation.p_or for observation in observations]).astype(float))
+        topo_vect = np.vstack([observation.topo_vect for observation in observations]).astype(int)
+        load_p = np.nan_to_num(np.vstack([observation.load_p for observation in observations]).astype(float))
+        prod_p = np.nan_to_num(np.vstack([observation.prod_p for observation in observations]).astype(float))
+
+        colors = np.where(status, 1 + np.digitize(rho, RHO_THRESHOLDS), 0)
+        buses = np.zeros((len(observations), self.n_sub), dtype=int)
+        np.maximum.at(buses.T, self.topo_to_subid, topo_vect.T)
+        return dict(
+            colors=colors.tolist(),
+            rho=np.round(rho, 3).tolist(),
+            p=np.round(p_or, 1).tolist(),
+            status=status.astype(int).tolist(),
+            buses=buses.tolist(),
+            load_p=np.round(load_p, 1).tolist(),
+            load_bus=topo_vect[:, self.load_pos_topo_vect].tolist(),
+            gen_p=np.round(prod_p, 1).tolist(),
+            gen_bus=topo_vect[:, self.gen_pos_topo_vect].tolist()
+        )
+
+    def get_state(self, observation):
+        """
+            Extract the per step attributes of an observation.
+
+            :param observation: grid2op observation
+            :return: dict of lists (colors, rho, p, status per line, buses per substation,
+                power and bus of the loads and generators)
+        """
+        states = self.get_states([observation])
+        return {key: values[0] for key, values in states.items()}
+
+    def apply_state(self, figure, state):
+        """
+            Apply a state to a network figure, the same way as the clientside function does.
+
+            :param figure: figure dict built from the skeleton
+            :param state: state given by get_state
+            :return: the updated figure
+        """
+        data = figure["data"]
+        for i in range(self.n_line):
+            data[i]["line"] = dict(
+                color=LINE_PALETTE[state["colors"][i]], width=3,
+                dash="solid" if state["status"][i] else "dash"
+            )
+            data[i]["text"] = "{}<br>usage rate: {}<br>flow: {} MW".format(
+                self.line_names[i], state["rho"][i], state["p"][i])
+        data[self.n_line]["text"] = ["{} MW".format(p) if status else ""
+                                     for p, status in zip(state["p"], state["status"])]
+        data[self.n_line + 1]["marker"]["color"] = [SUB_SPLIT_COLOR if buses > 1 else SUB_COLOR
+                                                    for buses in state["buses"]]
+        for offset, names, kind, color in ((2, self.load_names, "load", LOAD_COLOR),
+                                           (3, self.gen_names, "gen", GEN_COLOR)):
+            injections = data[self.n_line + offset]
+            powers, buses = state[kind + "_p"], state[kind + "_bus"]
+            injections["text"] = ["{}<br>power: {} MW<br>bus: {}".format(name, p, bus if bus > 0 else "disconnected")
+                                  for name, p, bus in zip(names, powers, buses)]
+            injections["marker"]["color"] = [injection_color(color, bus) for bus in buses]
+        return figure
+
+    def get_plot_observation(self, observation):
+        """
+            Build the full network figure of an observation.
+
+            :param observation: grid2op observation
+            :return: figure dict
+        """
+        return self.apply_state(self.get_skeleton(), self.get_state(observation))
@@ -0,0 +1,106 @@
+"""
+    Opt-in profiling of the callbacks and of the episode loading.
+
+    Profiling is enabled by the GRID2VIZ_PROFILE_DIR environment variable, the folder
+    where the profiles are written. Each profiled call runs under cProfile and its
+    profile is kept only if the call lasted more than GRID2VIZ_PROFILE_THRESHOLD seconds
+    (default 1). The profiles are written in one sub folder per function, as
+    <date>_<duration>ms.prof files to read with pstats, snakeviz...
+    With GRID2VIZ_PROFILE_FLAMEGRAPH=1, a flamegraph SVG is written next to each profile
+    (needs the flameprof package).
+
+    cProfile profiles one call at a time: the calls made while another one is profiled
+    (from another thread or nested) are only timed.
+"""
+import cProfile
+import functools
+import os
+import pstats
+import threading
+import time
+import warnings
+
+PROFILE_DIR = os.environ.get("GRID2VIZ_PROFILE_DIR")
+THRESHOLD = float(os.environ.get("GRID2VIZ_PROFILE_THRESHOLD", 1.))
+FLAMEGRAPH = os.environ.get("GRID2VIZ_PROFILE_FLAMEGRAPH", "0").lower() in ("1", "true", "yes")
+
+profiler_lock = threading.Lock()
+
+
+def is_enabled():
+    return PROFILE_DIR is not None
+
+
+def write_profile(name, profiler, duration):
+    """
+        Write the profile of a call, and its flamegraph if enabled.
+
+        :param name: name of the profiled function, used as sub folder
+        :param profiler: cProfile.Profile of the call
+        :param duration: duration of the call in seconds
+        :return: path of the profile file
+    """
+    directory = os.path.join(PROFILE_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "{}_{:.0f}ms.prof".format(
+        time.strftime("%Y%m%d-%H%M%S"), 1000 * duration))
+    profiler.dump_stats(path)
+
+    if FLAMEGRAPH:
+        try:
+            import flameprof
+        except ImportError:
+            warnings.warn("GRID2VIZ_PROFILE_FLAMEGRAPH needs the flameprof package, "
+                          "only the profiles are written")
+        else:
+            with open(path[:-len(".prof")] + ".svg", "w") as f:
+                flameprof.render(pstats.Stats(path).stats, f)
+    return path
+
+
+def profiled(name):
+    """
+        Decorator profiling the calls of a function when profiling is enabled.
+
+        :param name: name of the profiled function, used as sub folder of the profiles
+        :return: decorator, returning the function unchanged if profiling is disabled
+    """
+    def wrap(func):
+        if not is_enabled():
+            return func
+
+        @functools.wraps(func)
+        def profiled_func(*args, **kwargs):
+            if not profiler_lock.acquire(blocking=False):
+                return func(*args, **kwargs)
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                profiler_lock.release()
+                if duration > THRESHOLD:
+                    write_profile(name, profiler, duration)
+
+        return profiled_func
+
+    return wrap
+
+
+def profile_callbacks(app):
+    """
+        Profile all the callbacks registered in a Dash app, including the JSON encoding of their outputs.
+
+        Call it once all the callbacks are registered. Clientside callbacks are not profiled.
+
+        :param app: Dash app
+    """
+    if not is_enabled():
+        return
+    for output, entry in app.callback_map.items():
+        callback = entry.get("callback")
+        if callback is None:
+            continue
+        name = "{}.{}".format(callback.__module__, callback.__name__)
+        entry["callback"] = profiled(name)(callback)
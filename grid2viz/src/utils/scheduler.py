@@ -0,0 +1,221 @@
+"""
+    Priority scheduling of the callbacks: interactive work keeps reserved capacity.
+
+    The callbacks are classified as interactive (slider moves, zoom synchronisation, labels,
+    progress polling...) or bulk (figures and tables rebuilt from whole episodes, page layouts,
+    episode selection waiting for a load). The interactive callbacks are tagged with the
+    interactive decorator, the others are bulk, as are the requests of the KPI API. The
+    callbacks that also synchronise a zoom are tagged with interactive_on: they run in the
+    interactive class when only the zoom triggered them. Each class runs with its own number
+    of concurrent executions, the interactive_workers and bulk_workers options of the
+    config.ini, so that heavy requests queue among themselves and never hold the capacity
+    kept for interactive ones. A callback waiting for episode loading jobs gives back its
+    slot while it waits (waiting), the jobs run on their own pool.
+    The server threads only wait in the queues, so the WSGI server should have more threads
+    than interactive_workers + bulk_workers.
+
+    The depth of the queues and the waiting times are served as JSON on /api/scheduler.
+"""
+import contextlib
+import functools
+import threading
+import time
+
+import dash
+import flask
+
+from .. import manager
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+blueprint = flask.Blueprint("scheduler", __name__, url_prefix="/api")
+
+# priority class whose slot the current thread holds
+held = threading.local()
+
+
+class PriorityClass(object):
+    """
+    Bounded number of concurrent executions of a class of callbacks, with queue metrics.
+
+    Attributes
+    ----------
+    capacity : int
+        maximum number of concurrent executions.
+    queued : int
+        number of executions waiting for capacity.
+    running : int
+        number of executions running.
+
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.semaphore = threading.BoundedSemaphore(capacity)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.total_wait = 0.
+        self.max_wait = 0.
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self.lock:
+            self.queued += 1
+        self.semaphore.acquire()
+        wait = time.perf_counter() - start
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def release(self):
+        with self.lock:
+            self.running -= 1
+        self.semaphore.release()
+
+    def run(self, func, *args, **kwargs):
+        self.acquire()
+        previous = getattr(held, "priority_class", None)
+        held.priority_class = self
+        try:
+            return func(*args, **kwargs)
+        finally:
+            held.priority_class = previous
+            self.release()
+            with self.lock:
+                self.completed += 1
+
+    def metrics(self):
+        with self.lock:
+            return dict(capacity=self.capacity, queued=self.queued, running=self.running,
+                        completed=self.completed, max_wait=self.max_wait,
+                        mean_wait=self.total_wait / self.completed if self.completed else 0.)
+
+
+classes = {
+    INTERACTIVE: PriorityClass(manager.interactive_workers),
+    BULK: PriorityClass(manager.bulk_workers),
+}
+
+
+def interactive(func):
+    """
+        Tag a callback answering a user gesture from data already at hand, so that it runs
+        in the interactive class. Put it under the app.callback decorator, which keeps the tag.
+
+        :param func: callback function
+        :return: the same function
+    """
+    func.priority = INTERACTIVE
+    return func
+
+
+def interactive_on(*prop_ids):
+    """
+        Tag a callback that synchronises a zoom besides rebuilding its figure, so that it runs
+        in the interactive class when only the given inputs triggered it, in the bulk class
+        otherwise. Put it under the app.callback decorator, which keeps the tag.
+
+        :param prop_ids: ids of the triggering inputs, as "component_id.property"
+        :return: decorator
+    """
+    def wrap(func):
+        func.priority = frozenset(prop_ids)
+        return func
+
+    return wrap
+
+
+def classify(callback):
+    """Name of the priority class of a call of the callback, in the Dash request context."""
+    priority = getattr(callback, "priority", BULK)
+    if isinstance(priority, str):
+        return priority
+    triggered = {trigger["prop_id"] for trigger in dash.callback_context.triggered}
+    return INTERACTIVE if triggered and triggered <= priority else BULK
+
+
+@contextlib.contextmanager
+def waiting():
+    """
+        Give back the slot held by the current thread while it waits for work running
+        elsewhere (the episode loading jobs), and take it back afterwards.
+    """
+    priority_class = getattr(held, "priority_class", None)
+    if priority_class is None:
+        yield
+        return
+    held.priority_class = None
+    priority_class.release()
+    try:
+        yield
+    finally:
+        priority_class.acquire()
+        held.priority_class = priority_class
+
+
+def schedule_callbacks(app):
+    """
+        Run all the callbacks registered in a Dash app under their priority class.
+
+        Call it once all the callbacks are registered. Clientside callbacks run in the browser.
+
+        :param app: Dash app
+    """
+    for output, entry in app.callback_map.items():
+        callback = entry.get("callback")
+        if callback is None:
+            continue
+        entry["callback"] = scheduled(None, callback)
+
+
+def scheduled(priority_class, callback):
+    """
+        Run a function under a priority class, or under the class of each call of the
+        callback (classify) if priority_class is None.
+    """
+    @functools.wraps(callback)
+    def run(*args, **kwargs):
+        return (priority_class or classes[classify(callback)]).run(callback, *args, **kwargs)
+
+    return run
+
+
+def schedule_blueprint(blueprint, priority=BULK):
+    """
+        Run the views of a Flask blueprint under a priority class.
+
+        Call it once all the routes of the blueprint are registered, before registering it in the app.
+
+        :param blueprint: flask.Blueprint
+        :param priority: name of the priority class (default BULK)
+    """
+    priority_class = classes[priority]
+
+    def record(state):
+        for endpoint, view in list(state.app.view_functions.items()):
+            if endpoint.startswith(blueprint.name + "."):
+                state.app.view_functions[endpoint] = scheduled(priority_class, view)
+
+    blueprint.record(record)
+
+
+def job_metrics():
+    from . import jobs
+
+    with jobs.lock:
+        pending = [job for job in jobs.jobs.values() if not job.future.done()]
+    waiting = sum(job.stage == "waiting for a worker" for job in pending)
+    return dict(capacity=jobs.MAX_WORKERS, queued=waiting, running=len(pending) - waiting)
+
+
+@blueprint.route("/scheduler")
+def get_metrics():
+    """Depth of the queues of the callbacks and of the episode loading jobs."""
+    metrics = {name: priority_class.metrics() for name, priority_class in classes.items()}
+    metrics["episode_jobs"] = job_metrics()
+    return flask.jsonify(metrics)
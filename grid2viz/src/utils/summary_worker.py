@@ -0,0 +1,70 @@
+"""
+    Summaries of the episodes, computed in the processes of the pool of agent_summaries.py.
+
+    The processes are spawned: they import this module and not the application, so they
+    neither read the config.ini nor scan base_dir. The folders they read are given to the
+    pool initializer by the server.
+"""
+import os
+
+from . import agent_sources
+from .episode_kpis import get_nb_action_agent, get_nb_overflow_agent
+from .episode_loading import compute_episode, fs_cache_file, read_fs_cache
+
+# folders of the server, set by init_worker
+settings = dict(cache_dir=None, base_dir=None, archives_dir=None)
+
+
+def init_worker(cache_dir, base_dir, archives_dir):
+    """
+        Initialize a process of the pool.
+
+        :param cache_dir: folder of the file system cache
+        :param base_dir: folder of the agent logs
+        :param archives_dir: folder of the indexes and scratch folders of the archived agents
+    """
+    settings.update(cache_dir=cache_dir, base_dir=base_dir, archives_dir=archives_dir)
+
+
+def read_episode(agent, scenario):
+    """
+        Read an episode from the file system cache, or compute it from the raw logs,
+        without caching it.
+
+        :param agent: Agent Name
+        :param scenario: Name of the episode
+        :return: EpisodeAnalytics
+    """
+    path = fs_cache_file(settings["cache_dir"], scenario, agent)
+    if os.path.isfile(path):
+        return read_fs_cache(path)
+    source = agent_sources.open_source(settings["base_dir"], agent, settings["archives_dir"])
+    if source is None:
+        raise FileNotFoundError("No logs of agent {} in {}".format(agent, settings["base_dir"]))
+    return compute_episode(source, scenario, agent, os.path.join(settings["archives_dir"], agent))
+
+
+def summarize_episode(task):
+    """
+        Summarize an episode, the episode being dropped once summarized.
+
+        :param task: (agent, scenario, signature of the episode)
+        :return: summary dict, with the error message if the episode could not be read
+    """
+    agent, scenario, signature = task
+    summary = dict(agent=agent, scenario=scenario, signature=signature)
+    try:
+        episode = read_episode(agent, scenario)
+        played = int(episode.meta["nb_timestep_played"])
+        max_steps = int(episode.meta["chronics_max_timestep"])
+        summary.update(
+            nb_timestep_played=played,
+            chronics_max_timestep=max_steps,
+            survival=played / max_steps if max_steps else None,
+            cumulative_reward=float(episode.meta["cumulative_reward"]),
+            nb_overflow=int(get_nb_overflow_agent(episode)),
+            nb_action=int(get_nb_action_agent(episode)),
+        )
+    except Exception as ex:
+        summary["error"] = repr(ex)
+    return summary
@@ -0,0 +1,96 @@
+"""
+    Discovery of the agent logs added, modified or removed in base_dir while the server runs.
+
+    With the watchdog package (inotify on Linux), the file system events tell which agents
+    changed and only their folders are scanned again. Without it, base_dir is polled every
+    watch_interval seconds (option of the config.ini, 0 disables the watcher). In both cases
+    manager.update_index refreshes only the scenarios whose episodes changed.
+"""
+import os
+import threading
+import time
+
+from .. import manager
+from .agent_sources import agent_name
+
+# Seconds during which the events of an agent are gathered before scanning it,
+# as copying a log produces many events
+DEBOUNCE_DELAY = 1.
+
+started = False
+start_lock = threading.Lock()
+
+
+def start():
+    """Start watching base_dir in a background thread, once per process."""
+    global started
+    with start_lock:
+        if started or manager.watch_interval <= 0:
+            return
+        started = True
+
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        Observer = None
+
+    if Observer is None:
+        thread = threading.Thread(target=poll, name="grid2viz_watcher", daemon=True)
+    else:
+        changed_agents = set()
+        changed_lock = threading.Lock()
+
+        class AgentEventHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                agent = agent_of(event.src_path)
+                if agent is not None:
+                    with changed_lock:
+                        changed_agents.add(agent)
+
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(AgentEventHandler(), manager.base_dir, recursive=True)
+        observer.start()
+
+        def process_events():
+            while True:
+                time.sleep(DEBOUNCE_DELAY)
+                with changed_lock:
+                    agent_names = list(changed_agents)
+                    changed_agents.clear()
+                if agent_names:
+                    update(agent_names)
+
+        thread = threading.Thread(target=process_events, name="grid2viz_watcher", daemon=True)
+    thread.start()
+
+
+def agent_of(path):
+    """
+        Get the agent of a path of base_dir.
+
+        :param path: path of a file or folder, in an agent folder or of an agent archive
+        :return: agent name, or None for base_dir itself and the folders ignored like _cache
+    """
+    relative_path = os.path.relpath(path, manager.base_dir)
+    file_name = relative_path.split(os.sep)[0]
+    if file_name in (".", "..") or file_name.startswith("_"):
+        return None
+    return agent_name(file_name)
+
+
+def poll():
+    while True:
+        time.sleep(manager.watch_interval)
+        update()
+
+
+def update(agent_names=None):
+    try:
+        refreshed = manager.update_index(agent_names)
+    except Exception as ex:
+        print("WARNING Could not update the agents index: {}".format(ex))
+        return
+    if refreshed:
+        print("INFO Refreshed scenarios {}".format(", ".join(sorted(refreshed))))
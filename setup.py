@@ -4,7 +4,10 @@ extras = {
    'with_pygame': ['pygame'],
     "docs": ["numpydoc", "sphinx", "sphinx_rtd_theme", "sphinxcontrib_trio"],
     "plots": ["plotly", "searborn", "pygame"],
-    "test": ["nbformat", "jupyter_client", "jyquickhelper"]
+    "test": ["nbformat", "jupyter_client", "jyquickhelper"],
+    "production": ["gunicorn", "waitress"],
+    "benchmark": ["pytest", "pytest-benchmark"],
+    "archives": ["zstandard"]
 }
 
 all_targets = []
@@ -35,13 +38,13 @@ setup(name='Grid2Viz',
       include_package_data=True,
       install_requires=["Click>=7.0",
                         "cycler>=0.10.0",
-                        "dash>=1.9.0",
+                        "dash>=1.11.0",
                         "dash-antd-components>=0.0.1rc2",
                         "dash-bootstrap-components>=0.8.3",
-                        "dash-core-components>=1.8.0",
-                        "dash-html-components>=1.0.2",
-                        "dash-renderer>=1.2.4",
-                        "dash-table>=4.6.0",
+                        "dash-core-components>=1.9.0",
+                        "dash-html-components>=1.0.3",
+                        "dash-renderer>=1.4.0",
+                        "dash-table>=4.6.2",
                         "decorator>=4.4.1",
                         "Flask>=1.1.1",
                         "Flask-Compress>=1.4.0",
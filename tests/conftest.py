@@ -0,0 +1,38 @@
+"""
+    Fixtures shared by the tests.
+"""
+import datetime as dt
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+START = dt.datetime(2019, 1, 6, 0, 0)
+
+
+@pytest.fixture
+def make_episode():
+    """
+        Factory of fake episodes, holding the attributes of EpisodeAnalytics read by the utils.
+
+        The steps are 5 minutes apart from START. The flows of the lines (flow_and_voltage_line)
+        are given as a wide frame of the active power at the origin, the extremity being its
+        opposite, and the usage rate (rho) as (timestamp, equipment, value) rows. Any other
+        attribute is given by keyword.
+    """
+    def make(n_steps=2, line_names=("l0", "l1", "l2"), rho_rows=(), flows=None, observations=None, **attributes):
+        timestamps = [START + dt.timedelta(minutes=5 * step) for step in range(n_steps)]
+        if flows is None:
+            flows = pd.DataFrame({name: np.zeros(n_steps) for name in line_names}, index=timestamps)
+        episode = SimpleNamespace(
+            timestamps=timestamps,
+            line_names=list(line_names),
+            rho=pd.DataFrame(list(rho_rows), columns=["timestamp", "equipment", "value"]),
+            flow_and_voltage_line={"or": {"active": flows}, "ex": {"active": -flows}},
+            observations=observations if observations is not None else [],
+        )
+        vars(episode).update(attributes)
+        return episode
+
+    return make
@@ -0,0 +1,100 @@
+"""
+    Tests of the agent logs stored as archives (grid2viz/src/utils/agent_sources.py).
+"""
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from grid2viz.src.utils.agent_sources import (TarSource, ZipSource, archive_agent_name, find_agents,
+                                              safe_relative_path)
+
+META = {"cumulative_reward": 12.5, "nb_timestep_played": 3, "chronics_max_timestep": 4}
+
+# members of the archive of an agent, under a top folder, with one escaping the scratch folder
+MEMBERS = {
+    "agent/dict_action_space.json": b"{}",
+    "agent/000/episode_meta.json": json.dumps(META).encode(),
+    "agent/000/rewards.npz": b"rewards",
+    "agent/000/../../escaped.txt": b"escaped",
+    "agent/001/episode_meta.json": json.dumps(META).encode(),
+    "agent/001/rewards.npz": b"other rewards",
+}
+
+
+def write_zip(path):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in MEMBERS.items():
+            archive.writestr(name, content)
+
+
+def write_tar(path):
+    with tarfile.open(path, "w:gz") as archive:
+        for name, content in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+
+@pytest.fixture(params=[("agent.zip", ZipSource, write_zip), ("agent.tar.gz", TarSource, write_tar)],
+                ids=["zip", "tar"])
+def source(request, tmp_path):
+    file_name, source_class, write = request.param
+    base_dir = tmp_path / "agents"
+    base_dir.mkdir()
+    write(str(base_dir / file_name))
+    return source_class(str(base_dir / file_name), str(tmp_path / "_cache" / "_archives"))
+
+
+def test_scan(source):
+    assert sorted(source.scan()) == ["000", "001"]
+
+
+def test_read_meta(source):
+    assert source.read_meta("000") == META
+
+
+def test_episode_dir_extracts_the_scenario_and_the_agent_files(source, tmp_path):
+    scratch_dir = str(tmp_path / "_cache" / "_archives")
+    with source.episode_dir("000", scratch_dir) as path:
+        files = sorted(os.path.relpath(os.path.join(root, name), path)
+                       for root, _, names in os.walk(path) for name in names)
+        with open(os.path.join(path, "000", "rewards.npz"), "rb") as f:
+            assert f.read() == b"rewards"
+    assert files == ["000/episode_meta.json", "000/rewards.npz", "dict_action_space.json"]
+    # the scratch folder is removed, and nothing was written out of it
+    assert not os.path.exists(path)
+    assert not any(name == "escaped.txt" for _, _, names in os.walk(str(tmp_path)) for name in names)
+
+
+def test_tar_index_is_kept(source, tmp_path):
+    source.scan()
+    assert os.path.isfile(source.index_path) == isinstance(source, TarSource)
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("000/rewards.npz", os.path.join("000", "rewards.npz")),
+    ("./000//rewards.npz", os.path.join("000", "rewards.npz")),
+    ("../escaped.txt", None),
+    ("000/../../escaped.txt", None),
+    ("", None),
+])
+def test_safe_relative_path(name, expected):
+    assert safe_relative_path(name) == expected
+
+
+def test_find_agents(tmp_path):
+    (tmp_path / "folder_agent").mkdir()
+    (tmp_path / "_cache").mkdir()
+    write_zip(str(tmp_path / "zip_agent.zip"))
+    write_zip(str(tmp_path / "folder_agent.zip"))
+    (tmp_path / "notes.txt").write_text("not an agent")
+    assert find_agents(str(tmp_path)) == {
+        "folder_agent": str(tmp_path / "folder_agent"),
+        "zip_agent": str(tmp_path / "zip_agent.zip"),
+    }
+    assert archive_agent_name("agent.tar.zst") == "agent"
+    assert archive_agent_name(".zip") is None
@@ -0,0 +1,67 @@
+"""
+    Tests of the divergence between two episodes (grid2viz/src/utils/episode_divergence.py).
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from grid2viz.src.utils.episode_divergence import compute_divergence
+from grid2viz.src.utils.episode_index import index_episode
+
+
+@pytest.fixture
+def make_indexed(make_episode):
+    """Factory of episodes indexed like in the cache, from their topologies, line status and usage rates per step."""
+    def make(topo_vect, line_status, rho):
+        observations = [SimpleNamespace(topo_vect=np.array(topology), line_status=np.array(status))
+                        for topology, status in zip(topo_vect, line_status)]
+        episode = make_episode(n_steps=len(rho), line_names=["l{}".format(line) for line in range(len(rho[0]))],
+                               observations=observations)
+        episode.rho = pd.DataFrame([(timestamp, line, value) for timestamp, values in zip(episode.timestamps, rho)
+                                    for line, value in enumerate(values)],
+                                   columns=["timestamp", "equipment", "value"])
+        return index_episode(episode)
+
+    return make
+
+
+def test_same_episodes_never_diverge(make_indexed):
+    episode = make_indexed([[1, 1, 1]] * 3, [[True, True]] * 3, [[0.5, 0.6]] * 3)
+    divergence = compute_divergence(episode, episode)
+    assert divergence.first_step is None
+    assert divergence.first_label() is None
+    assert divergence.topology.tolist() == [0, 0, 0]
+    assert divergence.line_status.tolist() == [0, 0, 0]
+    assert divergence.rho_delta.tolist() == [0, 0, 0]
+
+
+def test_topology_and_line_status_counts(make_indexed):
+    ref = make_indexed([[1, 1, 1]] * 4, [[True, True]] * 4, [[0.5, 0.5]] * 4)
+    study = make_indexed([[1, 1, 1], [1, 1, 1], [2, 2, 1], [2, 1, 1]],
+                         [[True, True], [True, True], [True, True], [False, False]],
+                         [[0.5, 0.5], [0.75, 0.5], [0.5, 0.5], [0.5, 0.25]])
+    divergence = compute_divergence(study, ref)
+    assert divergence.topology.tolist() == [0, 0, 2, 1]
+    assert divergence.line_status.tolist() == [0, 0, 0, 2]
+    assert divergence.rho_delta.tolist() == [0, 0.25, 0, 0.25]
+    # a difference of usage rate alone is not a divergence of the grids
+    assert divergence.first_step == 2
+    assert divergence.first_label() == "2019-01-06 00:10"
+
+
+def test_first_step_on_line_status(make_indexed):
+    ref = make_indexed([[1, 1]] * 3, [[True]] * 3, [[0.5]] * 3)
+    study = make_indexed([[1, 1]] * 3, [[True], [False], [False]], [[0.5]] * 3)
+    assert compute_divergence(study, ref).first_step == 1
+
+
+def test_common_steps_of_unequal_lengths(make_indexed):
+    ref = make_indexed([[1, 1]] * 5, [[True]] * 5, [[0.5]] * 5)
+    # the study agent died after 3 steps
+    study = make_indexed([[1, 1], [1, 1], [2, 1]], [[True]] * 3, [[0.5]] * 3)
+    for divergence in (compute_divergence(study, ref), compute_divergence(ref, study)):
+        assert len(divergence) == 3
+        assert divergence.topology.tolist() == [0, 0, 1]
+        assert divergence.first_step == 2
@@ -0,0 +1,121 @@
+"""
+    Tests of the indexes attached to the episodes (grid2viz/src/utils/episode_index.py).
+"""
+import datetime as dt
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from grid2viz.src.utils.episode_index import LineStates, TimestampIndex, index_episode
+
+TIMESTAMPS = [dt.datetime(2019, 1, 6, 0, 0) + dt.timedelta(minutes=5 * step) for step in range(4)]
+
+
+@pytest.fixture
+def index():
+    return TimestampIndex(TIMESTAMPS)
+
+
+def test_index_of_each_step(index):
+    assert len(index) == len(TIMESTAMPS)
+    assert [index.index(timestamp) for timestamp in TIMESTAMPS] == list(range(len(TIMESTAMPS)))
+
+
+@pytest.mark.parametrize("timestamp", ["2019-01-06 00:05", "2019-01-06T00:05:00", dt.datetime(2019, 1, 6, 0, 5)])
+def test_index_formats(index, timestamp):
+    assert index.index(timestamp) == 1
+
+
+@pytest.mark.parametrize("timestamp", ["2019-01-06 00:03", "2019-01-05 23:55", "2019-01-06 00:20"])
+def test_index_missing_timestamp(index, timestamp):
+    with pytest.raises(ValueError):
+        index.index(timestamp)
+
+
+@pytest.mark.parametrize("timestamp, side, step", [
+    ("2019-01-05 23:00", "left", 0),  # before the start
+    ("2019-01-05 23:00", "right", 0),
+    ("2019-01-06 00:00", "left", 0),
+    ("2019-01-06 00:00", "right", 1),
+    ("2019-01-06 00:07", "left", 2),  # between two steps
+    ("2019-01-06 00:07", "right", 2),
+    ("2019-01-06 00:15", "left", 3),  # last step
+    ("2019-01-06 00:15", "right", 4),
+    ("2019-01-07 00:00", "left", 4),  # after the end
+    ("2019-01-06 00:05:00.900", "left", 1),  # fractions of seconds are ignored
+])
+def test_searchsorted(index, timestamp, side, step):
+    assert index.searchsorted(timestamp, side=side) == step
+
+
+def test_label(index):
+    assert index.label(0) == "2019-01-06T00:00:00"
+    assert index.label(-1) == "2019-01-06T00:15:00"
+
+
+def test_empty_index():
+    index = TimestampIndex([])
+    assert len(index) == 0
+    assert index.searchsorted("2019-01-06 00:00") == 0
+    with pytest.raises(ValueError):
+        index.index("2019-01-06 00:00")
+
+
+# the frames list their lines in another order than line_names, and miss l1
+FLOWS = pd.DataFrame({"l2": [20., 21.], "l0": [0., 1.]}, index=TIMESTAMPS[:2])
+
+
+def test_line_states_columns_follow_line_names(make_episode):
+    line_states = LineStates(make_episode(rho_rows=[(TIMESTAMPS[0], 0, 0.5)], flows=FLOWS))
+    matrix = line_states.matrices[("or", "active")]
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (2, 3)
+    np.testing.assert_array_equal(line_states.get("or", "active", "l0"), [0., 1.])
+    np.testing.assert_array_equal(line_states.get("ex", "active", "l2"), [-20., -21.])
+    # line missing from the frames
+    assert np.isnan(line_states.get("or", "active", "l1")).all()
+
+
+def test_line_states_rho_pivot(make_episode):
+    line_states = LineStates(make_episode(rho_rows=[
+        (TIMESTAMPS[0], 0, 0.5), (TIMESTAMPS[0], 2, 0.7),
+        (TIMESTAMPS[1], 2, 0.9),
+    ], flows=FLOWS))
+    assert line_states.rho.dtype == np.float32
+    assert line_states.rho.shape == (2, 3)
+    np.testing.assert_allclose(line_states.get_rho("l2"), [0.7, 0.9])
+    # usage rates missing for a line at a step, or for a line at all
+    rho_l0 = line_states.get_rho("l0")
+    assert rho_l0[0] == pytest.approx(0.5)
+    assert np.isnan(rho_l0[1])
+    assert np.isnan(line_states.get_rho("l1")).all()
+
+
+def test_line_states_rho_keeps_the_order_of_the_steps(make_episode):
+    # rows not sorted by step: the first timestamp seen is the first step
+    line_states = LineStates(make_episode(
+        rho_rows=[(TIMESTAMPS[0], 1, 0.1), (TIMESTAMPS[1], 1, 0.2), (TIMESTAMPS[0], 0, 0.3)], flows=FLOWS))
+    np.testing.assert_allclose(line_states.get_rho("l1"), [0.1, 0.2])
+    np.testing.assert_allclose(line_states.get_rho("l0")[:1], [0.3])
+
+
+def test_line_states_without_rho(make_episode):
+    line_states = LineStates(make_episode(flows=FLOWS))
+    assert line_states.rho.shape == (0, 3)
+
+
+def test_index_episode_stacks_the_observations(make_episode):
+    observations = [SimpleNamespace(topo_vect=np.array([1, 2, 1]), line_status=np.array([True, False]))
+                    for _ in range(2)]
+    episode = make_episode(rho_rows=[(TIMESTAMPS[0], 0, 0.5)], observations=observations)
+    matrices = index_episode(episode).observation_matrices
+    assert matrices["topo_vect"].dtype == np.int8
+    np.testing.assert_array_equal(matrices["topo_vect"], [[1, 2, 1], [1, 2, 1]])
+    assert matrices["line_status"].dtype == bool
+    assert matrices["line_status"].shape == (2, 2)
+
+
+def test_index_episode_without_observations(make_episode):
+    assert index_episode(make_episode(n_steps=0)).observation_matrices["topo_vect"].shape == (0, 0)
@@ -0,0 +1,66 @@
+"""
+    Tests of the compaction of the data frames of the episodes (grid2viz/src/utils/episode_memory.py).
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from grid2viz.src.utils.episode_memory import COMPACTION_VERSION, compact_episode, memory_usage
+
+
+@pytest.fixture
+def make_compactable(make_episode):
+    """Factory of episodes with equipment names in their usage rate, and rewards."""
+    def make():
+        episode = make_episode(line_names=("l0", "l1"), flows=pd.DataFrame({"l0": [1.5, 2.5], "l1": [3.5, 4.5]}),
+                               observations=[SimpleNamespace(topo_vect=np.ones(10, dtype=np.int32)) for _ in range(2)],
+                               action_data_table=pd.DataFrame({"timestep": [0, 1], "reward": [1e6 + 0.1, 1e6 + 0.2],
+                                                               "cum_reward": [1e6 + 0.1, 2e6 + 0.3]}))
+        first, second = episode.timestamps
+        episode.rho = pd.DataFrame({"timestamp": [first, first, second, second], "equipment": ["l0", "l1", "l0", "l1"],
+                                    "value": [0.5, 0.6, 0.7, 0.8]})
+        return episode
+
+    return make
+
+
+def test_compact_episode_downcasts_the_measurements_only(make_compactable):
+    episode = compact_episode(make_compactable())
+    assert episode.rho["value"].dtype == np.float32
+    assert episode.flow_and_voltage_line["or"]["active"].dtypes.tolist() == [np.float32, np.float32]
+    # rewards keep their precision
+    assert episode.action_data_table["reward"].dtype == np.float64
+    assert episode.action_data_table["cum_reward"].tolist() == [1e6 + 0.1, 2e6 + 0.3]
+    assert episode.action_data_table["timestep"].dtype == np.int8
+    assert episode.compacted == COMPACTION_VERSION
+
+
+def test_equipment_names_become_categoricals(make_compactable):
+    episode = make_compactable()
+    before = episode.rho[episode.rho.equipment == "l0"].groupby("equipment")["value"].max()
+    compact_episode(episode)
+    assert isinstance(episode.rho["equipment"].dtype, pd.CategoricalDtype)
+    after = episode.rho[episode.rho.equipment == "l0"].groupby("equipment", observed=True)["value"].max()
+    assert after.index.tolist() == before.index.tolist() == ["l0"]
+
+
+def test_equipment_names_compare_between_episodes(make_compactable):
+    study, ref = compact_episode(make_compactable()), make_compactable()
+    ref.rho = ref.rho.iloc[::-1].reset_index(drop=True)
+    compact_episode(ref)
+    assert (study.rho["equipment"] == ref.rho["equipment"]).tolist() == [False, False, False, False]
+
+
+def test_memory_usage_counts_the_observations(make_compactable):
+    usage = memory_usage(make_compactable())
+    assert set(usage) == {"rho", "action_data_table", "flow_and_voltage_line.or.active",
+                          "flow_and_voltage_line.ex.active", "observations"}
+    assert usage["observations"] >= 2 * 10 * 4
+
+
+def test_memory_usage_counts_the_indexes(make_compactable):
+    episode = make_compactable()
+    episode.observation_matrices = {"topo_vect": np.ones((2, 10), dtype=np.int8)}
+    assert memory_usage(episode)["observation_matrices"] == 20
@@ -0,0 +1,52 @@
+"""
+    Tests of the timelines of the episode windows (grid2viz/src/utils/episode_window.py).
+"""
+import datetime as dt
+from types import SimpleNamespace
+
+import numpy as np
+
+from grid2viz.src.utils.episode_window import make_timeline, matches_timeline
+
+START = dt.datetime(2019, 1, 6, 0, 0)
+
+
+def observation(vector):
+    year, month, day, hour, minute = (int(value) for value in vector)
+    return SimpleNamespace(year=year, month=month, day=day, hour_of_day=hour, minute_of_hour=minute)
+
+
+# observation space decoding vectors holding the date of the observations only
+SPACE = SimpleNamespace(from_vect=observation)
+
+
+def make_vectors(timestamps):
+    return np.array([[t.year, t.month, t.day, t.hour, t.minute] for t in timestamps], dtype=float)
+
+
+def test_constant_time_step():
+    timestamps = [START + dt.timedelta(minutes=5 * step) for step in range(10)]
+    timeline = make_timeline(SPACE, make_vectors(timestamps), len(timestamps))
+    np.testing.assert_array_equal(timeline.values, np.array(timestamps, dtype="datetime64[s]"))
+
+
+def test_time_step_not_constant():
+    # a 15 minutes hole after the 4th step
+    timestamps = [START + dt.timedelta(minutes=5 * step + (10 if step > 3 else 0)) for step in range(10)]
+    timeline = make_timeline(SPACE, make_vectors(timestamps), len(timestamps))
+    np.testing.assert_array_equal(timeline.values, np.array(timestamps, dtype="datetime64[s]"))
+
+
+def test_steps_played_only():
+    timestamps = [START + dt.timedelta(minutes=5 * step) for step in range(10)]
+    assert len(make_timeline(SPACE, make_vectors(timestamps), 4)) == 4
+    assert len(make_timeline(SPACE, make_vectors(timestamps), 1)) == 1
+    assert len(make_timeline(SPACE, make_vectors(timestamps), 0)) == 0
+
+
+def test_matches_timeline():
+    timestamps = [START + dt.timedelta(minutes=5 * step) for step in range(10)]
+    vectors = make_vectors(timestamps)
+    timeline = make_timeline(SPACE, vectors, len(timestamps))
+    assert matches_timeline(timeline, 2, [observation(vector) for vector in vectors[2:5]])
+    assert not matches_timeline(timeline, 3, [observation(vector) for vector in vectors[2:5]])